@@ -0,0 +1,111 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from ryu.controller import mac_to_port
+from ryu.lib.mac import Mac, haddr_to_bin
+from ryu.app.wsapi import *
+
+# REST API for the MAC addresses learned by MacToPortTable
+#
+# get the datapath ports where a MAC address was learned
+# GET /v1.0/mac/{mac}
+#
+# get the learning table and index counters of each application
+# GET /v1.0/stats/mac
+#
+# The result is like the following:
+#
+# {"mac": "00:11:22:33:44:55", "locations": {"0000000000000001": 3}}
+#
+# and
+#
+# {"ryu.app.simple_switch.SimpleSwitch": {"entries": 2, "learned": 2, ...,
+#                                         "index": {"macs": 2, ...}}}
+#
+
+
+class WSPathMac(WSPathComponent):
+    """ Match a MAC address xx:xx:xx:xx:xx:xx """
+
+    def __str__(self):
+        return "{mac}"
+
+    def extract(self, pc, data):
+        if pc == None:
+            return WSPathExtractResult(error="End of requested URI")
+
+        try:
+            addr = haddr_to_bin(pc)
+        except (TypeError, ValueError):
+            addr = ''
+        if len(addr) != 6:
+            return WSPathExtractResult(error="Invalid format: %s" % pc)
+
+        return WSPathExtractResult(value=Mac.from_bin(addr))
+
+
+class restapi:
+
+    def __init__(self, *args, **kwargs):
+        self.ws = wsapi()
+        self.api = self.ws.get_version("1.0")
+        self.app_manager = kwargs.get('app_manager')
+        self.register()
+
+    def _tables(self):
+        """(application name, MacToPortTable) of the loaded applications"""
+        if self.app_manager is None:
+            return
+        for (name, app) in self.app_manager.applications.items():
+            for value in vars(app).values():
+                if isinstance(value, mac_to_port.MacToPortTable):
+                    yield (name, value)
+
+    def stats_handler(self, request, data):
+        body = {}
+        for (name, table) in self._tables():
+            stats = table.stats()
+            stats['index'] = table.index.stats()
+            body[name] = stats
+        request.setHeader("Content-Type", 'application/json')
+        return json.dumps(body)
+
+    def lookup_handler(self, request, data):
+        mac = data['{mac}']
+        locations = {}
+        for (_name, table) in self._tables():
+            locations.update(table.index.get(mac))
+        if not locations:
+            request.setResponseCode(404)
+            return ""
+
+        body = {'mac': mac.to_str(),
+                'locations': dict(('%016x' % dpid, port)
+                                  for (dpid, port) in locations.items())}
+        request.setHeader("Content-Type", 'application/json')
+        return json.dumps(body)
+
+    def register(self):
+        # GET /v1.0/mac itself is left to the ports of network "mac"
+        self.api.register_request(self.lookup_handler, "GET",
+                                  [WSPathStaticString('mac'), WSPathMac()],
+                                  "get the datapath ports where a MAC "
+                                  "address was learned")
+
+        self.api.register_request(self.stats_handler, "GET",
+                                  [WSPathStaticString('stats'),
+                                   WSPathStaticString('mac')],
+                                  "get the learning table and index "
+                                  "counters of each application")
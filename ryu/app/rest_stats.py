@@ -0,0 +1,131 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from ryu.controller import dpset
+from ryu.app.wsapi import *
+
+# REST API for controller statistics
+#
+# get the packet-in admission counters of every datapath
+# GET /v1.0/stats/admission
+#
+# get the packet-in admission counters of a datapath
+# GET /v1.0/stats/admission/{dpid}
+#
+# get the pending-flow table counters of every datapath
+# GET /v1.0/stats/pending_flow
+#
+# get the pending-flow table counters of a datapath
+# GET /v1.0/stats/pending_flow/{dpid}
+#
+# The counters are null when the feature is disabled.
+#
+# get the worker counters of every application run by app workers
+# GET /v1.0/stats/apps
+
+
+class WSPathDpid(WSPathComponent):
+    """ Match a datapath id in hex """
+
+    def __str__(self):
+        return "{dpid}"
+
+    def extract(self, pc, data):
+        if pc == None:
+            return WSPathExtractResult(error="End of requested URI")
+
+        try:
+            dpid = int(pc, 16)
+        except ValueError:
+            return WSPathExtractResult(error="Invalid format: %s" % pc)
+
+        return WSPathExtractResult(value=dpid)
+
+
+def _dpid_str(dpid):
+    return '%016x' % dpid
+
+
+class restapi:
+
+    def __init__(self, *args, **kwargs):
+        self.ws = wsapi()
+        self.api = self.ws.get_version("1.0")
+        self.dpset = dpset.dpset
+        self.app_manager = kwargs.get('app_manager')
+        self.register()
+
+    def _list_stats(self, request, stats):
+        body = dict((_dpid_str(dpid), stats(dp))
+                    for (dpid, dp) in self.dpset.get_all())
+        request.setHeader("Content-Type", 'application/json')
+        return json.dumps(body)
+
+    def _get_stats(self, request, data, stats):
+        dp = self.dpset.get(data['{dpid}'])
+        if dp is None:
+            request.setResponseCode(404)
+            return ""
+
+        request.setHeader("Content-Type", 'application/json')
+        return json.dumps(stats(dp))
+
+    def list_admission_handler(self, request, data):
+        return self._list_stats(request, lambda dp: dp.admission_stats())
+
+    def get_admission_handler(self, request, data):
+        return self._get_stats(request, data,
+                               lambda dp: dp.admission_stats())
+
+    def list_pending_flow_handler(self, request, data):
+        return self._list_stats(request, lambda dp: dp.pending_flow_stats())
+
+    def get_pending_flow_handler(self, request, data):
+        return self._get_stats(request, data,
+                               lambda dp: dp.pending_flow_stats())
+
+    def list_apps_handler(self, request, data):
+        body = {}
+        if self.app_manager is not None:
+            body = self.app_manager.stats()
+        request.setHeader("Content-Type", 'application/json')
+        return json.dumps(body)
+
+    def register(self):
+        path = [WSPathStaticString('stats'), WSPathStaticString('admission')]
+        self.api.register_request(self.list_admission_handler, "GET",
+                                  path,
+                                  "get packet-in admission counters")
+
+        self.api.register_request(self.get_admission_handler, "GET",
+                                  path + [WSPathDpid()],
+                                  "get packet-in admission counters "
+                                  "of a datapath")
+
+        path = [WSPathStaticString('stats'),
+                WSPathStaticString('pending_flow')]
+        self.api.register_request(self.list_pending_flow_handler, "GET",
+                                  path,
+                                  "get pending-flow table counters")
+
+        self.api.register_request(self.get_pending_flow_handler, "GET",
+                                  path + [WSPathDpid()],
+                                  "get pending-flow table counters "
+                                  "of a datapath")
+
+        self.api.register_request(self.list_apps_handler, "GET",
+                                  [WSPathStaticString('stats'),
+                                   WSPathStaticString('apps')],
+                                  "get application worker counters")
@@ -19,13 +19,15 @@ import struct
 from ryu.app.rest_nw_id import NW_ID_UNKNOWN, NW_ID_EXTERNAL
 from ryu.exception import MacAddressDuplicated
 from ryu.exception import PortUnknown
+from ryu.controller import dpset
 from ryu.controller import event
 from ryu.controller import mac_to_network
 from ryu.controller import mac_to_port
+from ryu.controller import network
 from ryu.controller.handler import main_dispatcher
 from ryu.controller.handler import config_dispatcher
 from ryu.controller.handler import set_ev_cls
-from ryu.lib.mac import haddr_to_str
+from ryu.lib.mac import Mac
 
 LOG = logging.getLogger('ryu.app.simple_isolation')
 
@@ -33,14 +35,29 @@ LOG = logging.getLogger('ryu.app.simple_isolation')
 class SimpleIsolation(object):
     def __init__(self, *args, **kwargs):
         self.nw = kwargs['network']
-        self.mac2port = mac_to_port.MacToPortTable()
+        self.mac2port = mac_to_port.MacToPortTable(
+            is_edge_port=self._is_edge_port)
         self.mac2net = mac_to_network.MacToNetwork(self.nw)
+        self.templates = {}     # dpid -> (flow_mod, packet_out)
+        # (dpid, in_port, nw_id) -> (datapath generation, flood actions)
+        self.flood_actions = {}
+
+    def _is_edge_port(self, dpid, port):
+        # a port of a known network has hosts behind it, not other
+        # datapaths
+        nw_id = self.nw.dpids.get(dpid, {}).get(port)
+        return nw_id not in (None, NW_ID_UNKNOWN, NW_ID_EXTERNAL)
 
     @set_ev_cls(event.EventOFPSwitchFeatures, config_dispatcher)
     def switch_features_handler(self, ev):
         self.mac2port.dpid_add(ev.msg.datapath_id)
         self.nw.add_datapath(ev.msg)
 
+    @set_ev_cls(dpset.EventDP, dpset.dpset_dispatcher)
+    def dp_handler(self, ev):
+        if not ev.enter:
+            self.mac2port.dpid_del(ev.dp.id)
+
     @set_ev_cls(event.EventOFPBarrierReply)
     def barrier_reply_handler(ev):
         LOG.debug('barrier reply ev %s msg %s', ev, ev.msg)
@@ -51,13 +68,9 @@ class SimpleIsolation(object):
         #
         # install flow and then send packet
         #
-        wildcards = datapath.ofproto.OFPFW_ALL
-        wildcards &= ~(datapath.ofproto.OFPFW_IN_PORT |
-                       datapath.ofproto.OFPFW_DL_SRC |
-                       datapath.ofproto.OFPFW_DL_DST)
-        match = datapath.ofproto_parser.OFPMatch(wildcards,
-                                                 msg.in_port, src, dst,
-                                                 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        match = datapath.ofproto_parser.OFPMatch.from_fields(
+            ('in_port', 'dl_src', 'dl_dst'),
+            in_port=msg.in_port, dl_src=src.bin, dl_dst=dst.bin)
 
         datapath.send_flow_mod(
             match=match, cookie=0, command=datapath.ofproto.OFPFC_ADD,
@@ -67,6 +80,41 @@ class SimpleIsolation(object):
 
         datapath.send_packet_out(msg.buffer_id, msg.in_port, actions)
 
+    def _templates(self, datapath):
+        templates = self.templates.get(datapath.id)
+        if templates is not None:
+            return templates
+
+        ofproto = datapath.ofproto
+        ofproto_parser = datapath.ofproto_parser
+        actions = [ofproto_parser.OFPActionOutput(ofproto.OFPP_NONE)]
+        match = ofproto_parser.OFPMatch.from_fields(
+            ('in_port', 'dl_src', 'dl_dst'))
+        flow_mod = ofproto_parser.OFPFlowMod.template(
+            datapath, match=match, cookie=0, command=ofproto.OFPFC_ADD,
+            idle_timeout=0, hard_timeout=0, priority=32768,
+            buffer_id=0xffffffff, out_port=ofproto.OFPP_NONE,
+            flags=ofproto.OFPFF_SEND_FLOW_REM, actions=actions)
+        packet_out = ofproto_parser.OFPPacketOut.template(
+            datapath, buffer_id=0xffffffff, in_port=ofproto.OFPP_NONE,
+            actions=actions)
+
+        templates = (flow_mod, packet_out)
+        self.templates[datapath.id] = templates
+        return templates
+
+    def _modflow_and_send_packet_to_port(self, msg, src, dst, out_port):
+        """same as _modflow_and_send_packet() with a single output port"""
+        datapath = msg.datapath
+        (flow_mod, packet_out) = self._templates(datapath)
+
+        datapath.send_template(flow_mod, in_port=msg.in_port,
+                               dl_src=src.bin, dl_dst=dst.bin,
+                               output_port=out_port)
+        datapath.send_template(packet_out, buffer_id=msg.buffer_id,
+                               in_port=msg.in_port,
+                               output_port=out_port)
+
     def _forward_to_nw_id(self, msg, src, dst, nw_id, out_port):
         assert out_port is not None
         datapath = msg.datapath
@@ -75,27 +123,35 @@ class SimpleIsolation(object):
                                     NW_ID_EXTERNAL):
             LOG.debug('packet is blocked src %s dst %s '
                       'from %d to %d on datapath %d',
-                      haddr_to_str(src), haddr_to_str(dst),
-                      msg.in_port, out_port, datapath.id)
+                      src, dst, msg.in_port, out_port, datapath.id)
             return
 
         LOG.debug("learned dpid %s in_port %d out_port %d src %s dst %s",
-                  datapath.id, msg.in_port, out_port,
-                  haddr_to_str(src), haddr_to_str(dst))
-        actions = [datapath.ofproto_parser.OFPActionOutput(out_port)]
-        self._modflow_and_send_packet(msg, src, dst, actions)
+                  datapath.id, msg.in_port, out_port, src, dst)
+        self._modflow_and_send_packet_to_port(msg, src, dst, out_port)
+
+    def _flood_actions(self, datapath, in_port, nw_id):
+        # the ports of nw_id don't change until the datapath generation does
+        key = (datapath.id, in_port, nw_id)
+        generation = self.nw.datapath_generation(datapath.id)
+        cached = self.flood_actions.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
 
-    def _flood_to_nw_id(self, msg, src, dst, nw_id):
-        datapath = msg.datapath
         actions = []
-        LOG.debug("dpid %s in_port %d src %s dst %s ports %s",
-                  datapath.id, msg.in_port,
-                  haddr_to_str(src), haddr_to_str(dst),
-                  self.nw.dpids.get(datapath.id, {}).items())
-        for port_no in self.nw.filter_ports(datapath.id, msg.in_port,
+        for port_no in self.nw.filter_ports(datapath.id, in_port,
                                             nw_id, NW_ID_EXTERNAL):
             LOG.debug("port_no %s", port_no)
             actions.append(datapath.ofproto_parser.OFPActionOutput(port_no))
+        self.flood_actions[key] = (generation, actions)
+        return actions
+
+    def _flood_to_nw_id(self, msg, src, dst, nw_id):
+        datapath = msg.datapath
+        LOG.debug("dpid %s in_port %d src %s dst %s ports %s",
+                  datapath.id, msg.in_port, src, dst,
+                  self.nw.dpids.get(datapath.id))
+        actions = self._flood_actions(datapath, msg.in_port, nw_id)
         self._modflow_and_send_packet(msg, src, dst, actions)
 
     def _learned_mac_or_flood_to_nw_id(self, msg, src, dst,
@@ -111,7 +167,9 @@ class SimpleIsolation(object):
         msg = ev.msg
         datapath = msg.datapath
 
-        dst, src, eth_type = struct.unpack_from('!6s6sH', buffer(msg.data), 0)
+        dst_bin, src_bin, _eth_type = struct.unpack_from('!6s6sH', msg.data)
+        dst = Mac.from_bin(dst_bin)
+        src = Mac.from_bin(src_bin)
 
         try:
             port_nw_id = self.nw.get_network(datapath.id, msg.in_port)
@@ -130,36 +188,20 @@ class SimpleIsolation(object):
             except MacAddressDuplicated:
                 LOG.warn('mac address %s is already in use.'
                          ' So (dpid %s, port %s) can not use it',
-                         haddr_to_str(src), datapath.id, msg.in_port)
+                         src, datapath.id, msg.in_port)
                 #
                 # should we install drop action pro-actively for future?
                 #
                 return
 
-        old_port = self.mac2port.port_add(datapath.id, msg.in_port, src)
-        if old_port is not None and old_port != msg.in_port:
-            # We really overwrite already learned mac address.
-            # So discard already installed stale flow entry which conflicts
-            # new port.
-            wildcards = datapath.ofproto.OFPFW_ALL
-            wildcards &= ~datapath.ofproto.OFPFW_DL_DST
-            match = datapath.ofproto_parser.OFPMatch(wildcards,
-                                                     0, 0, src,
-                                                     0, 0, 0, 0, 0, 0, 0, 0, 0)
-
-            datapath.send_flow_mod(match=match, cookie=0,
-                command=datapath.ofproto.OFPFC_DELETE, idle_timeout=0,
-                hard_timeout=0, priority=32768, out_port=old_port)
-
-            # to make sure the old flow entries are purged.
-            datapath.send_barrier()
+        # a move is handled by host_moved_handler() before this returns
+        self.mac2port.port_add(datapath.id, msg.in_port, src)
 
         src_nw_id = self.mac2net.get_network(src, NW_ID_UNKNOWN)
         dst_nw_id = self.mac2net.get_network(dst, NW_ID_UNKNOWN)
 
         # we handle multicast packet as same as broadcast
-        first_oct = struct.unpack_from('B', dst)[0]
-        broadcast = (dst == '\xff' * 6) or (first_oct & 0x01)
+        broadcast = dst.is_multicast()
         out_port = self.mac2port.port_get(datapath.id, dst)
 
         #
@@ -230,6 +272,62 @@ class SimpleIsolation(object):
             # drop packets?
             assert port_nw_id == NW_ID_UNKNOWN
 
+    @set_ev_cls(mac_to_port.EventHostMoved, mac_to_port.mac_dispatcher)
+    def host_moved_handler(self, ev):
+        # We really overwrite already learned mac address.
+        # So discard already installed stale flow entries which conflict
+        # new port on every datapath which learned the old location.
+        for (dpid, old_port) in ev.stale.items():
+            datapath = dpset.dpset.get(dpid)
+            if datapath is None:
+                continue
+
+            match = datapath.ofproto_parser.OFPMatch.from_fields(
+                ('dl_dst', ), dl_dst=ev.mac.bin)
+            datapath.send_flow_mod(match=match, cookie=0,
+                command=datapath.ofproto.OFPFC_DELETE, idle_timeout=0,
+                hard_timeout=0, priority=32768, out_port=old_port)
+
+            # to make sure the old flow entries are purged.
+            datapath.send_barrier()
+
+    @set_ev_cls(network.EventPortBase, network.network_dispatcher)
+    def port_network_handler(self, ev):
+        """purge the flows of a port which left a known network
+
+        The flows installed while it was a member would keep forwarding
+        between it and the old network, which breaks isolation.
+        """
+        if isinstance(ev, network.EventPortMoved):
+            old_nw_id = ev.old_network_id
+        elif isinstance(ev, network.EventPortRemoved):
+            old_nw_id = ev.network_id
+        else:
+            return
+        if old_nw_id == NW_ID_UNKNOWN:
+            return
+
+        datapath = dpset.dpset.get(ev.dpid)
+        if datapath is None:
+            return
+
+        # The port left old_nw_id. Discard the flow entries installed
+        # while it was a member, which forward from or to it.
+        ofproto = datapath.ofproto
+        match = datapath.ofproto_parser.OFPMatch.from_fields(
+            ('in_port', ), in_port=ev.port)
+        datapath.send_flow_mod(match=match, cookie=0,
+            command=ofproto.OFPFC_DELETE, idle_timeout=0,
+            hard_timeout=0, priority=32768, out_port=ofproto.OFPP_NONE)
+
+        match = datapath.ofproto_parser.OFPMatch.from_fields(())
+        datapath.send_flow_mod(match=match, cookie=0,
+            command=ofproto.OFPFC_DELETE, idle_timeout=0,
+            hard_timeout=0, priority=32768, out_port=ev.port)
+
+        # to make sure the old flow entries are purged.
+        datapath.send_barrier()
+
     @set_ev_cls(event.EventOFPPortStatus, main_dispatcher)
     def port_status_handler(self, ev):
         msg = ev.msg
@@ -15,12 +15,12 @@
 import logging
 import struct
 
+from ryu.controller import dpset
 from ryu.controller import event
 from ryu.controller import mac_to_port
 from ryu.controller.handler import main_dispatcher
 from ryu.controller.handler import set_ev_cls
-from ryu.lib.mac import haddr_to_str
-from ryu.lib.mac import haddr_to_bin
+from ryu.lib.mac import Mac
 
 
 LOG = logging.getLogger('ryu.app.simple_switch')
@@ -28,27 +28,59 @@ LOG = logging.getLogger('ryu.app.simple_switch')
 # TODO: we should split the handler into two parts, protocol
 # independent and dependant parts.
 
-# TODO: can we use dpkt python library?
-
 # TODO: we need to move the followings to something like db
 
 
 class SimpleSwitch(object):
     def __init__(self, *args, **kwargs):
         self.mac2port = mac_to_port.MacToPortTable()
+        self.templates = {}     # dpid -> (flow_mod, packet_out)
+
+    def _templates(self, datapath):
+        templates = self.templates.get(datapath.id)
+        if templates is not None:
+            return templates
 
-    @set_ev_cls(event.EventOFPPacketIn, main_dispatcher)
-    def packetInHandler(self, ev):
-        msg = ev.msg
-        datapath = msg.datapath
         ofproto = datapath.ofproto
+        ofproto_parser = datapath.ofproto_parser
+        actions = [ofproto_parser.OFPActionOutput(ofproto.OFPP_NONE)]
+        match = ofproto_parser.OFPMatch.from_fields(
+            ('in_port', 'dl_dst', 'nw_tos'))
+        flow_mod = ofproto_parser.OFPFlowMod.template(
+            datapath, match=match, cookie=0, command=ofproto.OFPFC_ADD,
+            idle_timeout=0, hard_timeout=0, priority=32768,
+            buffer_id=0xffffffff, out_port=ofproto.OFPP_NONE,
+            flags=ofproto.OFPFF_SEND_FLOW_REM, actions=actions)
+        packet_out = ofproto_parser.OFPPacketOut.template(
+            datapath, buffer_id=0xffffffff, in_port=ofproto.OFPP_NONE,
+            actions=actions)
+
+        templates = (flow_mod, packet_out)
+        self.templates[datapath.id] = templates
+        return templates
+
+    @set_ev_cls(dpset.EventDP, dpset.dpset_dispatcher)
+    def dp_handler(self, ev):
+        if not ev.enter:
+            self.mac2port.dpid_del(ev.dp.id)
+
+    @set_ev_cls(event.EventOFPPacketIn, main_dispatcher, batch=True)
+    def packetInHandler(self, evs):
+        # packet-ins of a batch are received at once from a single datapath
+        datapath = evs[0].msg.datapath
+        for ev in evs:
+            self._packet_in(datapath, ev.msg)
+
+    def _packet_in(self, datapath, msg):
+        ofproto = datapath.ofproto
+        (flow_mod, packet_out) = self._templates(datapath)
 
-        dst, src, eth_type = struct.unpack_from('!6s6sH', buffer(msg.data), 0)
+        dst_bin, src_bin, _eth_type = struct.unpack_from('!6s6sH', msg.data)
+        dst = Mac.from_bin(dst_bin)
+        src = Mac.from_bin(src_bin)
 
         dpid = datapath.id
-        self.mac2port.dpid_add(dpid)
-        LOG.info("packet in %s %s %s %s",
-                 dpid, haddr_to_str(src), haddr_to_str(dst), msg.in_port)
+        LOG.info("packet in %s %s %s %s", dpid, src, dst, msg.in_port)
 
         self.mac2port.port_add(dpid, msg.in_port, src)
         out_port = self.mac2port.port_get(dpid, dst)
@@ -57,24 +89,13 @@ class SimpleSwitch(object):
             LOG.info("out_port not found")
             out_port = ofproto.OFPP_FLOOD
 
-        actions = [datapath.ofproto_parser.OFPActionOutput(out_port)]
-
         if out_port != ofproto.OFPP_FLOOD:
-            wildcards = ofproto.OFPFW_ALL
-            wildcards &= ~(ofproto.OFPFW_IN_PORT |
-                           ofproto.OFPFW_DL_DST |
-                           ofproto.OFPFW_NW_TOS)
-            match = datapath.ofproto_parser.OFPMatch(
-                wildcards, msg.in_port,
-                haddr_to_bin('00:00:00:00:00:00'), dst,
-                0, 0, 0, 0, 0, 0, 0, 0, 0)
-
-            datapath.send_flow_mod(
-                match=match, cookie=0, command=ofproto.OFPFC_ADD,
-                idle_timeout=0, hard_timeout=0, priority=32768,
-                flags=ofproto.OFPFF_SEND_FLOW_REM, actions=actions)
-
-        datapath.send_packet_out(msg.buffer_id, msg.in_port, actions)
+            datapath.send_template(flow_mod, in_port=msg.in_port,
+                                   dl_dst=dst_bin, output_port=out_port)
+
+        datapath.send_template(packet_out, buffer_id=msg.buffer_id,
+                               in_port=msg.in_port,
+                               output_port=out_port)
 
     @set_ev_cls(event.EventOFPPortStatus, main_dispatcher)
     def portStatusHandler(self, ev):
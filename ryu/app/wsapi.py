@@ -17,13 +17,15 @@
 #   Copyright 2008 (C) Nicira, Inc.
 
 import gflags
+import httplib
 import logging
 import re
 import textwrap
 import simplejson
+import urllib
 from copy import copy
+from gevent import socket
 from gevent.pywsgi import WSGIServer
-from webob import Request, Response
 
 LOG = logging.getLogger('ryu.app.wsapi')
 
@@ -158,14 +160,31 @@ class WhitespaceNormalizer:
         return self._re.sub(" ", s).strip()
 
 
+_MISSING = object()
+
+
 class WSPathTreeNode:
+    """node of the registered paths
+
+    The children are compiled on the first request after they change:
+    the ones matching a static string are looked up in a dict keyed by
+    it, the others are tried in registration order. When the subtree of
+    a matching child doesn't handle the request, the next matching child
+    is tried, so a static string doesn't hide the same value of a path
+    component registered beside it.
+    """
+
     _wsn = WhitespaceNormalizer()
 
     def __init__(self, parent, path_component):
         self.path_component = path_component
+        # key of the extracted value in the data passed to the handlers
+        self.key = str(path_component)
         self._handlers = {}
         self._parent = parent
         self._children = []
+        self._children_by_str = {}
+        self._routes = None
         self._tw = textwrap.TextWrapper()
         self._tw.width = 78
         self._tw.initial_indent = " " * 4
@@ -175,10 +194,7 @@ class WSPathTreeNode:
         return self._parent()
 
     def _matching_child(self, path_component):
-        for c in self._children:
-            if str(c.path_component) == str(path_component):
-                return c
-        return None
+        return self._children_by_str.get(str(path_component))
 
     def has_child(self, path_component):
         return self._matching_child(path_component) != None
@@ -187,13 +203,28 @@ class WSPathTreeNode:
         c = self._matching_child(path_component)
         if c == None:
             c = WSPathTreeNode(self, path_component)
-            self._children.append(c)
+            if isinstance(path_component, WSPathStaticString):
+                # try static strings before the components which may
+                # match any string
+                i = 0
+                while (i < len(self._children) and
+                       isinstance(self._children[i].path_component,
+                                  WSPathStaticString)):
+                    i += 1
+                self._children.insert(i, c)
+            else:
+                self._children.append(c)
+            self._children_by_str[c.key] = c
+            self._routes = None
         return c
 
     def path_str(self):
-        if self._parent == None:
-            return ""
-        return self._parent.path_str() + "/" + str(self.path_component)
+        components = []
+        node = self
+        while node._parent != None:
+            components.append("/" + str(node.path_component))
+            node = node._parent
+        return "".join(reversed(components))
 
     def set_handler(self, request_method, handler, doc):
         if request_method in self._handlers:
@@ -216,30 +247,125 @@ class WSPathTreeNode:
             msg.append(c.interface_doc(base_path))
         return "".join(msg)
 
+    def _compile(self):
+        static = {}
+        static_ci = {}
+        dynamic = []
+        for c in self._children:
+            pc = c.path_component
+            # subclasses may override extract()
+            if pc.__class__ is WSPathStaticString:
+                if pc.case_insensitive:
+                    static_ci.setdefault(pc.str, c)
+                else:
+                    static.setdefault(pc.str, c)
+            else:
+                dynamic.append((c.key, pc.extract, c))
+        self._routes = (static, static_ci, dynamic)
+
+    def route(self, s, data):
+        """child matching path string s or None
+
+        The value extracted by the child is stored in data.
+        """
+        m = self._match(s, data)
+        if m is None:
+            return None
+        (_index, c, value) = m
+        data[c.key] = value
+        return c
+
+    def _match(self, s, data, start=0):
+        """(index, child, extracted value) of the first child matching s
+
+        Index 0 is the child matching a static string and index n the
+        n-th of the other children. The search begins at index start.
+        """
+        if self._routes is None:
+            self._compile()
+        (static, static_ci, dynamic) = self._routes
+
+        if start == 0:
+            c = static.get(s)
+            if c is None and static_ci:
+                c = static_ci.get(s.lower())
+            if c is not None:
+                return (0, c, s)
+            start = 1
+
+        index = start
+        for (_key, extract, c) in dynamic[start - 1:]:
+            r = extract(s, data)
+            if r.error is None:
+                return (index, c, r.value)
+            index += 1
+        return None
+
+    def _find(self, segs, data, method):
+        """node handling method for the path strings segs or None
+
+        A depth first search of the matching children without recursion.
+        The stack holds (node, index of the match, key, old value of key
+        in data) for each path string followed, so it's never deeper
+        than segs. When a subtree fails, the value it extracted is taken
+        back out of data and the next match of its parent is tried.
+        """
+        n = len(segs)
+        stack = []
+        node = self
+        while True:
+            i = len(stack)
+            if i < n:
+                m = node._match(segs[i], data)
+            elif method in node._handlers:
+                return node
+            else:
+                m = None
+
+            while m is None:
+                if not stack:
+                    return None
+                (node, index, key, old) = stack.pop()
+                if old is _MISSING:
+                    del data[key]
+                else:
+                    data[key] = old
+                m = node._match(segs[len(stack)], data, index + 1)
+
+            (index, c, value) = m
+            stack.append((node, index, c.key, data.get(c.key, _MISSING)))
+            data[c.key] = value
+            node = c
+
     def handle(self, t):
+        method = t.request_method()
+        node = self._find(t.path_strings(), t.data, method)
+        if node is not None:
+            return t.call_handler(node._handlers[method][0])
+
+        # slow path: follow the first matching children to tell why
+        # the request failed
+        node = self
         s = t.next_path_string()
-        if s != None:
-            r = None
-            if len(self._children) == 0:
-                t.request_uri_too_long()
-            for c in self._children:
-                r = c.path_component.extract(s, t.data)
-                if r.error == None:
-                    t.data[str(c.path_component)] = r.value
-                    t.failed_paths = []
-                    r = c.handle(t)
-                    break
-                else:
-                    t.failed_paths.append((c.path_str(), r.error))
-            if len(t.failed_paths) > 0:
+        while s is not None:
+            if not node._children:
+                return t.request_uri_too_long()
+            c = node.route(s, t.data)
+            if c is None:
+                # tell why each child failed
+                t.failed_paths = [
+                    (child.path_str(),
+                     child.path_component.extract(s, t.data).error)
+                    for child in node._children]
                 return t.invalid_request()
-            return r
-        else:
-            try:
-                h, d = self._handlers[t.request_method()]
-            except KeyError:
-                return t.unsupported_method(self._handlers.keys())
-            return t.call_handler(h)
+            node = c
+            s = t.next_path_string()
+
+        try:
+            h, d = node._handlers[t.request_method()]
+        except KeyError:
+            return t.unsupported_method(node._handlers.keys())
+        return t.call_handler(h)
 
 
 class WSPathTraversal:
@@ -253,6 +379,9 @@ class WSPathTraversal:
     def request_method(self):
         return self._request.method
 
+    def path_strings(self):
+        return self._request.postpath
+
     def next_path_string(self):
         try:
             return self._pathiter.next()
@@ -265,7 +394,7 @@ class WSPathTraversal:
         except Exception, e:
             LOG.error("caught unhandled exception with path '%s' : %s" % \
                       (str(self._request.postpath), e))
-            internalError(self._request, "Unhandled server error")
+            return internalError(self._request, "Unhandled server error")
 
     def _error_wrapper(self, l):
         msg = []
@@ -449,7 +578,7 @@ class WSPathRegex(WSPathComponent):
     def extract(self, pc, data):
         if pc == None:
             return WSPathExtractResult(error="End of requested URI")
-        m = re.match(pc)
+        m = self.re.match(pc)
         if m == None:
             return WSPathExtractResult(error="Regexp did not match: %s" %
                                        self.re.pattern)
@@ -483,8 +612,8 @@ class WSPathArbitraryString(WSPathComponent):
         WSPathComponent.__init__(self)
         self._name = name
 
-        def __str__(self):
-            return self._name
+    def __str__(self):
+        return self._name
 
     def extract(self, pc, data):
         if pc == None:
@@ -492,27 +621,38 @@ class WSPathArbitraryString(WSPathComponent):
         return WSPathExtractResult(unicode(pc, 'utf-8'))
 
 
+# characters left unquoted in the request path, as webob does
+_PATH_SAFE = "/~!$&'()*+,;=:@"
+_VERSION_RE = re.compile('^v(?P<ver>.+)$')
+
+
 class WSRequest:
+    """request and response of the WSGI environment env
+
+    The response is built here and handed to start_response directly.
+    """
 
     def __init__(self, env, start_response):
         self.env = env
         self.start_response = start_response
         self.version = None
 
-        req = Request(env)
-        self.method = req.method
-        self.path = req.path
+        self.method = env['REQUEST_METHOD']
+        self.path = urllib.quote(env.get('SCRIPT_NAME', '') +
+                                 env.get('PATH_INFO', ''), _PATH_SAFE)
         self.segs = [s for s in self.path.split('/') if s]
 
-        self.rsp = Response(status=200)
+        self.status = '200 OK'
+        # lower case name -> (name, value)
+        self.headers = {'content-type': ('Content-Type',
+                                         'text/html; charset=UTF-8')}
 
         try:
             version_str = self.segs[0]
         except IndexError:
             return
 
-        p = re.compile('^v(?P<ver>.+)$')
-        m = p.match(version_str)
+        m = _VERSION_RE.match(version_str)
         if m:
             self.version = m.group('ver')
 
@@ -520,19 +660,26 @@ class WSRequest:
         self.postpath = self.segs[1:]
 
     def setHeader(self, name, value):
-        self.rsp.headers[name] = value
+        self.headers[name.lower()] = (name, value)
 
     def setResponseCode(self, code, message=None):
         if not isinstance(code, (int, long)):
             raise TypeError("HTTP response code must be int or long")
-        if message:
-            self.rsp.status = str(code) + " " + message
-        else:
-            self.rsp.status = code
+        if not message:
+            message = httplib.responses.get(code, 'Unknown')
+        self.status = '%d %s' % (code, message)
 
     def sendResponse(self, body):
-        self.rsp.body = body
-        return self.rsp(self.env, self.start_response)
+        if body is None:
+            body = ''
+        elif isinstance(body, unicode):
+            body = body.encode('utf-8')
+        headers = self.headers.values()
+        headers.append(('Content-Length', str(len(body))))
+        self.start_response(self.status, headers)
+        if self.method == 'HEAD':
+            return []
+        return [body]
 
 
 class WSRes:
@@ -573,6 +720,13 @@ class wsapi:
         return wsreq.sendResponse(body)
 
     def __call__(self):
-        server = WSGIServer((FLAGS.wsapi_host, FLAGS.wsapi_port),
-                            self.application)
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # The status line and headers are sent apart from the body.
+        # Without this, the body waits for the delayed ACK of the client.
+        # The connections accepted inherit it.
+        listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        listener.bind((FLAGS.wsapi_host, FLAGS.wsapi_port))
+        listener.listen(128)
+        server = WSGIServer(listener, self.application)
         server.serve_forever()
@@ -13,18 +13,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gflags
 import itertools
 import logging
 
 from ryu import utils
+from ryu.base import app_worker
 from ryu.controller.handler import register_instance
 
 LOG = logging.getLogger('ryu.base.app_manager')
 
+FLAGS = gflags.FLAGS
+
 
 class AppManager(object):
     def __init__(self):
         self.applications = {}
+        self.workers = {}
 
     def load(self, app_mod_name, *args, **kwargs):
         # for now, only single instance of a given module
@@ -34,7 +39,12 @@ class AppManager(object):
 
         cls = utils.import_object(app_mod_name)
         app = cls(*args, **kwargs)
-        register_instance(app)
+        if FLAGS.app_workers > 0:
+            worker = app_worker.AppWorker(app_mod_name, FLAGS.app_workers)
+            self.workers[app_mod_name] = worker
+            register_instance(app, wrap=worker.wrap)
+        else:
+            register_instance(app)
 
         self.applications[app_mod_name] = app
 
@@ -43,3 +53,8 @@ class AppManager(object):
                                                   for app_list in app_lists]):
             self.load(app, *args, **kwargs)
             LOG.info('loading app %s', app)
+
+    def stats(self):
+        """inbox and queueing latency of each application worker"""
+        return dict((name, worker.stats())
+                    for (name, worker) in self.workers.items())
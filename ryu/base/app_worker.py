@@ -0,0 +1,131 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import gflags
+import logging
+import time
+
+from ryu.controller import dpset
+from ryu.lib import bounded_queue
+
+LOG = logging.getLogger('ryu.base.app_worker')
+
+FLAGS = gflags.FLAGS
+gflags.DEFINE_integer('app_workers', 0,
+                      'number of worker greenlets per application. '
+                      'The events of a datapath are handled in order by '
+                      'one of them. (0: handle events in the event loop '
+                      'of the datapath)')
+gflags.DEFINE_integer('app_worker_q_high_msgs', 1024,
+                      'application inbox high water mark in events')
+gflags.DEFINE_integer('app_worker_q_low_msgs', 512,
+                      'application inbox low water mark in events')
+
+
+def _datapath(ev):
+    """the datapath of ev, its dpid if not connected or None"""
+    if isinstance(ev, list):
+        # batch of events from a single datapath
+        ev = ev[0]
+    msg = getattr(ev, 'msg', None)
+    if msg is not None:
+        return msg.datapath
+    # dpset.EventDP
+    dp = getattr(ev, 'dp', None)
+    if dp is not None:
+        return dp
+    # network and mac_to_port events
+    dpid = getattr(ev, 'dpid', None)
+    if dpid is not None:
+        dp = dpset.dpset.get(dpid)
+        if dp is not None:
+            return dp
+    return dpid
+
+
+class AppWorker(object):
+    """worker greenlets which run the event handlers of an application
+
+    Each worker greenlet, called a lane, has its own bounded inbox.
+    Events are assigned to a lane by datapath, so the events of a
+    datapath, the OpenFlow messages as well as the events which carry
+    its dp or dpid, are handled in order while different datapaths are
+    handled in parallel. The dispatcher blocks while the inbox is full,
+    which in turn throttles the datapath.
+
+    A handler run by a lane can't stop the dispatch to the following
+    handlers by returning False. An event raised by a lane itself is
+    queued without waiting, since the lane would wait for room in an
+    inbox which only the lanes free.
+    """
+
+    def __init__(self, name, nlanes, high_msgs=None, low_msgs=None):
+        assert nlanes > 0
+        if high_msgs is None:
+            high_msgs = FLAGS.app_worker_q_high_msgs
+        if low_msgs is None:
+            low_msgs = FLAGS.app_worker_q_low_msgs
+
+        self.name = name
+        self.lanes = [bounded_queue.BoundedQueue(high_msgs, low_msgs)
+                      for _i in range(nlanes)]
+        self.threads = [gevent.spawn(self._loop, lane)
+                        for lane in self.lanes]
+
+        # metrics
+        self.handled = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def _lane(self, ev):
+        return self.lanes[hash(_datapath(ev)) % len(self.lanes)]
+
+    def wrap(self, handler):
+        """handler which queues the event to the lane of its datapath"""
+        def queue_handler(ev):
+            block = gevent.getcurrent() not in self.threads
+            self._lane(ev).put((handler, ev, time.time()), block=block)
+
+        if getattr(handler, 'ev_batch', False):
+            queue_handler.ev_batch = True
+        return queue_handler
+
+    def _loop(self, lane):
+        while True:
+            (handler, ev, queued) = lane.get()
+
+            latency = time.time() - queued
+            self.handled += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+
+            try:
+                handler(ev)
+            except Exception:
+                self.errors += 1
+                LOG.exception('%s: handler %s failed', self.name, handler)
+
+    def stats(self):
+        stats = {'lanes': len(self.lanes),
+                 'handled': self.handled,
+                 'errors': self.errors,
+                 'latency_max': self.latency_max,
+                 'latency_avg': (self.handled and
+                                 self.latency_sum / self.handled)}
+        for name in ('msgs', 'max_msgs', 'full_count'):
+            stats['q_' + name] = sum(lane.stats()[name]
+                                     for lane in self.lanes)
+        return stats
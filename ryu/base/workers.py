@@ -0,0 +1,353 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import fcntl
+import gevent
+import gflags
+import json
+import logging
+import os
+import select
+import signal
+import time
+from gevent import os as gevent_os
+
+LOG = logging.getLogger('ryu.base.workers')
+
+FLAGS = gflags.FLAGS
+gflags.DEFINE_integer('workers', 0,
+                      'number of worker processes which share the openflow '
+                      'listen port. Each worker runs all the applications '
+                      'with their own state, but for the replicated '
+                      'configuration. (0: run in a single process)')
+gflags.DEFINE_integer('worker_stats_interval', 10,
+                      'seconds between stats reports of worker processes')
+gflags.DEFINE_float('worker_restart_delay', 1.0,
+                    'seconds to wait before restarting a dead worker')
+
+
+# averages, and the counter beside them which weights them
+_AVG_WEIGHTS = {'latency_avg': 'handled'}
+
+
+def merge_stats(all_stats):
+    """merge the stats of the workers
+
+    Peaks, whose names have a 'max' word, are merged into the largest
+    one and the averages of _AVG_WEIGHTS are weighted by their counter.
+    The other values, counters and gauges, are summed.
+    """
+    merged = {}
+    weights = {}
+    for stats in all_stats:
+        for (name, value) in stats.items():
+            for (avg, counter) in _AVG_WEIGHTS.items():
+                if name.endswith(avg):
+                    weight = stats.get(name[:-len(avg)] + counter, 0)
+                    merged[name] = merged.get(name, 0) + value * weight
+                    weights[name] = weights.get(name, 0) + weight
+                    break
+            else:
+                if 'max' in name.split('_'):
+                    merged[name] = max(merged.get(name, value), value)
+                else:
+                    merged[name] = merged.get(name, 0) + value
+    for (name, weight) in weights.items():
+        merged[name] = weight and merged[name] / float(weight)
+    return merged
+
+
+class _Worker(object):
+    def __init__(self, index, pid, stats_fd, ctl_fd):
+        self.index = index
+        self.pid = pid
+        self.stats_fd = stats_fd
+        self.stats_buf = ''
+        self.stats = {}
+        self.ctl_fd = ctl_fd
+        self.ctl_buf = ''
+
+
+class WorkerSupervisor(object):
+    """fork worker processes, restart them and merge their stats
+
+    worker_main(index, channel) runs in each worker and must not return
+    while the worker serves. channel(stats) sends a dict of numbers to
+    the supervisor, which logs them merged over all workers.
+    channel.publish(op) sends a JSON serializable op to the other
+    workers, which receive it by channel.recv_loop(). The ops are kept
+    and replayed to a worker when it is (re)started.
+
+    The supervisor runs no greenlet of its own, so that a forked worker
+    starts with a clean gevent hub.
+    """
+
+    def __init__(self, nworkers, worker_main,
+                 stats_interval=None, restart_delay=None):
+        assert nworkers > 0
+        self.nworkers = nworkers
+        self.worker_main = worker_main
+        if stats_interval is None:
+            stats_interval = FLAGS.worker_stats_interval
+        if restart_delay is None:
+            restart_delay = FLAGS.worker_restart_delay
+        self.stats_interval = stats_interval
+        self.restart_delay = restart_delay
+
+        self.workers = {}       # pid -> _Worker
+        self.restart = {}       # index -> time to restart
+        self.restart_count = 0
+        self.ops = []           # lines of the published ops
+
+    def __call__(self):
+        for index in range(self.nworkers):
+            self._spawn(index)
+
+        # make SIGTERM unwind the supervisor so that it kills the workers
+        signal.signal(signal.SIGTERM, _raise_system_exit)
+        try:
+            self._supervise()
+        finally:
+            for pid in self.workers:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+
+    def _spawn(self, index):
+        (read_fd, write_fd) = os.pipe()
+        (ctl_read_fd, ctl_write_fd) = os.pipe()
+        pid = gevent.fork()
+        if pid == 0:
+            # worker
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.close(read_fd)
+            os.close(ctl_write_fd)
+            for worker in self.workers.values():
+                for fd in (worker.stats_fd, worker.ctl_fd):
+                    if fd is not None:
+                        os.close(fd)
+            status = 1
+            try:
+                self.worker_main(index, _Channel(write_fd, ctl_read_fd))
+                status = 0
+            except:
+                LOG.exception('worker %d died', index)
+            os._exit(status)
+
+        os.close(write_fd)
+        os.close(ctl_read_fd)
+        # a worker which doesn't read its ops mustn't block the supervisor
+        flags = fcntl.fcntl(ctl_write_fd, fcntl.F_GETFL)
+        fcntl.fcntl(ctl_write_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        LOG.info('worker %d started pid %d', index, pid)
+        worker = _Worker(index, pid, read_fd, ctl_write_fd)
+        worker.ctl_buf = ''.join(self.ops)
+        self.workers[pid] = worker
+
+    def _supervise(self):
+        next_report = time.time() + self.stats_interval
+        while True:
+            now = time.time()
+            timeout = max(0, next_report - now)
+            if self.restart:
+                timeout = min(timeout,
+                              max(0, min(self.restart.values()) - now))
+
+            fds = [worker.stats_fd for worker in self.workers.values()
+                   if worker.stats_fd is not None]
+            ctl_fds = [worker.ctl_fd for worker in self.workers.values()
+                       if worker.ctl_buf and worker.ctl_fd is not None]
+            try:
+                (readable, writable, _x) = select.select(fds, ctl_fds, [],
+                                                         timeout)
+            except select.error, e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                (readable, writable) = ([], [])
+            for worker in self.workers.values():
+                if worker.stats_fd in readable:
+                    self._read_stats(worker)
+            for worker in self.workers.values():
+                if worker.ctl_buf and worker.ctl_fd in writable:
+                    self._write_ops(worker)
+
+            self._reap()
+
+            now = time.time()
+            for (index, restart_time) in self.restart.items():
+                if restart_time <= now:
+                    del self.restart[index]
+                    self.restart_count += 1
+                    self._spawn(index)
+
+            if now >= next_report:
+                self._log_stats()
+                next_report = now + self.stats_interval
+
+    def _read_stats(self, worker):
+        data = os.read(worker.stats_fd, 65536)
+        if not data:
+            os.close(worker.stats_fd)
+            worker.stats_fd = None
+            return
+
+        lines = (worker.stats_buf + data).split('\n')
+        worker.stats_buf = lines.pop()
+        for line in lines:
+            try:
+                (kind, value) = json.loads(line)
+            except ValueError:
+                LOG.warn('worker %d sent broken stats', worker.index)
+                continue
+            if kind == 'stats':
+                worker.stats = value
+            elif kind == 'op':
+                self._publish(worker, line + '\n')
+
+    def _publish(self, sender, line):
+        self.ops.append(line)
+        for worker in self.workers.values():
+            if worker is not sender:
+                worker.ctl_buf += line
+
+    def _write_ops(self, worker):
+        try:
+            n = os.write(worker.ctl_fd, worker.ctl_buf)
+        except OSError, e:
+            if e.errno == errno.EAGAIN:
+                return
+            if e.errno != errno.EPIPE:
+                raise
+            # the worker died. It is reaped and restarted
+            n = len(worker.ctl_buf)
+        worker.ctl_buf = worker.ctl_buf[n:]
+
+    def _reap(self):
+        while True:
+            try:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+            except OSError, e:
+                if e.errno != errno.ECHILD:
+                    raise
+                return
+            if pid == 0:
+                return
+
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            for fd in (worker.stats_fd, worker.ctl_fd):
+                if fd is not None:
+                    os.close(fd)
+            LOG.warn('worker %d pid %d exited status 0x%x. restarting',
+                     worker.index, pid, status)
+            self.restart[worker.index] = time.time() + self.restart_delay
+
+    def stats(self):
+        """the latest stats of each worker merged by merge_stats()"""
+        stats = merge_stats(worker.stats for worker in self.workers.values())
+        stats['workers'] = len(self.workers)
+        stats['worker_restarts'] = self.restart_count
+        return stats
+
+    def _log_stats(self):
+        stats = sorted(self.stats().items())
+        LOG.info('stats %s', ' '.join('%s=%s' % item for item in stats))
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(1)
+
+
+class _Channel(object):
+    """pipes of a worker to and from the supervisor"""
+
+    def __init__(self, fd, ctl_fd):
+        self.fd = fd
+        self.ctl_fd = ctl_fd
+        self.ppid = os.getppid()
+
+    def _send(self, kind, value):
+        os.write(self.fd, json.dumps([kind, value]) + '\n')
+
+    def __call__(self, stats):
+        self._send('stats', stats)
+
+    def publish(self, op):
+        self._send('op', op)
+
+    def parent_alive(self):
+        return os.getppid() == self.ppid
+
+    def recv_loop(self, apply_op):
+        """call apply_op(op) with the ops published by the other workers
+
+        Runs as a greenlet in a worker.
+        """
+        gevent_os.make_nonblocking(self.ctl_fd)
+        buf = ''
+        while True:
+            data = gevent_os.nb_read(self.ctl_fd, 65536)
+            if not data:
+                return
+            lines = (buf + data).split('\n')
+            buf = lines.pop()
+            for line in lines:
+                apply_op(json.loads(line)[1])
+
+
+class Replicator(object):
+    """replicate the calls of the methods of obj among the workers
+
+    A successful call of the methods is published to the other workers,
+    where apply() calls it in turn.
+    """
+
+    def __init__(self, obj, method_names, channel):
+        self.channel = channel
+        self.methods = {}
+        for name in method_names:
+            method = getattr(obj, name)
+            self.methods[name] = method
+            setattr(obj, name, self._wrap(name, method))
+
+    def _wrap(self, name, method):
+        def replicated(*args):
+            ret = method(*args)
+            self.channel.publish([name, args])
+            return ret
+        return replicated
+
+    def apply(self, op):
+        (name, args) = op
+        try:
+            self.methods[name](*args)
+        except Exception:
+            LOG.exception('replicated %s%r failed', name, tuple(args))
+
+
+def report_loop(report, stats_func, interval=None):
+    """report stats_func() every interval seconds until the supervisor dies
+
+    Runs as a greenlet in a worker.
+    """
+    if interval is None:
+        interval = FLAGS.worker_stats_interval
+    while report.parent_alive():
+        report(stats_func())
+        gevent.sleep(interval)
+    LOG.warn('supervisor died. exiting')
+    os._exit(1)
@@ -0,0 +1,224 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import gevent
+import gflags
+import logging
+import time
+
+LOG = logging.getLogger('ryu.controller.admission')
+
+FLAGS = gflags.FLAGS
+gflags.DEFINE_float('ofp_packet_in_dp_rate', 0,
+                    'packet-ins per second admitted from a datapath '
+                    '(0: unlimited)')
+gflags.DEFINE_integer('ofp_packet_in_dp_burst', 1000,
+                      'packet-ins admitted at once from a datapath')
+gflags.DEFINE_float('ofp_packet_in_port_rate', 0,
+                    'packet-ins per second admitted from a port '
+                    '(0: unlimited)')
+gflags.DEFINE_integer('ofp_packet_in_port_burst', 100,
+                      'packet-ins admitted at once from a port')
+gflags.DEFINE_integer('ofp_packet_in_defer_max', 256,
+                      'packet-ins deferred per port before dropping')
+
+# shortest sleep of the release thread
+_RELEASE_INTERVAL_MIN = 0.001
+
+
+def enabled():
+    return (FLAGS.ofp_packet_in_dp_rate > 0 or
+            FLAGS.ofp_packet_in_port_rate > 0)
+
+
+class TokenBucket(object):
+    """rate tokens per second up to burst. rate 0 means unlimited"""
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.time = now or time.time()
+
+    def refill(self, now):
+        if self.rate <= 0:
+            return
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.time) * self.rate)
+        self.time = now
+
+    def ready(self):
+        return self.rate <= 0 or self.tokens >= 1
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def wait_time(self):
+        """seconds until the next token"""
+        if self.ready():
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _Port(object):
+    def __init__(self, now):
+        self.bucket = TokenBucket(FLAGS.ofp_packet_in_port_rate,
+                                  FLAGS.ofp_packet_in_port_burst, now)
+        self.deferred = collections.deque()
+        self.admitted = 0
+        self.deferred_count = 0
+        self.dropped = 0
+
+    def stats(self):
+        return {'admitted': self.admitted,
+                'deferred': self.deferred_count,
+                'dropped': self.dropped,
+                'backlog': len(self.deferred)}
+
+
+class PacketInAdmission(object):
+    """rate limit the packet-ins of a datapath before dispatch
+
+    A packet-in is admitted when both the token bucket of the datapath
+    and that of its in_port have a token. Otherwise it is deferred in
+    the backlog of the port, or dropped when the backlog is full.
+    A release thread hands deferred packet-ins to deliver() as tokens
+    become available, taking one packet-in from each backlogged port in
+    turn so that a noisy port can't starve the others. The packet-ins
+    of a port stay in order.
+    """
+
+    def __init__(self, deliver, defer_max=None):
+        if defer_max is None:
+            defer_max = FLAGS.ofp_packet_in_defer_max
+        self.deliver = deliver
+        self.defer_max = defer_max
+        self.bucket = TokenBucket(FLAGS.ofp_packet_in_dp_rate,
+                                  FLAGS.ofp_packet_in_dp_burst)
+        self.ports = {}         # in_port -> _Port
+        self.backlog = collections.deque()  # ports with deferred msgs
+        self.release_thr = None
+
+        self.admitted = 0
+        self.deferred_count = 0
+        self.dropped = 0
+        self.released = 0
+
+    def _port(self, in_port, now):
+        port = self.ports.get(in_port)
+        if port is None:
+            port = _Port(now)
+            self.ports[in_port] = port
+        return port
+
+    def admit(self, msgs, packet_in):
+        """return the msgs which can be dispatched now
+
+        packet_in is the message type of packet-in. The other messages
+        are always admitted.
+        """
+        now = time.time()
+        self.bucket.refill(now)
+        admitted = []
+        for msg in msgs:
+            if msg.msg_type != packet_in:
+                admitted.append(msg)
+                continue
+
+            port = self._port(msg.in_port, now)
+            port.bucket.refill(now)
+            if (not port.deferred and self.bucket.ready() and
+                port.bucket.ready()):
+                self.bucket.take()
+                port.bucket.take()
+                port.admitted += 1
+                self.admitted += 1
+                admitted.append(msg)
+            elif len(port.deferred) < self.defer_max:
+                if not port.deferred:
+                    self.backlog.append(port)
+                port.deferred.append(msg)
+                port.deferred_count += 1
+                self.deferred_count += 1
+            else:
+                port.dropped += 1
+                self.dropped += 1
+
+        if self.backlog and self.release_thr is None:
+            self.release_thr = gevent.spawn(self._release_loop)
+        return admitted
+
+    def _release(self, now):
+        """take packet-ins from the backlogged ports in round robin"""
+        self.bucket.refill(now)
+        released = []
+        blocked = 0
+        while self.backlog and blocked < len(self.backlog):
+            if not self.bucket.ready():
+                break
+
+            port = self.backlog.popleft()
+            port.bucket.refill(now)
+            if port.bucket.ready():
+                self.bucket.take()
+                port.bucket.take()
+                released.append(port.deferred.popleft())
+                blocked = 0
+            else:
+                blocked += 1
+            if port.deferred:
+                self.backlog.append(port)
+        return released
+
+    def _wait_time(self):
+        wait = min(port.bucket.wait_time() for port in self.backlog)
+        return max(wait, self.bucket.wait_time(), _RELEASE_INTERVAL_MIN)
+
+    def _release_loop(self):
+        try:
+            while self.backlog:
+                released = self._release(time.time())
+                if released:
+                    self.released += len(released)
+                    self.deliver(released)
+                if self.backlog:
+                    gevent.sleep(self._wait_time())
+        finally:
+            self.release_thr = None
+
+    def port_delete(self, in_port):
+        """forget in_port, dropping the packet-ins deferred from it"""
+        port = self.ports.pop(in_port, None)
+        if port is None:
+            return
+        if port.deferred:
+            self.backlog.remove(port)
+            self.dropped += len(port.deferred)
+
+    def close(self):
+        if self.release_thr is not None:
+            self.release_thr.kill(block=False)
+        self.ports.clear()
+        self.backlog.clear()
+
+    def stats(self):
+        return {'admitted': self.admitted,
+                'deferred': self.deferred_count,
+                'dropped': self.dropped,
+                'released': self.released,
+                'backlog': sum(len(port.deferred) for port in self.backlog),
+                'ports': dict((in_port, port.stats())
+                              for (in_port, port) in self.ports.items())}
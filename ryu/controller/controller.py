@@ -15,19 +15,25 @@
 
 import gflags
 import logging
+import time
 import gevent
+from gevent import event as gevent_event
+from gevent import socket
 from gevent.server import StreamServer
-from gevent.queue import Queue
 
+from ryu import exception
 from ryu.ofproto import ofproto
 from ryu.ofproto import ofproto_parser
 from ryu.ofproto import ofproto_v1_0
 from ryu.ofproto import ofproto_v1_0_parser
 
+from ryu.controller import admission
 from ryu.controller import dispatcher
+from ryu.controller import dpset
 from ryu.controller import event
 from ryu.controller import handler
-from ryu.lib.mac import haddr_to_bin
+from ryu.controller import pending_flow
+from ryu.lib import bounded_queue
 
 LOG = logging.getLogger('ryu.controller.controller')
 
@@ -36,10 +42,82 @@ gflags.DEFINE_string('ofp_listen_host', '', 'openflow listen host')
 gflags.DEFINE_integer('ofp_tcp_listen_port', ofproto.OFP_TCP_PORT,
                       'openflow tcp listen port')
 
+# per-datapath queue limits. When recv_q or ev_q is full, the datapath stops
+# reading from the socket so that TCP pushes back on the switch.
+gflags.DEFINE_integer('ofp_recv_q_high_msgs', 4096,
+                      'receive queue high water mark in messages '
+                      '(0: unlimited)')
+gflags.DEFINE_integer('ofp_recv_q_low_msgs', 2048,
+                      'receive queue low water mark in messages')
+gflags.DEFINE_integer('ofp_recv_q_high_bytes', 16 * 1024 * 1024,
+                      'receive queue high water mark in bytes (0: unlimited)')
+gflags.DEFINE_integer('ofp_recv_q_low_bytes', 8 * 1024 * 1024,
+                      'receive queue low water mark in bytes')
+gflags.DEFINE_integer('ofp_send_q_high_msgs', 4096,
+                      'send queue high water mark in messages (0: unlimited)')
+gflags.DEFINE_integer('ofp_send_q_low_msgs', 2048,
+                      'send queue low water mark in messages')
+gflags.DEFINE_integer('ofp_send_q_high_bytes', 16 * 1024 * 1024,
+                      'send queue high water mark in bytes (0: unlimited)')
+gflags.DEFINE_integer('ofp_send_q_low_bytes', 8 * 1024 * 1024,
+                      'send queue low water mark in bytes')
+gflags.DEFINE_integer('ofp_ev_q_high_msgs', 4096,
+                      'event queue high water mark in events (0: unlimited)')
+gflags.DEFINE_integer('ofp_ev_q_low_msgs', 2048,
+                      'event queue low water mark in events')
+gflags.DEFINE_integer('ofp_ev_q_high_bytes', 16 * 1024 * 1024,
+                      'event queue high water mark in bytes (0: unlimited)')
+gflags.DEFINE_integer('ofp_ev_q_low_bytes', 8 * 1024 * 1024,
+                      'event queue low water mark in bytes')
+
+gflags.DEFINE_float('ofp_send_flush_delay', 0.0,
+                    'seconds to wait for more messages to coalesce into '
+                    'a single write unless a barrier or echo is queued')
+
+gflags.DEFINE_bool('ofp_lazy_decode', False,
+                   'decode message bodies on first attribute access')
+
+gflags.DEFINE_float('ofp_reply_timeout', 10.0,
+                    'seconds to wait for the reply to a request sent with '
+                    'want_reply or in a batch unless a timeout is given')
+
+gflags.DEFINE_float('ofp_recv_throttle_max', 1.0,
+                    'seconds to stop reading from a switch while its queues '
+                    'are full. Then one more recv is read so that echo '
+                    'requests and replies behind the backlog are answered. '
+                    '(0: no limit)')
+
+# The receive buffer must hold the largest message plus the partial
+# message which precedes it.
+_RECV_BUF_SIZE = ofproto.OFP_MSG_SIZE_MAX * 2
+
+# upper bound of the bytes written by a single sendall()
+_SEND_COALESCE_MAX = 256 * 1024
+
+# python 2 doesn't define it. 15 is the value on linux.
+_SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+
+def _reuse_port_listener(address, backlog=128):
+    """listening socket which other processes can bind to as well
+
+    The kernel distributes incoming connections among the processes.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, _SO_REUSEPORT, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    return sock
+
 
 class OpenFlowController(object):
-    def __init__(self):
+    def __init__(self, reuse_port=False):
         super(OpenFlowController, self).__init__()
+        self.reuse_port = reuse_port
+        for (ofproto_mod,
+             ofproto_parser_mod) in Datapath.supported_ofp_version.values():
+            ofproto_parser_mod.set_lazy_decode(FLAGS.ofp_lazy_decode)
 
     # entry point
     def __call__(self):
@@ -47,9 +125,10 @@ class OpenFlowController(object):
         self.server_loop()
 
     def server_loop(self):
-        server = StreamServer((FLAGS.ofp_listen_host,
-                               FLAGS.ofp_tcp_listen_port),
-                              DatapathConnectionFactory)
+        address = (FLAGS.ofp_listen_host, FLAGS.ofp_tcp_listen_port)
+        if self.reuse_port:
+            address = _reuse_port_listener(address)
+        server = StreamServer(address, DatapathConnectionFactory)
         #LOG.debug('loop')
         server.serve_forever()
 
@@ -63,6 +142,136 @@ def _deactivate(method):
     return deactivate
 
 
+class _RecvBuffer(object):
+    """Fixed size receive buffer filled by socket.recv_into()
+
+    Complete messages are handed out as views of the buffer, not copied.
+    The parser copies only what a message keeps, so a parsed message
+    doesn't pin the buffer or the messages following it. The incomplete
+    message at the tail is moved to the head of the buffer only when the
+    free space runs short, so the cost stays linear in the number of
+    received bytes.
+    """
+
+    def __init__(self, size=_RECV_BUF_SIZE):
+        assert size >= ofproto.OFP_MSG_SIZE_MAX * 2
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+
+    def _compact(self):
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+        elif len(self.buf) - self.end < ofproto.OFP_MSG_SIZE_MAX:
+            length = self.end - self.start
+            self.buf[:length] = self.buf[self.start:self.end]
+            self.start = 0
+            self.end = length
+
+    def recv(self, socket):
+        self._compact()
+        ret = socket.recv_into(self.view[self.end:])
+        self.end += ret
+        return ret
+
+    def frames(self):
+        """(version, msg_type, msg_len, xid, buf) of each complete message
+
+        buf is a read-only view of the message, valid until the next
+        recv() overwrites the buffer.
+        """
+        while self.end - self.start >= ofproto.OFP_HEADER_SIZE:
+            (version, msg_type, msg_len, xid) = ofproto_parser.header(
+                self.buf, self.start)
+            if msg_len < ofproto.OFP_HEADER_SIZE:
+                raise exception.OFPMalformedMessage()
+            if self.end - self.start < msg_len:
+                break
+
+            buf = buffer(self.buf, self.start, msg_len)
+            self.start += msg_len
+            yield version, msg_type, msg_len, xid, buf
+
+
+class _HeldPacketIns(list):
+    """packet-ins queued behind the ones of the same flow"""
+
+
+class PendingReply(gevent_event.AsyncResult):
+    """result of Datapath.send_msg(want_reply=True)
+
+    get() returns the reply message, which is OFPErrorMsg when the
+    switch rejected the request. It raises OFPReplyTimeout or
+    OFPDatapathDisconnected when no reply arrives. A request always
+    times out, after ofp_reply_timeout seconds unless given, so get()
+    never waits forever. latency is the seconds between sending the
+    request and receiving the reply.
+    """
+
+    # xids of other requests whose errors are collected by this one
+    entry_xids = ()
+
+    def __init__(self, xid):
+        super(PendingReply, self).__init__()
+        self.xid = xid
+        self.sent = time.time()
+        self.latency = None
+        self.timer = None
+
+    def complete(self, msg):
+        self.latency = time.time() - self.sent
+        self.set(msg)
+
+
+class PendingBatch(PendingReply):
+    """result of Datapath.send_batch()
+
+    Completes when the barrier which ends the batch is answered.
+    get() returns the list of OFPErrorMsg which the switch sent for
+    entries of the batch, so an empty list means that every entry
+    succeeded. The xid of an error is the xid of its entry in msgs, or
+    the xid of the batch when the switch rejected the barrier itself.
+    """
+
+    def __init__(self, xid, msgs):
+        super(PendingBatch, self).__init__(xid)
+        self.msgs = msgs
+        self.entry_xids = [msg.xid for msg in msgs]
+        self.errors = []
+
+    def complete(self, msg):
+        self.latency = time.time() - self.sent
+        if msg.msg_type != msg.datapath.ofproto.OFPT_BARRIER_REPLY:
+            # the barrier failed, so nothing says the entries succeeded
+            self.errors.append(msg)
+        self.set(self.errors)
+
+
+class Batch(object):
+    """flow_mods and packet_outs to be sent by Datapath.send_batch()"""
+
+    def __init__(self, datapath):
+        self.datapath = datapath
+        self.msgs = []
+
+    def __len__(self):
+        return len(self.msgs)
+
+    def add(self, msg):
+        self.msgs.append(msg)
+
+    def flow_mod(self, *args, **kwargs):
+        self.add(self.datapath.flow_mod(*args, **kwargs))
+
+    def packet_out(self, *args, **kwargs):
+        self.add(self.datapath.packet_out(*args, **kwargs))
+
+    def send(self, timeout=None):
+        return self.datapath.send_batch(self.msgs, timeout)
+
+
 class Datapath(object):
     supported_ofp_version = {
         ofproto_v1_0.OFP_VERSION: (ofproto_v1_0,
@@ -77,11 +286,19 @@ class Datapath(object):
         self.address = address
         self.is_active = True
 
-        # XIX limit queue size somehow to prevent it from eating memory up
-        self.recv_q = Queue()
-        self.send_q = Queue()
+        self.recv_q = bounded_queue.BoundedQueue(
+            FLAGS.ofp_recv_q_high_msgs, FLAGS.ofp_recv_q_low_msgs,
+            FLAGS.ofp_recv_q_high_bytes, FLAGS.ofp_recv_q_low_bytes)
+        self.send_q = bounded_queue.BoundedQueue(
+            FLAGS.ofp_send_q_high_msgs, FLAGS.ofp_send_q_low_msgs,
+            FLAGS.ofp_send_q_high_bytes, FLAGS.ofp_send_q_low_bytes)
+        self.send_flush_delay = FLAGS.ofp_send_flush_delay
+        self._send_flush = gevent_event.Event()
 
-        self.ev_q = dispatcher.EventQueue(handler.handshake_dispatcher)
+        self.ev_q = dispatcher.EventQueue(
+            handler.handshake_dispatcher,
+            FLAGS.ofp_ev_q_high_msgs, FLAGS.ofp_ev_q_low_msgs,
+            FLAGS.ofp_ev_q_high_bytes, FLAGS.ofp_ev_q_low_bytes)
 
         self.version_sent = None
         self.version_recv = None
@@ -90,50 +307,337 @@ class Datapath(object):
         self.id = None  # datapath_id is unknown yet
         self.ports = None
 
+        self.pending_flows = None
+        # packet-outs of pending flows dropped while send_q was full
+        self.pending_flow_drops = 0
+        if pending_flow.enabled():
+            self.pending_flows = pending_flow.PendingFlowTable(self.ofproto)
+
+        self.admission = None
+        if admission.enabled():
+            self.admission = admission.PacketInAdmission(self._queue_msgs)
+
+        self.xid = 0
+        self.pending = {}   # xid -> PendingReply
+        self.pending_entries = {}   # xid -> PendingBatch
+
     def set_version(self, version):
         assert version in self.supported_ofp_version
         self.ofproto, self.ofproto_parser = self.supported_ofp_version[version]
+        # messages which the switch sends only in reply to a request
+        self.reply_msg_types = frozenset((
+            self.ofproto.OFPT_ERROR,
+            self.ofproto.OFPT_ECHO_REPLY,
+            self.ofproto.OFPT_VENDOR,
+            self.ofproto.OFPT_FEATURES_REPLY,
+            self.ofproto.OFPT_GET_CONFIG_REPLY,
+            self.ofproto.OFPT_STATS_REPLY,
+            self.ofproto.OFPT_BARRIER_REPLY,
+            self.ofproto.OFPT_QUEUE_GET_CONFIG_REPLY))
+        # messages dispatched ahead of the queued packet-ins
+        self.urgent_msg_types = frozenset((
+            self.ofproto.OFPT_ERROR,
+            self.ofproto.OFPT_BARRIER_REPLY,
+            self.ofproto.OFPT_PORT_STATUS))
+
+    def next_xid(self):
+        # 0 is left for templates and messages sent without Datapath
+        self.xid = self.xid % 0xffffffff + 1
+        return self.xid
+
+    def set_xid(self, msg):
+        if msg.xid is None:
+            msg.xid = self.next_xid()
+        return msg.xid
+
+    def _add_pending(self, result, timeout):
+        # An event handler waiting for a reply stalls the event loop,
+        # which may leave recv_q full and the reply unread. The timeout
+        # breaks such a deadlock.
+        if timeout is None:
+            timeout = FLAGS.ofp_reply_timeout
+        self.pending[result.xid] = result
+        for xid in result.entry_xids:
+            self.pending_entries[xid] = result
+        result.timer = gevent.spawn_later(timeout, self._reply_timeout,
+                                          result.xid, timeout)
+        return result
+
+    def _pop_pending(self, xid):
+        result = self.pending.pop(xid, None)
+        if result is None:
+            return None
+        if result.timer is not None:
+            result.timer.kill(block=False)
+        for entry_xid in result.entry_xids:
+            self.pending_entries.pop(entry_xid, None)
+        return result
+
+    def _reply_timeout(self, xid, timeout):
+        result = self.pending.get(xid)
+        if result is not None:
+            result.timer = None
+            self._pop_pending(xid)
+            result.set_exception(
+                exception.OFPReplyTimeout(xid=xid, timeout=timeout))
+
+    def _reply(self, msg):
+        """complete the pending request of msg
+
+        Returns False when msg is not a reply to a pending request.
+        """
+        if msg.msg_type not in self.reply_msg_types:
+            return False
+
+        if msg.msg_type == self.ofproto.OFPT_ERROR:
+            batch = self.pending_entries.pop(msg.xid, None)
+            if batch is not None:
+                batch.errors.append(msg)
+                return True
+
+        result = self._pop_pending(msg.xid)
+        if result is None:
+            return False
+        result.complete(msg)
+        return True
+
+    def _echo_reply(self, msg):
+        echo_reply = self.ofproto_parser.OFPEchoReply(self)
+        echo_reply.xid = msg.xid
+        echo_reply.data = msg.data
+        echo_reply.serialize()
+        self.send(echo_reply.buf, flush=True, urgent=True)
+
+    def _classify(self, msgs):
+        """sort received msgs into (urgent, normal, held) lists
+
+        Echo requests are answered here so that the reply doesn't wait
+        behind queued events. Replies to pending requests complete them.
+        Packet-ins of the same flow as an earlier one in msgs are held
+        until the earlier one is handled, which may add the flow.
+        """
+        urgent = []
+        normal = []
+        held = []
+        flows = set()
+        for msg in msgs:
+            msg_type = msg.msg_type
+            if msg_type == self.ofproto.OFPT_ECHO_REQUEST:
+                self._echo_reply(msg)
+            elif self.pending and self._reply(msg):
+                pass
+            elif (msg_type == self.ofproto.OFPT_PACKET_IN and
+                  self.pending_flows is not None):
+                if self._answer_pending_flow(msg, block=False):
+                    pass
+                elif self.pending_flows.duplicate(msg, flows):
+                    held.append(msg)
+                else:
+                    normal.append(msg)
+            elif msg_type in self.urgent_msg_types:
+                if (msg_type == self.ofproto.OFPT_PORT_STATUS and
+                    self.pending_flows is not None):
+                    self.pending_flows.flush()
+                urgent.append(msg)
+            else:
+                normal.append(msg)
+        return (urgent, normal, held)
+
+    def _release_held(self, msgs):
+        """held packet-ins which their flow doesn't answer by now"""
+        msgs = [msg for msg in msgs if not self._answer_pending_flow(msg)]
+        if msgs and self.admission is not None:
+            msgs = self.admission.admit(msgs, self.ofproto.OFPT_PACKET_IN)
+        return msgs
+
+    def _admission_port_delete(self, msgs):
+        for msg in msgs:
+            if (msg.msg_type == self.ofproto.OFPT_PORT_STATUS and
+                msg.reason == self.ofproto.OFPPR_DELETE):
+                self.admission.port_delete(msg.desc.port_no)
+
+    def _answer_pending_flow(self, msg, block=True):
+        """send the packet-out of msg if its flow is pending
+
+        With block=False, as in the receive loop, the packet-out is
+        dropped while send_q is full. Waiting there for a switch which
+        doesn't read would stop reading from it as well.
+        """
+        actions = self.pending_flows.packet_in(msg)
+        if actions is None:
+            return False
+
+        if not block and self.send_q.full():
+            self.pending_flow_drops += 1
+            return True
+
+        data = None
+        if msg.buffer_id == 0xffffffff:
+            data = msg.data
+        packet_out = self.packet_out(msg.buffer_id, msg.in_port, actions,
+                                     data)
+        self.set_xid(packet_out)
+        packet_out.serialize()
+        self.send(packet_out.buf, block=block)
+        return True
+
+    def _track_flow_mod(self, msg):
+        if (self.pending_flows is not None and
+            msg.msg_type == self.ofproto.OFPT_FLOW_MOD):
+            self.pending_flows.flow_mod(msg.match, msg.command, msg.actions)
+
+    def _disconnect_pending(self):
+        for xid in self.pending.keys():
+            result = self._pop_pending(xid)
+            result.set_exception(exception.OFPDatapathDisconnected(xid=xid))
 
     # Low level socket handling layer
     @_deactivate
     def _recv_loop(self):
-        buf = bytearray()
-        required_len = ofproto.OFP_HEADER_SIZE
+        recv_buf = _RecvBuffer()
 
         while self.is_active:
-            ret = self.socket.recv(ofproto.OFP_MSG_SIZE_MAX)
-            if len(ret) == 0:
+            # stop reading while the queues are full so that
+            # TCP flow control throttles the switch. A stalled event loop
+            # would also keep echo requests unanswered and time out the
+            # connection, so the stall is bounded.
+            timeout = FLAGS.ofp_recv_throttle_max or None
+            throttled = not (self.recv_q.wait_not_full(timeout) and
+                             self.ev_q.wait_not_full(timeout))
+
+            if recv_buf.recv(self.socket) == 0:
                 self.is_active = False
                 break
-            buf += ret
-            while len(buf) >= required_len:
-                (version, msg_type, msg_len, xid) = ofproto_parser.header(buf)
-                required_len = msg_len
-                if len(buf) < required_len:
-                    break
-
-                msg = ofproto_parser.msg(self,
-                                         version, msg_type, msg_len, xid, buf)
-                #LOG.debug('queue msg %s cls %s', msg, msg.__class__)
-                self.recv_q.put(msg)
 
-                buf = buf[required_len:]
-                required_len = ofproto.OFP_HEADER_SIZE
+            # parse every complete message at once and hand them over
+            # to the event loop in a single queue operation
+            msgs = [ofproto_parser.msg(self,
+                                       version, msg_type, msg_len, xid, buf)
+                    for (version, msg_type, msg_len, xid,
+                         buf) in recv_buf.frames()]
+
+            # replies to pending requests are correlated here rather than
+            # in the event loop whose handlers may be waiting for them
+            (urgent, normal, held) = self._classify(msgs)
+            if urgent:
+                self.recv_q.put_urgent(urgent, len(urgent),
+                                       sum(msg.msg_len for msg in urgent))
+            if normal and self.admission is not None:
+                normal = self.admission.admit(normal,
+                                              self.ofproto.OFPT_PACKET_IN)
+            if urgent and self.admission is not None:
+                # after admit(), which may see packet-ins of the port
+                self._admission_port_delete(urgent)
+            if normal:
+                # beyond the high water mark when throttled
+                self._queue_msgs(normal, block=not throttled)
+            if held:
+                # behind the packet-ins they duplicate
+                self.recv_q.put(_HeldPacketIns(held), len(held),
+                                sum(msg.msg_len for msg in held),
+                                block=False)
+
+    def _queue_msgs(self, msgs, block=True):
+        #LOG.debug('queue msgs %s', msgs)
+        self.recv_q.put(msgs, len(msgs), sum(msg.msg_len for msg in msgs),
+                        block=block)
 
     @_deactivate
     def _send_loop(self):
         while self.is_active:
             buf = self.send_q.get()
-            self.socket.sendall(buf)
-
-    def send(self, buf):
-        self.send_q.put(buf)
-
-    def send_msg(self, msg):
+            if self.send_flush_delay > 0:
+                # give the sender a chance to queue more messages
+                self._send_flush.wait(self.send_flush_delay)
+            self._send_flush.clear()
+
+            # write everything queued so far with a single sendall()
+            bufs = [buf]
+            size = len(buf)
+            while not self.send_q.empty() and size < _SEND_COALESCE_MAX:
+                buf = self.send_q.get()
+                bufs.append(buf)
+                size += len(buf)
+
+            if len(bufs) == 1:
+                self.socket.sendall(bufs[0])
+            else:
+                self.socket.sendall(bytearray().join(bufs))
+
+    def send(self, buf, flush=False, urgent=False, block=True):
+        """queue buf which must be str or bytearray
+
+        flush=True makes the send loop write without waiting
+        for ofp_send_flush_delay. urgent=True puts buf ahead of
+        the queued messages without blocking. block=False queues buf
+        even beyond the high water mark of send_q.
+        """
+        if urgent:
+            self.send_q.put_urgent(buf, 1, len(buf))
+        else:
+            # block the sender while send_q is full
+            self.send_q.put(buf, 1, len(buf), block=block)
+        if flush:
+            self._send_flush.set()
+
+    def _needs_flush(self, msg):
+        # barrier and echo are latency sensitive
+        return msg.msg_type in (self.ofproto.OFPT_BARRIER_REQUEST,
+                                self.ofproto.OFPT_ECHO_REQUEST,
+                                self.ofproto.OFPT_ECHO_REPLY)
+
+    def send_msg(self, msg, want_reply=False, timeout=None):
+        """serialize msg with a new xid unless msg.xid is set and queue it
+
+        When want_reply is True, returns a PendingReply which completes
+        with the reply or error message of the same xid. Such a reply is
+        not dispatched to the event handlers. Waiting for it in an event
+        handler stalls the event loop of this datapath, so give a short
+        timeout in seconds in that case. It defaults to
+        ofp_reply_timeout.
+        """
         assert isinstance(msg, self.ofproto_parser.MsgBase)
+        self.set_xid(msg)
+        result = None
+        if want_reply:
+            result = self._add_pending(PendingReply(msg.xid), timeout)
         msg.serialize()
         # LOG.debug('send_msg %s', msg)
-        self.send(msg.buf)
+        self._track_flow_mod(msg)
+        self.send(msg.buf, self._needs_flush(msg))
+        return result
+
+    def send_msgs(self, msgs):
+        """serialize msgs back to back into one buffer and queue it"""
+        buf = bytearray(sum(msg.serialized_len() for msg in msgs))
+        offset = 0
+        flush = False
+        for msg in msgs:
+            assert isinstance(msg, self.ofproto_parser.MsgBase)
+            self.set_xid(msg)
+            offset = msg.serialize(buf, offset)
+            self._track_flow_mod(msg)
+            flush = flush or self._needs_flush(msg)
+        self.send(buf, flush)
+
+    def send_batch(self, msgs, timeout=None):
+        """send msgs back to back followed by a single barrier
+
+        All of them are written at once. Returns a PendingBatch which
+        completes with the errors of msgs when the barrier is answered.
+        """
+        for msg in msgs:
+            self.set_xid(msg)
+        barrier_request = self.ofproto_parser.OFPBarrierRequest(self)
+        self.set_xid(barrier_request)
+
+        result = self._add_pending(
+            PendingBatch(barrier_request.xid, msgs), timeout)
+        self.send_msgs(msgs + [barrier_request])
+        return result
+
+    def batch(self):
+        return Batch(self)
 
     def serve(self):
         send_thr = gevent.spawn(self._send_loop)
@@ -144,15 +648,56 @@ class Datapath(object):
         hello = self.ofproto_parser.OFPHello(self)
         self.send_msg(hello)
 
-        self._recv_loop()
+        try:
+            self._recv_loop()
+        finally:
+            dpset.dpset.unregister(self)
+            self._disconnect_pending()
+            if self.admission is not None:
+                self.admission.close()
         gevent.joinall([ev_thr, send_thr])
 
     @_deactivate
     def _event_loop(self):
         while self.is_active:
-            msg = self.recv_q.get()
-            #LOG.debug('_event_loop ev %s cls %s', msg, msg.__class__)
-            self.ev_q.queue(event.ofp_msg_to_ev(msg))
+            msgs = self.recv_q.get()
+            #LOG.debug('_event_loop msgs %s', msgs)
+            if isinstance(msgs, _HeldPacketIns):
+                msgs = self._release_held(msgs)
+                if not msgs:
+                    continue
+            self.ev_q.queue_batch([event.ofp_msg_to_ev(msg) for msg in msgs])
+
+    def queue_stats(self):
+        return {'recv_q': self.recv_q.stats(),
+                'send_q': self.send_q.stats(),
+                'ev_q': self.ev_q.ev_q.stats()}
+
+    def pending_flow_stats(self):
+        if self.pending_flows is None:
+            return None
+        stats = self.pending_flows.stats()
+        stats['dropped'] = self.pending_flow_drops
+        return stats
+
+    def admission_stats(self):
+        if self.admission is None:
+            return None
+        return self.admission.stats()
+
+    def send_template(self, template, **kwargs):
+        """queue a copy of template with the fields in kwargs patched
+
+        template is made by OFPFlowMod.template() or
+        OFPPacketOut.template() of self.ofproto_parser.
+        A new xid is patched in unless kwargs has one.
+        """
+        if 'xid' not in kwargs:
+            kwargs['xid'] = self.next_xid()
+        if (self.pending_flows is not None and
+            template.msg_type == self.ofproto.OFPT_FLOW_MOD):
+            self.pending_flows.flow_mod_template(template, kwargs)
+        self.send(template.patch(**kwargs))
 
     def send_ev(self, ev):
         #LOG.debug('send_ev %s', ev)
@@ -161,37 +706,38 @@ class Datapath(object):
     #
     # Utility methods for convenience
     #
-    def send_packet_out(self, buffer_id=0xffffffff, in_port=None,
-                        actions=None, data=None):
+    def packet_out(self, buffer_id=0xffffffff, in_port=None,
+                   actions=None, data=None):
         if in_port is None:
             in_port = self.ofproto.OFPP_NONE
-        packet_out = self.ofproto_parser.OFPPacketOut(
+        return self.ofproto_parser.OFPPacketOut(
             self, buffer_id, in_port, actions, data)
-        self.send_msg(packet_out)
 
-    def send_flow_mod(self, match, cookie, command, idle_timeout, hard_timeout,
-                      priority, buffer_id=0xffffffff,
-                      out_port=None, flags=0, actions=None):
+    def send_packet_out(self, *args, **kwargs):
+        self.send_msg(self.packet_out(*args, **kwargs))
+
+    def flow_mod(self, match, cookie, command, idle_timeout, hard_timeout,
+                 priority, buffer_id=0xffffffff,
+                 out_port=None, flags=0, actions=None):
         if out_port is None:
             out_port = self.ofproto.OFPP_NONE
-        flow_mod = self.ofproto_parser.OFPFlowMod(
+        return self.ofproto_parser.OFPFlowMod(
             self, match, cookie, command, idle_timeout, hard_timeout,
             priority, buffer_id, out_port, flags, actions)
-        self.send_msg(flow_mod)
+
+    def send_flow_mod(self, *args, **kwargs):
+        self.send_msg(self.flow_mod(*args, **kwargs))
 
     def send_delete_all_flows(self):
-        addr = haddr_to_bin('00:00:00:00:00:00')
-        match = self.ofproto_parser.OFPMatch(self.ofproto.OFPFW_ALL,
-                                             0, addr, addr, 0, 0,
-                                             0, 0, 0, 0, 0, 0, 0)
+        match = self.ofproto_parser.OFPMatch.from_fields(())
         self.send_flow_mod(
             match=match, cookie=0, command=self.ofproto.OFPFC_DELETE,
             idle_timeout=0, hard_timeout=0, priority=0, buffer_id=0,
             out_port=self.ofproto.OFPP_NONE, flags=0, actions=None)
 
-    def send_barrier(self):
+    def send_barrier(self, want_reply=False, timeout=None):
         barrier_request = self.ofproto_parser.OFPBarrierRequest(self)
-        self.send_msg(barrier_request)
+        return self.send_msg(barrier_request, want_reply, timeout)
 
 
 def DatapathConnectionFactory(socket, address):
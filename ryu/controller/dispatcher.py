@@ -13,24 +13,38 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import copy
+import inspect
+import itertools
 import logging
-from gevent import queue
+
+from ryu.lib import bounded_queue
 
 LOG = logging.getLogger('ryu.controller.dispatcher')
 
 
+def _ev_size(ev):
+    msg = getattr(ev, 'msg', None)
+    return getattr(msg, 'msg_len', None) or 0
+
+
 class EventQueue(object):
-    def __init__(self, dispatcher):
+    def __init__(self, dispatcher, high_msgs=0, low_msgs=0,
+                 high_bytes=0, low_bytes=0):
         self.dispatcher = dispatcher
         self.is_dispatching = False
-        self.ev_q = queue.Queue()
+        self.ev_q = bounded_queue.BoundedQueue(high_msgs, low_msgs,
+                                               high_bytes, low_bytes)
 
     def set_dispatcher(self, dispatcher):
         self.dispatcher = dispatcher
 
     def queue_raw(self, ev):
-        self.ev_q.put(ev)
+        # ev_q is drained by the dispatching thread itself.
+        # So never block here.
+        self.ev_q.put(ev, 1, _ev_size(ev), block=False)
+
+    def wait_not_full(self, timeout=None):
+        return self.ev_q.wait_not_full(timeout)
 
     class _EventQueueGuard(object):
         def __init__(self, ev_q):
@@ -52,27 +66,95 @@ class EventQueue(object):
             assert self.ev_q.empty()
 
             self.dispatcher(ev)
-            while not self.ev_q.empty():
-                ev = self.ev_q.get()
-                self.dispatcher(ev)
+            self._dispatch_queued()
+
+    def queue_batch(self, evs):
+        """queue a list of events which arrived at once
+
+        Consecutive events of the same class are handed to the dispatcher
+        as a single batch.
+        """
+        if self.is_dispatching:
+            for ev in evs:
+                self.queue_raw(ev)
+            return
+
+        with self._EventQueueGuard(self):
+            assert self.ev_q.empty()
+
+            for ev_cls, batch in itertools.groupby(evs,
+                                                   lambda ev: ev.__class__):
+                self.dispatcher.dispatch_batch(list(batch))
+                self._dispatch_queued()
+
+    def _dispatch_queued(self):
+        while not self.ev_q.empty():
+            ev = self.ev_q.get()
+            self.dispatcher(ev)
 
 
 class EventDispatcher(object):
+    """dispatch events to the handlers of their class and its bases
+
+    Handler lists are immutable tuples replaced on un/registration, so
+    dispatch iterates them without copying even when a handler blocks
+    and other handlers are un/registered meanwhile. The handlers of
+    each event class, resolved along its MRO, are cached until the next
+    un/registration.
+    """
+
     def __init__(self, name):
         self.name = name
-        self.events = {}
+        self.events = {}        # ev_cls -> tuple of handlers
+        self.batch_events = {}  # ev_cls -> tuple of batch handlers
+        self._invalidate()
+
+    def _invalidate(self):
+        self._routes = {}       # ev_cls -> (handlers, batch handlers)
+
+    def _resolve(self, ev_cls):
+        mro = inspect.getmro(ev_cls)
+        route = tuple(tuple(itertools.chain.from_iterable(
+                    events.get(cls, ()) for cls in mro))
+                      for events in (self.events, self.batch_events))
+        self._routes[ev_cls] = route
+        return route
+
+    def _route(self, ev_cls):
+        route = self._routes.get(ev_cls)
+        if route is None:
+            route = self._resolve(ev_cls)
+        return route
+
+    def has_handlers(self, ev_cls):
+        (handlers, batch_handlers) = self._route(ev_cls)
+        return bool(handlers or batch_handlers)
+
+    def _events(self, handler):
+        if getattr(handler, 'ev_batch', False):
+            return self.batch_events
+        return self.events
 
     def register_handler(self, ev_cls, handler):
         assert callable(handler)
-        self.events.setdefault(ev_cls, [])
-        self.events[ev_cls].append(handler)
+        events = self._events(handler)
+        events[ev_cls] = events.get(ev_cls, ()) + (handler, )
+        self._invalidate()
 
     def register_handlers(self, handlers):
         for ev_cls, h in handlers:
             self.register_handler(ev_cls, h)
 
     def unregister_handler(self, ev_cls, handler):
-        del self.events[ev_cls][handler]
+        events = self._events(handler)
+        handlers = events[ev_cls]
+        assert handler in handlers
+        handlers = tuple(h for h in handlers if h != handler)
+        if handlers:
+            events[ev_cls] = handlers
+        else:
+            del events[ev_cls]
+        self._invalidate()
 
     def register_static(self, ev_cls):
         '''helper decorator to statically register handler for event class'''
@@ -89,20 +171,38 @@ class EventDispatcher(object):
         self.dispatch(ev)
 
     def dispatch(self, ev):
+        """dispatch ev
+
+        Handlers registered with batch=True are called with [ev].
+        """
         #LOG.debug('dispatch %s', ev)
-        if ev.__class__ not in self.events:
+        (handlers, batch_handlers) = self._route(ev.__class__)
+        if not handlers and not batch_handlers:
             LOG.info('unhandled event %s', ev)
             return
 
-        # Is this necessary?
-        #
-        # copy handler list because the list is not stable.
-        # event handler may block/switch thread execution
-        # and un/register other handlers.
-        #
-        handlers = copy.copy(self.events[ev.__class__])
+        self._call(handlers, ev)
+        if batch_handlers:
+            self._call(batch_handlers, [ev])
+
+    def dispatch_batch(self, evs):
+        """dispatch a list of events of the same class
+
+        Handlers registered with batch=True are called once with the list,
+        the other handlers are called once per event.
+        """
+        (handlers, batch_handlers) = self._route(evs[0].__class__)
+        if not handlers and not batch_handlers:
+            LOG.info('unhandled events %s', evs)
+            return
+
+        if handlers:
+            for ev in evs:
+                self._call(handlers, ev)
+        self._call(batch_handlers, evs)
 
+    @staticmethod
+    def _call(handlers, arg):
         for h in handlers:
-            ret = h(ev)
-            if ret is False:
+            if h(arg) is False:
                 break
@@ -0,0 +1,89 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from ryu.controller import dispatcher
+from ryu.controller import event
+
+LOG = logging.getLogger('ryu.controller.dpset')
+
+
+dpset_dispatcher = dispatcher.EventDispatcher('dpset')
+
+
+class EventDP(event.EventBase):
+    """dp entered (enter is True) or left (enter is False) the DPSet"""
+
+    __slots__ = ('dp', 'enter')
+
+    def __init__(self, dp, enter):
+        self.dp = dp
+        self.enter = enter
+
+
+class DPSet(object):
+    """datapaths connected to this process, keyed by datapath id
+
+    A datapath is registered once its features reply is received and
+    unregistered when its connection is closed. Either is notified to
+    the handlers of dpset_dispatcher, if any, by EventDP.
+    """
+
+    def __init__(self):
+        self.dps = {}
+
+    def register(self, dp):
+        assert dp.id is not None
+        old_dp = self.dps.get(dp.id)
+        if old_dp is not None and old_dp is not dp:
+            LOG.warn('datapath %s reconnected', dp.id)
+        self.dps[dp.id] = dp
+        self._notify(dp, True)
+
+    def unregister(self, dp):
+        if dp.id is not None and self.dps.get(dp.id) is dp:
+            del self.dps[dp.id]
+            self._notify(dp, False)
+
+    @staticmethod
+    def _notify(dp, enter):
+        if dpset_dispatcher.has_handlers(EventDP):
+            dpset_dispatcher(EventDP(dp, enter))
+
+    def get(self, dpid):
+        return self.dps.get(dpid)
+
+    def get_all(self):
+        return self.dps.items()
+
+    def stats(self):
+        """datapath count and datapath gauges summed over the datapaths"""
+        stats = {'datapaths': len(self.dps)}
+        for dp in self.dps.values():
+            for (q_name, q_stats) in dp.queue_stats().items():
+                for (name, value) in q_stats.items():
+                    key = '%s_%s' % (q_name, name)
+                    stats[key] = stats.get(key, 0) + value
+
+            admission = dp.admission_stats()
+            if admission is not None:
+                for name in ('admitted', 'deferred', 'dropped', 'released',
+                             'backlog'):
+                    key = 'packet_in_' + name
+                    stats[key] = stats.get(key, 0) + admission[name]
+        return stats
+
+
+dpset = DPSet()
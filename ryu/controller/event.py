@@ -18,10 +18,12 @@ import inspect
 
 class EventBase(object):
     # Nothing yet
-    pass
+    __slots__ = ()
 
 
 class EventOFPMsgBase(EventBase):
+    __slots__ = ('msg', )
+
     def __init__(self, msg):
         self.msg = msg
 
@@ -30,7 +32,7 @@ class EventOFPMsgBase(EventBase):
 # Create event type corresponding to OFP Msg
 #
 
-_OFP_MSG_EVENTS = {}
+_OFP_MSG_EVENTS = {}    # msg class -> event class
 
 
 def _ofp_msg_name_to_ev_name(msg_name):
@@ -38,28 +40,26 @@ def _ofp_msg_name_to_ev_name(msg_name):
 
 
 def ofp_msg_to_ev(msg):
-    name = _ofp_msg_name_to_ev_name(msg.__class__.__name__)
-    return _OFP_MSG_EVENTS[name](msg)
+    return _OFP_MSG_EVENTS[msg.__class__](msg)
 
 
 def _create_ofp_msg_ev_class(msg_cls):
+    if msg_cls in _OFP_MSG_EVENTS:
+        return
+
     name = _ofp_msg_name_to_ev_name(msg_cls.__name__)
     # print 'creating event %s' % name
 
-    if name in _OFP_MSG_EVENTS:
-        return
-
-    cls = type(name, (EventOFPMsgBase,),
-               dict(__init__=lambda self, msg:
-                    super(self.__class__, self).__init__(msg)))
-    globals()[name] = cls
-    _OFP_MSG_EVENTS[name] = cls
+    cls = globals().get(name)
+    if cls is None:
+        cls = type(name, (EventOFPMsgBase,), dict(__slots__=()))
+        globals()[name] = cls
+    _OFP_MSG_EVENTS[msg_cls] = cls
 
 
 def _create_ofp_msg_ev_from_module(modname):
     (f, s, t) = modname.rpartition('.')
     mod = __import__(modname, fromlist=[f])
-    print mod
     for k, cls in mod.__dict__.items():
         if not inspect.isclass(cls):
             continue
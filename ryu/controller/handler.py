@@ -20,6 +20,7 @@ import struct
 
 from ryu.controller import event
 from ryu.controller import dispatcher
+from ryu.controller import dpset
 from ryu.lib.mac import haddr_to_bin
 
 LOG = logging.getLogger('ryu.controller.handler')
@@ -29,11 +30,18 @@ config_dispatcher = dispatcher.EventDispatcher('config')
 main_dispatcher = dispatcher.EventDispatcher('main')
 
 
-def set_ev_cls(ev_cls, dispatchers=None):
+def set_ev_cls(ev_cls, dispatchers=None, batch=False):
+    """decorator to mark event handler
+
+    When batch is True, the handler is called with a list of the events
+    of ev_cls which were received at once instead of each event.
+    """
     def _set_ev_cls_dec(handler):
         handler.ev_cls = ev_cls
         if dispatchers is not None:
             handler.dispatchers = dispatchers
+        if batch:
+            handler.ev_batch = True
         return handler
     return _set_ev_cls_dec
 
@@ -81,7 +89,12 @@ def register_cls(dispatchers=None):
     return _register_cls_method
 
 
-def register_instance(i, dispatchers=None):
+def register_instance(i, dispatchers=None, wrap=None):
+    """register the event handlers of instance i
+
+    When wrap is given, wrap(handler) is registered instead of each
+    handler.
+    """
     dispatchers = _listify(dispatchers)
 
     for k, m in inspect.getmembers(i, inspect.ismethod):
@@ -89,12 +102,15 @@ def register_instance(i, dispatchers=None):
         if not _is_ev_handler(m):
             continue
 
+        h = m
+        if wrap is not None:
+            h = wrap(m)
         _dispatchers = _get_hnd_spec_dispatchers(m, dispatchers)
         # LOG.debug("_dispatchers %s", _dispatchers)
         for d in _dispatchers:
             # LOG.debug('register dispatcher %s ev %s k %s m %s',
             #           d.name, m.ev_cls, k, m)
-            d.register_handler(m.ev_cls, m)
+            d.register_handler(m.ev_cls, h)
 
 
 @register_cls([handshake_dispatcher, config_dispatcher, main_dispatcher])
@@ -106,6 +122,7 @@ class EchoHandler(object):
         # LOG.debug('echo request msg %s %s', msg, str(msg.data))
         datapath = msg.datapath
         echo_reply = datapath.ofproto_parser.OFPEchoReply(datapath)
+        echo_reply.xid = msg.xid
         echo_reply.data = msg.data
         datapath.send_msg(echo_reply)
 
@@ -143,6 +160,7 @@ class HandShakeHandler(object):
         if msg.version not in datapath.supported_ofp_version:
             # send the error
             error_msg = datapath.ofproto_parser.OFPErrorMsg(datapath)
+            error_msg.xid = msg.xid
             error_msg.type = datapath.ofproto.OFPET_HELLO_FAILED
             error_msg.code = datapath.ofproto.OFPHFC_INCOMPATIBLE
             error_msg.data = 'unsupported version 0x%x' % msg.version
@@ -172,6 +190,7 @@ class ConfigHandler(object):
 
         datapath.id = msg.datapath_id
         datapath.ports = msg.ports
+        dpset.dpset.register(datapath)
 
         ofproto = datapath.ofproto
         ofproto_parser = datapath.ofproto_parser
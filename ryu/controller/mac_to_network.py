@@ -16,12 +16,13 @@
 import logging
 
 from ryu.exception import MacAddressDuplicated
-from ryu.lib.mac import haddr_to_str
 
 LOG = logging.getLogger('ryu.controller.mac_to_network')
 
 
 class MacToNetwork(object):
+    """MAC addr -> network id. MAC addresses are ryu.lib.mac.Mac"""
+
     def __init__(self, nw):
         self.mac_to_net = {}
         self.dpid = {}
@@ -39,7 +40,7 @@ class MacToNetwork(object):
         if _nw_id is None or _nw_id == nw_id_external:
             self.mac_to_net[mac] = nw_id
             LOG.debug('overwrite nw_id: mac %s nw old %s new %s',
-                      haddr_to_str(mac), _nw_id, nw_id)
+                      mac, _nw_id, nw_id)
             return
 
         if nw_id == nw_id_external:
@@ -48,9 +49,9 @@ class MacToNetwork(object):
             return
 
         LOG.warn('duplicated nw_id: mac %s nw old %s new %s',
-                 haddr_to_str(mac), _nw_id, nw_id)
+                 mac, _nw_id, nw_id)
 
-        raise MacAddressDuplicated(mac=mac)
+        raise MacAddressDuplicated(mac=mac.to_str())
 
     def del_mac(self, mac):
         del self.mac_to_net[mac]
@@ -13,36 +13,231 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
+import gflags
 import logging
-from ryu.lib.mac import haddr_to_str
+import time
+
+from ryu.controller import dispatcher
+from ryu.controller import event
 
 LOG = logging.getLogger('ryu.controller.mac_to_port')
 
+FLAGS = gflags.FLAGS
+gflags.DEFINE_integer('mac_table_aging_time', 300,
+                      'seconds a learned MAC address is kept without '
+                      'being seen (0: forever)')
+gflags.DEFINE_integer('mac_table_max_entries', 8192,
+                      'MAC addresses learned per datapath. The least '
+                      'recently seen one is evicted (0: unlimited)')
 
-class MacToPortTable(object):
-    """MAC addr <-> (dpid, port name)"""
+# A learned address is moved to the recent end of its table at most
+# once per _REFRESH_INTERVAL seconds, which is the granularity of aging.
+_REFRESH_INTERVAL = 1.0
+
+
+mac_dispatcher = dispatcher.EventDispatcher('mac')
+
+
+class EventHostMoved(event.EventBase):
+    """mac was seen on port of dpid instead of the port it was learned on
+
+    stale is {dpid: port} of the locations which were forgotten, the old
+    port of dpid included.
+    """
+
+    __slots__ = ('mac', 'dpid', 'port', 'stale')
+
+    def __init__(self, mac, dpid, port, stale):
+        self.mac = mac
+        self.dpid = dpid
+        self.port = port
+        self.stale = stale
+
+
+class MacIndex(object):
+    """MAC addr -> {dpid: port} learned by a MacToPortTable"""
 
     def __init__(self):
-        self.mac_to_port = {}
+        self.locations = {}
+        self.moves = 0
+
+    def get(self, mac):
+        return self.locations.get(mac, {})
+
+    def add(self, mac, dpid, port):
+        locations = self.locations.get(mac)
+        if locations is None:
+            self.locations[mac] = {dpid: port}
+        else:
+            locations[dpid] = port
+
+    def remove(self, mac, dpid):
+        locations = self.locations.get(mac)
+        if locations is not None:
+            locations.pop(dpid, None)
+            if not locations:
+                del self.locations[mac]
+
+    def move(self, mac, dpid, port):
+        """mac moved to port of dpid. returns the previous locations"""
+        self.moves += 1
+        stale = self.locations.get(mac, {})
+        self.locations[mac] = {dpid: port}
+        return stale
+
+    def stats(self):
+        return {'macs': len(self.locations),
+                'locations': sum(len(locations)
+                                 for locations in self.locations.values()),
+                'moves': self.moves}
+
+
+class _DatapathTable(collections.OrderedDict):
+    """MAC addr -> (port, last seen) in least recently seen order"""
+
+    def __init__(self, dpid):
+        super(_DatapathTable, self).__init__()
+        self.dpid = dpid
+        self.next_aging = 0
+
+
+class MacToPortTable(object):
+    """MAC addr <-> (dpid, port name). MAC addresses are ryu.lib.mac.Mac
+
+    The addresses of each datapath are ordered by when they were last
+    seen, so aging pops expired addresses off the old end in amortized
+    O(1) and a full table evicts its least recently seen address.
+
+    The learned addresses are also kept in index, a MacIndex of this
+    table. An address moved when it is seen on another port of a
+    datapath, or, given is_edge_port(dpid, port), on an edge port while
+    it was learned on an edge port of another datapath. A moved address
+    is forgotten by the other datapaths and EventHostMoved is dispatched
+    to mac_dispatcher if it has a handler.
+
+    Without is_edge_port, an address seen on other datapaths isn't taken
+    for a move, as it is usually the same host seen over the links
+    between them.
+    """
+
+    def __init__(self, aging_time=None, max_entries=None, index=None,
+                 is_edge_port=None):
+        if aging_time is None:
+            aging_time = FLAGS.mac_table_aging_time
+        if max_entries is None:
+            max_entries = FLAGS.mac_table_max_entries
+        if index is None:
+            index = MacIndex()
+        self.aging_time = aging_time
+        self.max_entries = max_entries
+        self.index = index
+        self.is_edge_port = is_edge_port
+        self.mac_to_port = {}   # dpid -> _DatapathTable
+
+        self.learned = 0
+        self.moved = 0
+        self.evicted = 0
+        self.aged = 0
 
     def dpid_add(self, dpid):
-        LOG.debug('dpid_add: 0x%016x', dpid)
-        self.mac_to_port.setdefault(dpid, {})
+        if dpid not in self.mac_to_port:
+            LOG.debug('dpid_add: 0x%016x', dpid)
+            self.mac_to_port[dpid] = _DatapathTable(dpid)
+        return self.mac_to_port[dpid]
+
+    def dpid_del(self, dpid):
+        table = self.mac_to_port.pop(dpid, None)
+        if table is not None:
+            for mac in table:
+                self.index.remove(mac, dpid)
+
+    def _age(self, table, now):
+        if not self.aging_time or now < table.next_aging:
+            return
+        table.next_aging = now + _REFRESH_INTERVAL
+
+        deadline = now - self.aging_time
+        while table:
+            mac = next(iter(table))
+            if table[mac][1] > deadline:
+                break
+            del table[mac]
+            self.index.remove(mac, table.dpid)
+            self.aged += 1
 
     def port_add(self, dpid, port, mac):
         """
         :returns: old port if learned. (this may be = port)
                   None otherwise
         """
-        old_port = self.mac_to_port[dpid].get(mac, None)
-        self.mac_to_port[dpid][mac] = port
+        table = self.mac_to_port.get(dpid)
+        if table is None:
+            table = self.dpid_add(dpid)
+        now = time.time()
+        self._age(table, now)
 
-        if old_port is not None and old_port != port:
-            LOG.debug('port_add: 0x%016x 0x%04x %s',
-                      dpid, port, haddr_to_str(mac))
+        entry = table.get(mac)
+        if entry is None:
+            if self.max_entries and len(table) >= self.max_entries:
+                (old_mac, _entry) = table.popitem(last=False)
+                self.index.remove(old_mac, dpid)
+                self.evicted += 1
+            table[mac] = (port, now)
+            self.learned += 1
+            if self._moved_from_edge(dpid, port, mac):
+                LOG.debug('port_add: 0x%016x 0x%04x %s', dpid, port, mac)
+                self._move(dpid, port, mac)
+            else:
+                self.index.add(mac, dpid, port)
+            return None
 
+        (old_port, seen) = entry
+        if old_port != port:
+            LOG.debug('port_add: 0x%016x 0x%04x %s', dpid, port, mac)
+            self._move(dpid, port, mac)
+        if now - seen >= _REFRESH_INTERVAL:
+            del table[mac]
+            table[mac] = (port, now)
+        elif old_port != port:
+            table[mac] = (port, seen)
         return old_port
 
+    def _moved_from_edge(self, dpid, port, mac):
+        """mac, new to dpid, was learned on an edge port of another one"""
+        is_edge_port = self.is_edge_port
+        if is_edge_port is None or not is_edge_port(dpid, port):
+            return False
+        for (old_dpid, old_port) in self.index.get(mac).items():
+            if old_dpid != dpid and is_edge_port(old_dpid, old_port):
+                return True
+        return False
+
+    def _move(self, dpid, port, mac):
+        self.moved += 1
+        stale = self.index.move(mac, dpid, port)
+        for stale_dpid in stale:
+            table = self.mac_to_port.get(stale_dpid)
+            if stale_dpid != dpid and table is not None:
+                table.pop(mac, None)
+        if mac_dispatcher.has_handlers(EventHostMoved):
+            mac_dispatcher(EventHostMoved(mac, dpid, port, stale))
+
     def port_get(self, dpid, mac):
-        # LOG.debug('dpid 0x%016x mac %s', dpid, haddr_to_str(mac))
-        return self.mac_to_port[dpid].get(mac)
+        # LOG.debug('dpid 0x%016x mac %s', dpid, mac)
+        entry = self.mac_to_port[dpid].get(mac)
+        if entry is None:
+            return None
+        if self.aging_time and entry[1] <= time.time() - self.aging_time:
+            # expired but not aged out yet
+            return None
+        return entry[0]
+
+    def stats(self):
+        return {'datapaths': len(self.mac_to_port),
+                'entries': sum(len(table)
+                               for table in self.mac_to_port.values()),
+                'learned': self.learned,
+                'moved': self.moved,
+                'evicted': self.evicted,
+                'aged': self.aged}
@@ -13,8 +13,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import itertools
 import logging
 
+from ryu.controller import dispatcher
+from ryu.controller import event
 from ryu.exception import NetworkNotFound, NetworkAlreadyExist
 from ryu.exception import PortAlreadyExist, PortNotFound, PortUnknown
 from ryu.app.rest_nw_id import NW_ID_UNKNOWN
@@ -22,11 +25,132 @@ from ryu.app.rest_nw_id import NW_ID_UNKNOWN
 LOG = logging.getLogger('ryu.controller.network')
 
 
+_EMPTY = frozenset()
+
+
+network_dispatcher = dispatcher.EventDispatcher('network')
+
+
+def _dispatch(ev_cls, *args):
+    if network_dispatcher.has_handlers(ev_cls):
+        network_dispatcher(ev_cls(*args))
+
+
+class EventNetworkRemoved(event.EventBase):
+    __slots__ = ('network_id', 'generation')
+
+    def __init__(self, network_id, generation):
+        self.network_id = network_id
+        self.generation = generation
+
+
+class EventPortBase(event.EventBase):
+    """the network id of port of dpid changed
+
+    generation is the new generation of the datapath.
+    """
+
+    __slots__ = ('dpid', 'port', 'network_id', 'generation')
+
+    def __init__(self, dpid, port, network_id, generation):
+        self.dpid = dpid
+        self.port = port
+        self.network_id = network_id
+        self.generation = generation
+
+
+class EventPortAdded(EventPortBase):
+    __slots__ = ()
+
+
+class EventPortMoved(EventPortBase):
+    __slots__ = ('old_network_id', )
+
+    def __init__(self, dpid, port, network_id, generation, old_network_id):
+        super(EventPortMoved, self).__init__(dpid, port, network_id,
+                                             generation)
+        self.old_network_id = old_network_id
+
+
+class EventPortRemoved(EventPortBase):
+    """network_id is the network port was removed from"""
+    __slots__ = ()
+
+
 class network(object):
+    """network ids of datapath ports
+
+    Besides dpids, the ports of each (dpid, network id) are indexed in
+    dp_nw_ports so that filter_ports() needn't walk the datapath.
+
+    Every change takes a new generation from a counter. The last one of
+    each network and of each datapath is kept, so that anything derived
+    from them can be cached until their generation changes. The changes
+    are also dispatched to network_dispatcher as EventNetworkRemoved,
+    EventPortAdded, EventPortMoved and EventPortRemoved, when it has a
+    handler for them.
+    """
+
     def __init__(self, nw_id_unknown=NW_ID_UNKNOWN):
         self.nw_id_unknown = nw_id_unknown
         self.networks = {}
-        self.dpids = {}
+        self.dpids = {}         # dpid -> {port: nw_id}
+        self.dp_nw_ports = {}   # (dpid, nw_id) -> set of ports
+
+        self._generations = itertools.count(1)
+        self.nw_generations = {}    # nw_id -> generation
+        self.dp_generations = {}    # dpid -> generation
+
+    def network_generation(self, network_id):
+        return self.nw_generations.get(network_id, 0)
+
+    def datapath_generation(self, dpid):
+        return self.dp_generations.get(dpid, 0)
+
+    def _network_changed(self, network_id):
+        generation = next(self._generations)
+        self.nw_generations[network_id] = generation
+        return generation
+
+    def _port_changed(self, dpid, *network_ids):
+        generation = next(self._generations)
+        self.dp_generations[dpid] = generation
+        for network_id in network_ids:
+            self.nw_generations[network_id] = generation
+        return generation
+
+    def _set_port_network(self, dpid, port, network_id):
+        dp = self.dpids.setdefault(dpid, {})
+        old_network_id = dp.get(port)
+        if port in dp:
+            if old_network_id == network_id:
+                return
+            self._discard_port(dpid, port, old_network_id)
+
+        dp[port] = network_id
+        self.dp_nw_ports.setdefault((dpid, network_id), set()).add(port)
+
+        if old_network_id is None:
+            generation = self._port_changed(dpid, network_id)
+            _dispatch(EventPortAdded, dpid, port, network_id, generation)
+        else:
+            generation = self._port_changed(dpid, network_id, old_network_id)
+            _dispatch(EventPortMoved, dpid, port, network_id, generation,
+                      old_network_id)
+
+    def _discard_port(self, dpid, port, network_id):
+        key = (dpid, network_id)
+        ports = self.dp_nw_ports[key]
+        ports.discard(port)
+        if not ports:
+            del self.dp_nw_ports[key]
+
+    def _del_port_network(self, dpid, port):
+        network_id = self.dpids[dpid].pop(port)
+        self._discard_port(dpid, port, network_id)
+
+        generation = self._port_changed(dpid, network_id)
+        _dispatch(EventPortRemoved, dpid, port, network_id, generation)
 
     def _check_nw_id_unknown(self, network_id):
         if network_id == self.nw_id_unknown:
@@ -37,7 +161,9 @@ class network(object):
 
     def update_network(self, network_id):
         self._check_nw_id_unknown(network_id)
-        self.networks.setdefault(network_id, set())
+        if network_id not in self.networks:
+            self.networks[network_id] = set()
+            self._network_changed(network_id)
 
     def create_network(self, network_id):
         self._check_nw_id_unknown(network_id)
@@ -45,6 +171,7 @@ class network(object):
             raise NetworkAlreadyExist(network_id=network_id)
 
         self.networks[network_id] = set()
+        self._network_changed(network_id)
 
     def remove_network(self, network_id):
         try:
@@ -52,6 +179,9 @@ class network(object):
         except KeyError:
             raise NetworkNotFound(network_id=network_id)
 
+        generation = self._network_changed(network_id)
+        _dispatch(EventNetworkRemoved, network_id, generation)
+
     def list_ports(self, network_id):
         try:
             # use list() to keep compatibility for output
@@ -80,8 +210,7 @@ class network(object):
         except KeyError:
             raise NetworkNotFound(network_id=network_id)
 
-        self.dpids.setdefault(dpid, {})
-        self.dpids[dpid][port] = network_id
+        self._set_port_network(dpid, port, network_id)
 
     def create_port(self, network_id, dpid, port):
         self._update_port(network_id, dpid, port, False)
@@ -97,7 +226,7 @@ class network(object):
         except ValueError:
             raise PortNotFound(network_id=network_id, dpid=dpid, port=port)
 
-        del self.dpids[dpid][port]
+        self._del_port_network(dpid, port)
 
     def same_network(self, dpid, nw_id, out_port, allow_nw_id_external=None):
         assert nw_id != self.nw_id_unknown
@@ -127,29 +256,21 @@ class network(object):
         datapath = ofp_switch_features.datapath
         dpid = ofp_switch_features.datapath_id
         ports = ofp_switch_features.ports
-        self.dpids.setdefault(dpid, {})
-        dp = self.dpids[dpid]
+        dp = self.dpids.setdefault(dpid, {})
         for port_no in ports:
             if port_no == 0 or port_no >= datapath.ofproto.OFPP_MAX:
                 # skip fake output ports
                 continue
 
             if port_no not in dp:
-                dp[port_no] = self.nw_id_unknown
+                self._set_port_network(dpid, port_no, self.nw_id_unknown)
 
     def filter_ports(self, dpid, in_port, nw_id, allow_nw_id_external=None):
         assert nw_id != self.nw_id_unknown
-        ret = []
-
-        ports = self.dpids.get(dpid, {})
-        for port_no, _nw_id in ports.items():
-            if port_no == in_port:
-                continue
-
-            if _nw_id == nw_id:
-                ret.append(port_no)
-            elif (allow_nw_id_external is not None and
-                  _nw_id == allow_nw_id_external):
-                ret.append(port_no)
-
-        return ret
+        ports = self.dp_nw_ports.get((dpid, nw_id), _EMPTY)
+        if (allow_nw_id_external is not None and
+            allow_nw_id_external != nw_id):
+            external = self.dp_nw_ports.get((dpid, allow_nw_id_external))
+            if external:
+                ports = ports | external
+        return list(ports.difference((in_port, )))
@@ -0,0 +1,201 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import gflags
+import logging
+import struct
+import time
+
+LOG = logging.getLogger('ryu.controller.pending_flow')
+
+FLAGS = gflags.FLAGS
+gflags.DEFINE_float('ofp_pending_flow_ttl', 0,
+                    'seconds to answer the packet-ins of a flow just added '
+                    'with a packet_out instead of dispatching them '
+                    '(0: disabled)')
+
+_ETH_TYPE_IP = 0x0800
+_ETH_TYPE_MIN = 0x0600
+_ETH_TYPE_VLAN = 0x8100
+
+
+def enabled():
+    return FLAGS.ofp_pending_flow_ttl > 0
+
+
+class _Entry(object):
+    __slots__ = ('actions', 'expire')
+
+    def __init__(self, actions, expire):
+        self.actions = actions
+        self.expire = expire
+
+
+class PendingFlowTable(object):
+    """flows added to a datapath which the switch may not have installed
+
+    The packet-ins covered by such a flow are answered with a packet_out
+    of the flow's actions for ttl seconds after the flow_mod, rather than
+    being dispatched to the applications again. duplicate() finds the
+    packet-ins of the same flow in a batch, so that the ones behind the
+    first can wait for its flow_mod. Only flows matching on
+    in_port, dl_src, dl_dst, dl_type and nw_tos are tracked. Any other
+    flow_mod command and any port status flush the table, since they may
+    change where the flows forward.
+    """
+
+    def __init__(self, ofproto, ttl=None):
+        if ttl is None:
+            ttl = FLAGS.ofp_pending_flow_ttl
+        self.ofproto = ofproto
+        self.ttl = ttl
+
+        self.fields = (('in_port', ofproto.OFPFW_IN_PORT),
+                       ('dl_src', ofproto.OFPFW_DL_SRC),
+                       ('dl_dst', ofproto.OFPFW_DL_DST),
+                       ('dl_type', ofproto.OFPFW_DL_TYPE),
+                       ('nw_tos', ofproto.OFPFW_NW_TOS))
+        self.untracked_wildcards = ofproto.OFPFW_ALL
+        for (_name, wildcard) in self.fields:
+            self.untracked_wildcards &= ~wildcard
+
+        self.flows = {}     # field names -> {field values -> _Entry}
+        self.next_purge = 0
+
+        self.added = 0
+        self.hits = 0
+        self.flushes = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return sum(len(flows) for flows in self.flows.values())
+
+    def _tracked(self, wildcards):
+        ofproto = self.ofproto
+        nw_src = ((wildcards & ofproto.OFPFW_NW_SRC_MASK) >>
+                  ofproto.OFPFW_NW_SRC_SHIFT)
+        nw_dst = ((wildcards & ofproto.OFPFW_NW_DST_MASK) >>
+                  ofproto.OFPFW_NW_DST_SHIFT)
+        untracked = (self.untracked_wildcards &
+                     ~ofproto.OFPFW_NW_SRC_MASK & ~ofproto.OFPFW_NW_DST_MASK)
+        return ((wildcards & untracked) == untracked and
+                nw_src >= 32 and nw_dst >= 32)
+
+    def flow_mod(self, match, command, actions):
+        if command != self.ofproto.OFPFC_ADD:
+            self.flush()
+            return
+        if not actions or not self._tracked(match.wildcards):
+            return
+
+        now = time.time()
+        self._purge(now)
+        names = tuple(name for (name, wildcard) in self.fields
+                      if not match.wildcards & wildcard)
+        values = tuple(getattr(match, name) for name in names)
+        self.flows.setdefault(names, {})[values] = _Entry(actions,
+                                                          now + self.ttl)
+        self.added += 1
+
+    def flow_mod_template(self, template, fields):
+        """track the flow_mod of MsgTemplate patched with fields"""
+        msg = template.msg
+        match = msg.match._replace(**dict(
+                (name, value) for (name, value) in fields.items()
+                if name in msg.match._fields))
+        actions = msg.actions
+        if 'output_port' in fields:
+            action = copy.copy(actions[0])
+            action.port = fields['output_port']
+            actions = [action] + actions[1:]
+        self.flow_mod(match, msg.command, actions)
+
+    def flush(self):
+        if self.flows:
+            self.flushes += 1
+            self.flows = {}
+
+    def _purge(self, now):
+        if now < self.next_purge:
+            return
+        self.next_purge = now + self.ttl
+        for (names, flows) in self.flows.items():
+            for (values, entry) in flows.items():
+                if entry.expire <= now:
+                    del flows[values]
+            if not flows:
+                del self.flows[names]
+
+    @staticmethod
+    def _packet_fields(msg):
+        data = msg.data
+        if len(data) < 14:
+            return None
+        (dl_type, ) = struct.unpack_from('!H', data, 12)
+        if dl_type < _ETH_TYPE_MIN or dl_type == _ETH_TYPE_VLAN:
+            return None
+
+        nw_tos = 0
+        if dl_type == _ETH_TYPE_IP and len(data) > 15:
+            nw_tos = ord(data[15]) & 0xfc
+        return {'in_port': msg.in_port,
+                'dl_src': data[6:12],
+                'dl_dst': data[0:6],
+                'dl_type': dl_type,
+                'nw_tos': nw_tos}
+
+    def packet_in(self, msg):
+        """actions of the pending flow covering packet-in msg or None"""
+        if not self.flows:
+            return None
+
+        fields = self._packet_fields(msg)
+        if fields is None:
+            return None
+
+        now = time.time()
+        for (names, flows) in self.flows.items():
+            values = tuple(fields[name] for name in names)
+            entry = flows.get(values)
+            if entry is None:
+                continue
+            if entry.expire <= now:
+                del flows[values]
+                continue
+            self.hits += 1
+            return entry.actions
+        return None
+
+    def duplicate(self, msg, flows):
+        """True if flows has the flow of packet-in msg, else add it
+
+        flows is a set kept by the caller over a batch of packet-ins.
+        """
+        fields = self._packet_fields(msg)
+        if fields is None:
+            return False
+        values = tuple(fields[name] for (name, _wildcard) in self.fields)
+        if values in flows:
+            self.duplicates += 1
+            return True
+        flows.add(values)
+        return False
+
+    def stats(self):
+        return {'flows': len(self),
+                'added': self.added,
+                'hits': self.hits,
+                'flushes': self.flushes,
+                'duplicates': self.duplicates}
@@ -34,10 +34,18 @@ class OFPUnknownVersion(RyuException):
     message = 'unknown version %(version)x'
 
 
-class OFPMalformedMessage:
+class OFPMalformedMessage(RyuException):
     message = 'malformed message'
 
 
+class OFPReplyTimeout(RyuException):
+    message = 'no reply to xid %(xid)d in %(timeout)s seconds'
+
+
+class OFPDatapathDisconnected(RyuException):
+    message = 'datapath disconnected before reply to xid %(xid)d'
+
+
 class NetworkNotFound(RyuException):
     message = 'no such network id %(network_id)s'
 
@@ -0,0 +1,121 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+from gevent import event
+
+
+class BoundedQueue(object):
+    """FIFO queue with high and low water marks
+
+    Every item is accounted as a number of messages and bytes given by
+    the producer. The queue becomes full when either count reaches its
+    high water mark and stays full until both counts drop to their low
+    water marks. A high water mark of 0 means no limit.
+
+    Items put by put_urgent() are taken by get() ahead of the others.
+    """
+
+    def __init__(self, high_msgs=0, low_msgs=0, high_bytes=0, low_bytes=0):
+        assert low_msgs <= high_msgs or not high_msgs
+        assert low_bytes <= high_bytes or not high_bytes
+        self.high_msgs = high_msgs
+        self.low_msgs = low_msgs
+        self.high_bytes = high_bytes
+        self.low_bytes = low_bytes
+
+        self._q = collections.deque()
+        self._urgent = collections.deque()
+        self._not_empty = event.Event()
+        self._not_full = event.Event()
+        self._not_full.set()
+
+        # gauges
+        self.msgs = 0
+        self.bytes = 0
+        self.max_msgs = 0
+        self.max_bytes = 0
+        self.full_count = 0
+
+    def __len__(self):
+        return len(self._urgent) + len(self._q)
+
+    def empty(self):
+        return not self._urgent and not self._q
+
+    def full(self):
+        return not self._not_full.is_set()
+
+    def _above_high(self):
+        return ((self.high_msgs and self.msgs >= self.high_msgs) or
+                (self.high_bytes and self.bytes >= self.high_bytes))
+
+    def _below_low(self):
+        return ((not self.high_msgs or self.msgs <= self.low_msgs) and
+                (not self.high_bytes or self.bytes <= self.low_bytes))
+
+    def wait_not_full(self, timeout=None):
+        """wait until the queue is not full
+
+        Returns False if it is still full after timeout seconds.
+        """
+        return self._not_full.wait(timeout)
+
+    def put(self, item, msgs=1, nbytes=0, block=True):
+        """append item
+
+        If block is True, wait until the queue is no longer full.
+        """
+        if block:
+            self._not_full.wait()
+
+        self._q.append((item, msgs, nbytes))
+        self._account(msgs, nbytes)
+
+    def put_urgent(self, item, msgs=1, nbytes=0):
+        """append item to the urgent lane which get() drains first
+
+        Never blocks. The item counts toward the water marks.
+        """
+        self._urgent.append((item, msgs, nbytes))
+        self._account(msgs, nbytes)
+
+    def _account(self, msgs, nbytes):
+        self.msgs += msgs
+        self.bytes += nbytes
+        self.max_msgs = max(self.max_msgs, self.msgs)
+        self.max_bytes = max(self.max_bytes, self.bytes)
+        if not self.full() and self._above_high():
+            self.full_count += 1
+            self._not_full.clear()
+        self._not_empty.set()
+
+    def get(self):
+        while self.empty():
+            self._not_empty.clear()
+            self._not_empty.wait()
+
+        (item, msgs, nbytes) = (self._urgent or self._q).popleft()
+        self.msgs -= msgs
+        self.bytes -= nbytes
+        if self.full() and self._below_low():
+            self._not_full.set()
+        return item
+
+    def stats(self):
+        return {'msgs': self.msgs,
+                'bytes': self.bytes,
+                'max_msgs': self.max_msgs,
+                'max_bytes': self.max_bytes,
+                'full_count': self.full_count}
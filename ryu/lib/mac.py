@@ -13,11 +13,94 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import struct
+
+_HADDR = struct.Struct('!HI')
+_MULTICAST = 0x010000000000
+_BROADCAST = 0xffffffffffff
+
+# string forms cached by Mac. Cleared when full
+_STR_CACHE_MAX = 4096
+
+
+def _hex_to_str(h):
+    return ':'.join((h[0:2], h[2:4], h[4:6], h[6:8], h[8:10], h[10:12]))
+
 
 def haddr_to_str(addr):
-    return ''.join(['%02x:' % ord(char) for char in addr[0:6]])[:-1]
+    return _hex_to_str(addr[0:6].encode('hex'))
 
 
 def haddr_to_bin(string):
+    if len(string) == 17:
+        return string.replace(':', '').decode('hex')
     return ''.join(['%c' % chr(int(i, 16)) for i in
                     string.split(':')])
+
+
+class Mac(int):
+    """MAC address stored as a 48-bit integer
+
+    A Mac hashes and compares as its integer value. str() and to_str()
+    give the colon separated form, which is computed on first use and
+    cached, so a Mac passed as a log argument is formatted only when
+    the record is emitted.
+
+    json writes an int subclass with str(), which makes a bare Mac
+    invalid JSON. Give json int(mac) or mac.to_str() instead.
+    """
+
+    __slots__ = ()
+
+    _strs = {}
+
+    @classmethod
+    def from_bin(cls, addr):
+        """Mac of the first 6 bytes of addr"""
+        (hi, lo) = _HADDR.unpack_from(addr)
+        return cls((hi << 32) | lo)
+
+    @classmethod
+    def from_str(cls, string):
+        return cls.from_bin(haddr_to_bin(string))
+
+    @property
+    def bin(self):
+        return _HADDR.pack(self >> 32, self & 0xffffffff)
+
+    def is_multicast(self):
+        """True for multicast addresses, which include broadcast"""
+        return bool(self & _MULTICAST)
+
+    def is_broadcast(self):
+        return self == _BROADCAST
+
+    def to_str(self):
+        strs = self._strs
+        string = strs.get(self)
+        if string is None:
+            if len(strs) >= _STR_CACHE_MAX:
+                strs.clear()
+            string = _hex_to_str('%012x' % self)
+            strs[self] = string
+        return string
+
+    __str__ = to_str
+
+    def __repr__(self):
+        return "Mac('%s')" % self.to_str()
+
+
+BROADCAST = Mac(_BROADCAST)
+
+
+def bins_to_macs(addrs):
+    """Macs of a sequence of 6 byte addresses, unpacked at once"""
+    values = iter(struct.unpack('!' + 'HI' * len(addrs), ''.join(addrs)))
+    return [Mac((hi << 32) | lo) for (hi, lo) in zip(values, values)]
+
+
+def macs_to_strs(macs):
+    """string forms of a sequence of Macs, formatted at once"""
+    h = ('%012x' * len(macs)) % tuple(macs)
+    return [_hex_to_str(h[i:i + 12]) for i in xrange(0, len(h), 12)]
@@ -0,0 +1,42 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import ether
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+
+class arp(packet_base.PacketBase):
+    """ARP for IPv4 over Ethernet. The addresses are raw bytes"""
+
+    __slots__ = ()
+
+    _MIN_LEN = 28
+
+    hwtype = field('H', 0)
+    proto = field('H', 2)
+    hlen = field('B', 4)
+    plen = field('B', 5)
+    opcode = field('H', 6)
+    src_mac = field('6s', 8)
+    src_ip = field('I', 14)
+    dst_mac = field('6s', 18)
+    dst_ip = field('I', 24)
+
+
+ethernet.ethernet.register_packet_type(arp, ether.ETH_TYPE_ARP)
@@ -0,0 +1,32 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+
+class ethernet(packet_base.PacketBase):
+    """Ethernet II header"""
+
+    __slots__ = ()
+
+    _MIN_LEN = 14
+    _TYPES = {}
+
+    dst = field('6s', 0)
+    src = field('6s', 6)
+    ethertype = field('H', 12)
+
+    def next_type(self):
+        return self.ethertype
@@ -0,0 +1,38 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import inet
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACH = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+
+class icmp(packet_base.PacketBase):
+    """ICMP header. The rest of the message is the payload"""
+
+    __slots__ = ()
+
+    _MIN_LEN = 4
+
+    type = field('B', 0)
+    code = field('B', 1)
+    csum = field('H', 2)
+
+
+ipv4.ipv4.register_packet_type(icmp, inet.IPPROTO_ICMP)
@@ -0,0 +1,72 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import ether
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+
+class ipv4(packet_base.PacketBase):
+    """IPv4 header. The addresses are integers in host byte order
+
+    Only the first fragment is followed by the header of proto.
+    """
+
+    __slots__ = ()
+
+    _MIN_LEN = 20
+    _TYPES = {}
+
+    version = field('B', 0, 4, 0xf)
+    tos = field('B', 1)
+    total_length = field('H', 2)
+    identification = field('H', 4)
+    flags = field('H', 6, 13, 0x7)
+    frag_offset = field('H', 6, 0, 0x1fff)
+    ttl = field('B', 8)
+    proto = field('B', 9)
+    csum = field('H', 10)
+    src = field('I', 12)
+    dst = field('I', 16)
+
+    _ihl = field('B', 0, 0, 0xf)
+
+    @classmethod
+    def parser(cls, buf, offset=0):
+        """view of the header or None if it's truncated or ihl is bogus"""
+        hdr = super(ipv4, cls).parser(buf, offset)
+        if hdr is None:
+            return None
+        if hdr._ihl < 5 or len(buf) - offset < hdr.header_length:
+            return None
+        return hdr
+
+    @property
+    def header_length(self):
+        return self._ihl * 4
+
+    def payload_end(self):
+        return self.offset + self.total_length
+
+    def next_type(self):
+        return self.proto
+
+    def next_protocol(self):
+        if self.frag_offset:
+            return None
+        return super(ipv4, self).next_protocol()
+
+
+ethernet.ethernet.register_packet_type(ipv4, ether.ETH_TYPE_IP)
@@ -0,0 +1,49 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import ether
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+
+class ipv6(packet_base.PacketBase):
+    """IPv6 header. The addresses are raw bytes
+
+    Extension headers aren't decoded, so the next protocol is only known
+    when nxt is an upper layer protocol.
+    """
+
+    __slots__ = ()
+
+    _MIN_LEN = 40
+    _TYPES = {}
+
+    version = field('I', 0, 28, 0xf)
+    traffic_class = field('I', 0, 20, 0xff)
+    flow_label = field('I', 0, 0, 0xfffff)
+    payload_length = field('H', 4)
+    nxt = field('B', 6)
+    hop_limit = field('B', 7)
+    src = field('16s', 8)
+    dst = field('16s', 24)
+
+    def payload_end(self):
+        return self.payload_offset + self.payload_length
+
+    def next_type(self):
+        return self.nxt
+
+
+ethernet.ethernet.register_packet_type(ipv6, ether.ETH_TYPE_IPV6)
@@ -0,0 +1,74 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import ethernet
+
+# the protocols register themselves as the payload of their lower layer
+from ryu.lib.packet import arp
+from ryu.lib.packet import icmp
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import tcp
+from ryu.lib.packet import udp
+from ryu.lib.packet import vlan
+
+
+class Packet(object):
+    """protocol headers of an Ethernet frame, decoded as they are used
+
+    Iterating a Packet yields the header views from Ethernet upward.
+    A header is decoded the first time the iteration reaches it and is
+    kept in protocols afterwards. The decoding stops at the first
+    unknown or truncated header.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.protocols = []
+        self._decoded = False   # True once the last header is decoded
+
+    def _decode_next(self):
+        if self._decoded:
+            return None
+        if self.protocols:
+            hdr = self.protocols[-1].next_protocol()
+        else:
+            hdr = ethernet.ethernet.parser(self.data)
+        if hdr is None:
+            self._decoded = True
+        else:
+            self.protocols.append(hdr)
+        return hdr
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self.protocols):
+                hdr = self.protocols[i]
+            else:
+                hdr = self._decode_next()
+                if hdr is None:
+                    return
+            yield hdr
+            i += 1
+
+    def get_protocol(self, cls):
+        """the first header of protocol cls or None"""
+        for hdr in self.protocols:
+            if isinstance(hdr, cls):
+                return hdr
+        while True:
+            hdr = self._decode_next()
+            if hdr is None or isinstance(hdr, cls):
+                return hdr
@@ -0,0 +1,97 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+
+
+def field(fmt, offset, shift=0, mask=None):
+    """property of a header field unpacked from the buffer on access
+
+    fmt is a struct format without the byte order. If mask is given,
+    the field is the bits selected by shift and mask of the unpacked
+    integer.
+    """
+    unpack_from = struct.Struct('!' + fmt).unpack_from
+    if mask is None:
+        return property(lambda hdr: unpack_from(hdr.buf,
+                                                hdr.offset + offset)[0])
+    return property(lambda hdr: (unpack_from(hdr.buf, hdr.offset + offset)[0]
+                                 >> shift) & mask)
+
+
+class PacketBase(object):
+    """view of a protocol header at offset of buf
+
+    buf is the whole packet, a str or any object supporting the buffer
+    interface. Nothing is decoded when the view is created: fields are
+    unpacked on access and the payload is a memoryview of buf, so the
+    packet data is never copied.
+
+    _TYPES maps the value of the next-header field, as returned by
+    next_type(), to the class of the next header.
+    """
+
+    __slots__ = ('buf', 'offset')
+
+    _MIN_LEN = 0
+    _TYPES = None
+
+    def __init__(self, buf, offset=0):
+        self.buf = buf
+        self.offset = offset
+
+    @classmethod
+    def parser(cls, buf, offset=0):
+        """view of the header at offset of buf or None if it's truncated"""
+        if len(buf) - offset < cls._MIN_LEN:
+            return None
+        return cls(buf, offset)
+
+    @classmethod
+    def register_packet_type(cls, next_cls, type_):
+        cls._TYPES[type_] = next_cls
+
+    @property
+    def header_length(self):
+        return self._MIN_LEN
+
+    @property
+    def payload_offset(self):
+        return self.offset + self.header_length
+
+    def payload_end(self):
+        """end of the payload in buf when the header has a length field"""
+        return None
+
+    @property
+    def payload(self):
+        return memoryview(self.buf)[self.payload_offset:self.payload_end()]
+
+    def next_type(self):
+        return None
+
+    def next_protocol(self):
+        """view of the next header or None if it's unknown or truncated"""
+        if self._TYPES is None:
+            return None
+        next_cls = self._TYPES.get(self.next_type())
+        if next_cls is None:
+            return None
+
+        buf = self.buf
+        end = self.payload_end()
+        if end is not None and end < len(buf):
+            # hide the trailer, such as Ethernet padding, from the payload
+            buf = memoryview(buf)[:end]
+        return next_cls.parser(buf, self.payload_offset)
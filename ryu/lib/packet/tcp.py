@@ -0,0 +1,53 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import inet
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+
+
+class tcp(packet_base.PacketBase):
+    """TCP header. Options are left in the header"""
+
+    __slots__ = ()
+
+    _MIN_LEN = 20
+
+    src_port = field('H', 0)
+    dst_port = field('H', 2)
+    seq = field('I', 4)
+    ack = field('I', 8)
+    bits = field('B', 13, 0, 0x3f)
+    window_size = field('H', 14)
+    csum = field('H', 16)
+    urgent = field('H', 18)
+
+    _data_offset = field('B', 12, 4, 0xf)
+
+    @property
+    def header_length(self):
+        return self._data_offset * 4
+
+
+ipv4.ipv4.register_packet_type(tcp, inet.IPPROTO_TCP)
+ipv6.ipv6.register_packet_type(tcp, inet.IPPROTO_TCP)
@@ -0,0 +1,39 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import inet
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+
+class udp(packet_base.PacketBase):
+    """UDP header"""
+
+    __slots__ = ()
+
+    _MIN_LEN = 8
+
+    src_port = field('H', 0)
+    dst_port = field('H', 2)
+    total_length = field('H', 4)
+    csum = field('H', 6)
+
+    def payload_end(self):
+        return self.offset + self.total_length
+
+
+ipv4.ipv4.register_packet_type(udp, inet.IPPROTO_UDP)
+ipv6.ipv6.register_packet_type(udp, inet.IPPROTO_UDP)
@@ -0,0 +1,38 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ryu.lib.packet import ether
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import packet_base
+from ryu.lib.packet.packet_base import field
+
+
+class vlan(packet_base.PacketBase):
+    """802.1Q tag, which is followed by the ethertype of the payload"""
+
+    __slots__ = ()
+
+    _MIN_LEN = 4
+    _TYPES = ethernet.ethernet._TYPES
+
+    pcp = field('H', 0, 13, 0x7)
+    cfi = field('H', 0, 12, 0x1)
+    vid = field('H', 0, 0, 0xfff)
+    ethertype = field('H', 2)
+
+    def next_type(self):
+        return self.ethertype
+
+
+ethernet.ethernet.register_packet_type(vlan, ether.ETH_TYPE_8021Q)
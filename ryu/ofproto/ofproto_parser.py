@@ -23,10 +23,60 @@ from . import ofproto
 LOG = logging.getLogger('ryu.ofproto.ofproto_parser')
 
 
-def header(buf):
-    assert len(buf) >= ofproto.OFP_HEADER_SIZE
+class StructCodec(object):
+    """struct.Struct compiled once for every OFP*_PACK_STR* of the module
+
+    ofproto.OFP_MATCH_PACK_STR is available as codec.OFP_MATCH_PACK_STR.
+    When ofproto defines the corresponding *_SIZE, the compiled size is
+    checked against it. The size may exclude one of the common headers
+    given by header_sizes.
+    """
+
+    def __init__(self, ofproto_mod, header_sizes=(0,)):
+        for name, fmt in ofproto_mod.__dict__.items():
+            if not name.startswith('OFP') or '_PACK_STR' not in name:
+                continue
+
+            st = struct.Struct(fmt)
+            setattr(self, name, st)
+
+            (base, _sep, suffix) = name.rpartition('_PACK_STR')
+            size = getattr(ofproto_mod, base + '_SIZE', None)
+            if suffix == '' and size is not None:
+                assert size - st.size in header_sizes, name
+
+
+class MsgTemplate(object):
+    """pre-encoded message whose fields can be patched by offset
+
+    msg is serialized once. fields maps a field name to (fmt, offset)
+    within the encoded message. patch() returns a copy of the encoded
+    bytes with the given fields packed in.
+    """
+
+    def __init__(self, msg, fields):
+        msg.serialize()
+        self.msg = msg
+        self.msg_type = msg.msg_type
+        self.buf = str(msg.buf)
+        self.fields = dict((name, (struct.Struct(fmt), offset))
+                           for name, (fmt, offset) in fields.items())
+
+    def patch(self, **kwargs):
+        buf = bytearray(self.buf)
+        for name, val in kwargs.iteritems():
+            (st, offset) = self.fields[name]
+            st.pack_into(buf, offset, val)
+        return buf
+
+
+_OFP_HEADER = struct.Struct(ofproto.OFP_HEADER_PACK_STR)
+
+
+def header(buf, offset=0):
+    assert len(buf) >= offset + ofproto.OFP_HEADER_SIZE
     #LOG.debug('len %d bufsize %d', len(buf), ofproto.OFP_HEADER_SIZE)
-    return struct.unpack_from(ofproto.OFP_HEADER_PACK_STR, buffer(buf))
+    return _OFP_HEADER.unpack_from(buf, offset)
 
 
 _MSG_PARSERS = {}
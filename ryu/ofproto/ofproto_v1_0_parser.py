@@ -14,14 +14,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import collections
+import operator
 import struct
 
 from . import ofproto_parser
 from . import ofproto_v1_0
+from ryu.lib.packet import ether
+from ryu.lib.packet import inet
 
 import logging
 LOG = logging.getLogger('ryu.ofproto.ofproto_v1_0_parser')
 
+_codec = ofproto_parser.StructCodec(ofproto_v1_0,
+                                    (0, ofproto_v1_0.OFP_HEADER_SIZE,
+                                     ofproto_v1_0.OFP_STATS_MSG_SIZE))
+
 _MSG_PARSERS = {}
 
 
@@ -46,7 +53,17 @@ def msg_parser(datapath, version, msg_type, msg_len, xid, buf):
     return parser(datapath, version, msg_type, msg_len, xid, buf)
 
 
+def set_lazy_decode(lazy):
+    """When lazy is True, parsed messages decode only their header.
+
+    The body is decoded on the first access to one of its attributes.
+    """
+    MsgBase.lazy_decode = lazy
+
+
 class MsgBase(object):
+    lazy_decode = False
+
     def __init__(self, datapath):
         self.datapath = datapath
         self.version = None
@@ -73,11 +90,39 @@ class MsgBase(object):
 
     @classmethod
     def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = cls(datapath)
+        """message decoded from buf
+
+        buf may be a view of a receive buffer which is reused afterwards,
+        so the message copies what it keeps: the decoded attributes, and
+        buf itself only when the body is decoded lazily. Otherwise
+        msg.buf is None.
+        """
+        # __init__ isn't called so that body attributes stay unset
+        # until _parse_body() decodes them.
+        msg = cls.__new__(cls)
+        MsgBase.__init__(msg, datapath)
         msg.set_headers(version, msg_type, msg_len, xid)
-        msg.set_buf(buf)
+        if cls.lazy_decode:
+            msg.set_buf(str(buf))
+            msg._body_decoded = False
+        else:
+            msg.set_buf(buf)
+            msg._parse_body()
+            msg.buf = None
         return msg
 
+    def __getattr__(self, name):
+        # only called for attributes which aren't set.
+        # decode the body on demand
+        if name.startswith('__') or self.__dict__.get('_body_decoded', True):
+            raise AttributeError(name)
+        self._body_decoded = True
+        self._parse_body()
+        return getattr(self, name)
+
+    def _parse_body(self):
+        pass
+
     def _serialize_pre(self):
         assert self.version is None
         assert self.msg_type is None
@@ -85,45 +130,94 @@ class MsgBase(object):
 
         self.version = ofproto_v1_0.OFP_VERSION
         self.msg_type = self.cls_msg_type
-        self.buf = bytearray().zfill(ofproto_v1_0.OFP_HEADER_SIZE)
 
-    def _serialize_header(self):
-        # buffer length is determined after trailing data is formated.
+    def _serialize_header(self, buf, offset, msg_len):
         assert self.version is not None
         assert self.msg_type is not None
         assert self.msg_len is None
-        assert self.xid is None
-        assert self.buf is not None
-        assert len(self.buf) >= ofproto_v1_0.OFP_HEADER_SIZE
 
-        self.msg_len = len(self.buf)
-        self.xid = 0  # TODO:XXX
+        self.msg_len = msg_len
+        if self.xid is None:
+            # normally allocated by Datapath.send_msg()
+            self.xid = 0
+
+        _codec.OFP_HEADER_PACK_STR.pack_into(
+            buf, offset,
+            self.version, self.msg_type, self.msg_len, self.xid)
 
-        struct.pack_into(ofproto_v1_0.OFP_HEADER_PACK_STR, self.buf, 0,
-                         self.version, self.msg_type, self.msg_len, self.xid)
+    def serialized_len(self):
+        return ofproto_v1_0.OFP_HEADER_SIZE
 
-    def _serialize_body(self):
+    def _serialize_body(self, buf, offset):
         pass
 
-    def serialize(self):
+    def serialize(self, buf=None, offset=0):
+        """encode the message into a buffer of serialized_len() bytes
+
+        The buffer is allocated once and kept in self.buf. A caller can
+        pass its own bytearray buf instead to write several messages back
+        to back. The message is then encoded at buf[offset:], which must
+        have room for it, and self.buf is a read-only view of those bytes.
+        Returns the offset following the message.
+        """
         self._serialize_pre()
-        self._serialize_body()
-        self._serialize_header()
+        msg_len = self.serialized_len()
+        if buf is None:
+            buf = bytearray(msg_len)
+            offset = 0
+            self.buf = buf
+        else:
+            assert len(buf) >= offset + msg_len
+            self.buf = buffer(buf, offset, msg_len)
+
+        self._serialize_body(buf, offset)
+        self._serialize_header(buf, offset, msg_len)
+        return offset + msg_len
+
+
+def _set_data(buf, offset, data):
+    buf[offset:offset + len(data)] = data
+
 
+def _actions_len(actions):
+    if actions is None:
+        return 0
+    return sum(a.len for a in actions)
+
+
+#
+# patchable fields of message templates: name -> (fmt, offset)
+#
+_TEMPLATE_HEADER_FIELDS = {'xid': ('!I', 4)}
 
-def _pack_into(fmt, buf, offset, *args):
-    if len(buf) < offset:
-        buf += bytearray().zfill(offset - len(buf))
+# offsets within ofp_match
+_TEMPLATE_MATCH_FIELDS = {
+    'in_port': ('!H', 4),
+    'dl_src': ('!6s', 6),
+    'dl_dst': ('!6s', 12),
+}
 
-    if len(buf) == offset:
-        buf += struct.pack(fmt, *args)
-        return
+# offset of port within ofp_action_output
+_TEMPLATE_ACTION_OUTPUT_PORT = 4
 
-    needed_len = offset + struct.calcsize(fmt)
-    if len(buf) < needed_len:
-        buf += bytearray().zfill(needed_len - len(buf))
 
-    struct.pack_into(fmt, buf, offset, *args)
+def _template_fields(*field_maps):
+    """merge (field_map, offset) pairs into a field map of the message"""
+    fields = dict(_TEMPLATE_HEADER_FIELDS)
+    for (field_map, offset) in field_maps:
+        for name, (fmt, field_offset) in field_map.items():
+            fields[name] = (fmt, offset + field_offset)
+    return fields
+
+
+def _template_output_port(fields, actions, offset):
+    """the port of a leading output action becomes patchable as output_port
+
+    It isn't named out_port, which is the ofp_flow_mod field filtering
+    deletes.
+    """
+    if actions and isinstance(actions[0], OFPActionOutput):
+        fields['output_port'] = ('!H', offset + _TEMPLATE_ACTION_OUTPUT_PORT)
 
 
 def _str_attr(msg, buf, attr_list):
@@ -145,8 +239,7 @@ class OFPPhyPort(collections.namedtuple('OFPPhyPort', (
 
     @classmethod
     def parser(cls, buf, offset):
-        port = struct.unpack_from(ofproto_v1_0.OFP_PHY_PORT_PACK_STR,
-                                  buf, offset)
+        port = _codec.OFP_PHY_PORT_PACK_STR.unpack_from(buf, offset)
         return cls(*port)
 
 
@@ -156,23 +249,163 @@ class OFPMatch(collections.namedtuple('OFPMatchBase', (
             'nw_src', 'nw_dst', 'tp_src', 'tp_dst'))):
 
     def serialize(self, buf, offset):
-        _pack_into(ofproto_v1_0.OFP_MATCH_PACK_STR, buf, offset, *self)
+        _codec.OFP_MATCH_PACK_STR.pack_into(buf, offset, *self)
 
     @classmethod
     def parse(cls, buf, offset):
-        match = struct.unpack_from(ofproto_v1_0.OFP_MATCH_PACK_STR,
-                                   buf, offset)
+        match = _codec.OFP_MATCH_PACK_STR.unpack_from(buf, offset)
         return cls(*match)
 
+    @classmethod
+    def from_fields(cls, fields, **kwargs):
+        """match on the field names in fields, a tuple or a frozenset
+
+        The values of the fields are given by kwargs and default to 0.
+        The other fields are wildcarded.
+        """
+        (wildcards, _getter, _defaults) = _match_layout(fields)
+        return _MATCH_ZERO._replace(wildcards=wildcards, **kwargs)
+
+    @classmethod
+    def from_packet(cls, data, in_port, fields=None):
+        """match of the packet data received from in_port
+
+        Only the field names in fields, a tuple or a frozenset, are
+        matched. By default the match is exact.
+        """
+        values = _packet_match_values(data, in_port)
+        # tuple.__new__ skips the argument handling of the namedtuple
+        if fields is None:
+            return tuple.__new__(cls, (0, ) + values)
+
+        (_wildcards, getter, defaults) = _match_layout(fields)
+        return tuple.__new__(cls, getter(values + defaults))
+
+
+_MATCH_ZERO = OFPMatch(ofproto_v1_0.OFPFW_ALL, 0, '\x00' * 6, '\x00' * 6,
+                       0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+# match field -> wildcard bits which ignore it
+_MATCH_FIELD_WILDCARDS = {
+    'in_port': ofproto_v1_0.OFPFW_IN_PORT,
+    'dl_src': ofproto_v1_0.OFPFW_DL_SRC,
+    'dl_dst': ofproto_v1_0.OFPFW_DL_DST,
+    'dl_vlan': ofproto_v1_0.OFPFW_DL_VLAN,
+    'dl_vlan_pcp': ofproto_v1_0.OFPFW_DL_VLAN_PCP,
+    'dl_type': ofproto_v1_0.OFPFW_DL_TYPE,
+    'nw_tos': ofproto_v1_0.OFPFW_NW_TOS,
+    'nw_proto': ofproto_v1_0.OFPFW_NW_PROTO,
+    'nw_src': ofproto_v1_0.OFPFW_NW_SRC_MASK,
+    'nw_dst': ofproto_v1_0.OFPFW_NW_DST_MASK,
+    'tp_src': ofproto_v1_0.OFPFW_TP_SRC,
+    'tp_dst': ofproto_v1_0.OFPFW_TP_DST,
+}
+
+_match_layouts = {}     # fields -> (wildcards, getter, defaults)
+
+
+def _match_layout(fields):
+    """precomputed layout of the matches on a field set
+
+    getter(values + defaults) is the match of the field set, where
+    values are the match values of a packet and defaults are the
+    wildcards followed by the zero values.
+    """
+    layout = _match_layouts.get(fields)
+    if layout is None:
+        wildcards = ofproto_v1_0.OFPFW_ALL
+        for name in fields:
+            wildcards &= ~_MATCH_FIELD_WILDCARDS[name]
+
+        # index into values + (wildcards, ) + the zero values
+        names = OFPMatch._fields
+        nvalues = len(names) - 1
+        getter = operator.itemgetter(nvalues, *[
+                i - 1 if name in fields else nvalues + i
+                for (i, name) in enumerate(names) if i > 0])
+        defaults = (wildcards, ) + _MATCH_ZERO[1:]
+        layout = (wildcards, getter, defaults)
+        _match_layouts[fields] = layout
+    return layout
+
+
+_ETH_HEADER = struct.Struct('!6s6sH')
+_VLAN_HEADER = struct.Struct('!HH')
+# version/ihl, tos, flags/fragment offset, proto, src, dst
+_IPV4_HEADER = struct.Struct('!BB4xH1xB2xII')
+# opcode, sender and target protocol addresses
+_ARP_PACKET = struct.Struct('!6xH6xI6xI')
+_L4_PORTS = struct.Struct('!HH')
+_ICMP_TYPE_CODE = struct.Struct('!BB')
+# untagged Ethernet, IPv4 without options and TCP/UDP ports
+_ETH_IPV4_PORTS = struct.Struct('!6s6sHBB4xH1xB2xIIHH')
+
+
+def _packet_match_values(data, in_port):
+    """match field values of a packet, in OFPMatch order"""
+    if len(data) >= _ETH_IPV4_PORTS.size:
+        # the common case takes a single unpack
+        (dl_dst, dl_src, dl_type, version_ihl, nw_tos, frag, nw_proto,
+         nw_src, nw_dst, tp_src,
+         tp_dst) = _ETH_IPV4_PORTS.unpack_from(data)
+        if (dl_type == ether.ETH_TYPE_IP and version_ihl == 0x45 and
+            not frag & 0x1fff and
+            nw_proto in (inet.IPPROTO_TCP, inet.IPPROTO_UDP)):
+            return (in_port, dl_src, dl_dst, ofproto_v1_0.OFP_VLAN_NONE, 0,
+                    dl_type, nw_tos & 0xfc, nw_proto, nw_src, nw_dst,
+                    tp_src, tp_dst)
+    return _decode_match_values(data, in_port)
+
+
+def _decode_match_values(data, in_port):
+    """match field values of any packet, decoding a header at a time"""
+    (dl_dst, dl_src, dl_type) = _ETH_HEADER.unpack_from(data, 0)
+    offset = _ETH_HEADER.size
+    dl_vlan = ofproto_v1_0.OFP_VLAN_NONE
+    dl_vlan_pcp = 0
+    if dl_type == ether.ETH_TYPE_8021Q:
+        (tci, dl_type) = _VLAN_HEADER.unpack_from(data, offset)
+        offset += _VLAN_HEADER.size
+        dl_vlan = tci & 0xfff
+        dl_vlan_pcp = tci >> 13
+    if dl_type < 0x600:
+        # 802.3 length field
+        dl_type = ofproto_v1_0.OFP_DL_TYPE_NOT_ETH_TYPE
+
+    nw_tos = nw_proto = nw_src = nw_dst = tp_src = tp_dst = 0
+    if (dl_type == ether.ETH_TYPE_IP and
+        len(data) >= offset + _IPV4_HEADER.size):
+        (version_ihl, nw_tos, frag, nw_proto, nw_src,
+         nw_dst) = _IPV4_HEADER.unpack_from(data, offset)
+        nw_tos &= 0xfc
+        offset += (version_ihl & 0xf) * 4
+
+        # only the first fragment has the transport header
+        transport = len(data) - offset if not frag & 0x1fff else 0
+        if (nw_proto in (inet.IPPROTO_TCP, inet.IPPROTO_UDP) and
+            transport >= _L4_PORTS.size):
+            (tp_src, tp_dst) = _L4_PORTS.unpack_from(data, offset)
+        elif (nw_proto == inet.IPPROTO_ICMP and
+              transport >= _ICMP_TYPE_CODE.size):
+            (tp_src, tp_dst) = _ICMP_TYPE_CODE.unpack_from(data, offset)
+    elif (dl_type == ether.ETH_TYPE_ARP and
+          len(data) >= offset + _ARP_PACKET.size):
+        (opcode, nw_src, nw_dst) = _ARP_PACKET.unpack_from(data, offset)
+        # the lower 8 bits of the opcode
+        nw_proto = opcode & 0xff
+
+    return (in_port, dl_src, dl_dst, dl_vlan, dl_vlan_pcp, dl_type,
+            nw_tos, nw_proto, nw_src, nw_dst, tp_src, tp_dst)
+
 
 class OFPActionHeader(object):
     def __init__(self, type, len):
         self.type = type
         self.len = len
 
-    def serlize(self, buf, offset):
-        _pack_into(ofproto_v1_0.OFP_ACTION_HEADER_PACK_STR,
-                   buf, offset, self.type, self.len)
+    def serialize(self, buf, offset):
+        _codec.OFP_ACTION_HEADER_PACK_STR.pack_into(
+            buf, offset, self.type, self.len)
 
 
 class OFPActionOutput(OFPActionHeader):
@@ -184,8 +417,8 @@ class OFPActionOutput(OFPActionHeader):
         self.max_len = max_len
 
     def serialize(self, buf, offset):
-        _pack_into(ofproto_v1_0.OFP_ACTION_OUTPUT_PACK_STR,
-                   buf, offset, self.type, self.len, self.port, self.max_len)
+        _codec.OFP_ACTION_OUTPUT_PACK_STR.pack_into(
+            buf, offset, self.type, self.len, self.port, self.max_len)
 
 
 # TODO:XXX more actions
@@ -213,21 +446,19 @@ class OFPErrorMsg(MsgBase):
         self.code = None
         self.data = None
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPErrorMsg, cls).parser(datapath, version, msg_type,
-                                             msg_len, xid, buf)
-        msg.type, msg.code = struct.unpack_from(
-            ofproto_v1_0.OFP_ERROR_MSG_PACK_STR, msg.buf,
-            ofproto_v1_0.OFP_HEADER_SIZE)
-        msg.data = msg.buf[ofproto_v1_0.OFP_ERROR_MSG_SIZE:]
-        return msg
+    def _parse_body(self):
+        self.type, self.code = _codec.OFP_ERROR_MSG_PACK_STR.unpack_from(
+            self.buf, ofproto_v1_0.OFP_HEADER_SIZE)
+        self.data = self.buf[ofproto_v1_0.OFP_ERROR_MSG_SIZE:]
 
-    def _serialize_body(self):
+    def serialized_len(self):
         assert self.data is not None
-        _pack_into(ofproto_v1_0.OFP_ERROR_MSG_PACK_STR, self.buf,
-                   ofproto_v1_0.OFP_HEADER_SIZE, self.type, self.code)
-        self.buf += self.data
+        return ofproto_v1_0.OFP_ERROR_MSG_SIZE + len(self.data)
+
+    def _serialize_body(self, buf, offset):
+        _codec.OFP_ERROR_MSG_PACK_STR.pack_into(
+            buf, offset + ofproto_v1_0.OFP_HEADER_SIZE, self.type, self.code)
+        _set_data(buf, offset + ofproto_v1_0.OFP_ERROR_MSG_SIZE, self.data)
 
 
 @_register_parser
@@ -237,16 +468,15 @@ class OFPEchoRequest(MsgBase):
         super(OFPEchoRequest, self).__init__(datapath)
         self.data = None
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPEchoRequest, cls).parser(datapath, version, msg_type,
-                                                msg_len, xid, buf)
-        msg.data = msg.buf[ofproto_v1_0.OFP_HEADER_SIZE:]
-        return msg
+    def _parse_body(self):
+        self.data = self.buf[ofproto_v1_0.OFP_HEADER_SIZE:]
 
-    def _serialize_body(self):
+    def serialized_len(self):
         assert self.data is not None
-        self.buf += self.data
+        return ofproto_v1_0.OFP_HEADER_SIZE + len(self.data)
+
+    def _serialize_body(self, buf, offset):
+        _set_data(buf, offset + ofproto_v1_0.OFP_HEADER_SIZE, self.data)
 
 
 @_register_parser
@@ -256,16 +486,15 @@ class OFPEchoReply(MsgBase):
         super(OFPEchoReply, self).__init__(datapath)
         self.data = None
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPEchoReply, cls).parser(datapath, version, msg_type,
-                                              msg_len, xid, buf)
-        msg.data = msg.buf[ofproto_v1_0.OFP_HEADER_SIZE:]
-        return msg
+    def _parse_body(self):
+        self.data = self.buf[ofproto_v1_0.OFP_HEADER_SIZE:]
 
-    def _serialize_body(self):
+    def serialized_len(self):
         assert self.data is not None
-        self.buf += self.data
+        return ofproto_v1_0.OFP_HEADER_SIZE + len(self.data)
+
+    def _serialize_body(self, buf, offset):
+        _set_data(buf, offset + ofproto_v1_0.OFP_HEADER_SIZE, self.data)
 
 
 @_register_parser
@@ -275,21 +504,19 @@ class OFPVendor(MsgBase):
         super(OFPVendor, self).__init__(datapath)
         self.data = None
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPVendor, cls).parser(datapath, version, msg_type,
-                                           msg_len, xid, buf)
-        msg.vendor = struct.unpack_from(
-            ofproto_v1_0.OFP_VENDOR_HEADER_PACK_STR, msg.buf,
-            ofproto_v1_0.OFP_HEADER_SIZE)
-        msg.data = msg.buf[ofproto_v1_0.OFP_VENDOR_HEADER_SIZE:]
-        return msg
+    def _parse_body(self):
+        self.vendor = _codec.OFP_VENDOR_HEADER_PACK_STR.unpack_from(
+            self.buf, ofproto_v1_0.OFP_HEADER_SIZE)[0]
+        self.data = self.buf[ofproto_v1_0.OFP_VENDOR_HEADER_SIZE:]
 
-    def _serialize_body(self):
+    def serialized_len(self):
         assert self.data is not None
-        _pack_into(ofproto_v1_0.OFP_VENDOR_HEADER_PACK_STR,
-                   self.buf, ofproto_v1_0.OFP_HEADER_SIZE, self.vendor)
-        self.buf += self.data
+        return ofproto_v1_0.OFP_VENDOR_HEADER_SIZE + len(self.data)
+
+    def _serialize_body(self, buf, offset):
+        _codec.OFP_VENDOR_HEADER_PACK_STR.pack_into(
+            buf, offset + ofproto_v1_0.OFP_HEADER_SIZE, self.vendor)
+        _set_data(buf, offset + ofproto_v1_0.OFP_VENDOR_HEADER_SIZE, self.data)
 
 
 #
@@ -310,30 +537,24 @@ class OFPSwitchFeatures(MsgBase):
             buf += ' ' + str(p)
         return buf
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPSwitchFeatures, cls).parser(datapath, version, msg_type,
-                                                   msg_len, xid, buf)
-        (msg.datapath_id,
-         msg.n_buffers,
-         msg.n_tables,
-         msg.capabilities,
-         msg.actions) = struct.unpack_from(
-            ofproto_v1_0.OFP_SWITCH_FEATURES_PACK_STR, msg.buf,
-            ofproto_v1_0.OFP_HEADER_SIZE)
-
-        msg.ports = {}
-        n_ports = ((msg_len - ofproto_v1_0.OFP_SWITCH_FEATURES_SIZE) /
+    def _parse_body(self):
+        (self.datapath_id,
+         self.n_buffers,
+         self.n_tables,
+         self.capabilities,
+         self.actions) = _codec.OFP_SWITCH_FEATURES_PACK_STR.unpack_from(
+            self.buf, ofproto_v1_0.OFP_HEADER_SIZE)
+
+        self.ports = {}
+        n_ports = ((self.msg_len - ofproto_v1_0.OFP_SWITCH_FEATURES_SIZE) /
                    ofproto_v1_0.OFP_PHY_PORT_SIZE)
         offset = ofproto_v1_0.OFP_SWITCH_FEATURES_SIZE
         for i in range(n_ports):
-            port = OFPPhyPort.parser(msg.buf, offset)
+            port = OFPPhyPort.parser(self.buf, offset)
             # print 'port = %s' % str(port)
-            msg.ports[port.port_no] = port
+            self.ports[port.port_no] = port
             offset += ofproto_v1_0.OFP_PHY_PORT_SIZE
 
-        return msg
-
 
 @_register_parser
 @_set_msg_type(ofproto_v1_0.OFPT_PORT_STATUS)
@@ -341,16 +562,11 @@ class OFPPortStatus(MsgBase):
     def __init__(self, datapath):
         super(OFPPortStatus, self).__init__(datapath)
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPPortStatus, cls).parser(datapath, version, msg_type,
-                                                   msg_len, xid, buf)
-        msg.reason = struct.unpack_from(
-            ofproto_v1_0.OFP_PORT_STATUS_PACK_STR,
-            msg.buf, ofproto_v1_0.OFP_HEADER_SIZE)[0]
-        msg.desc = OFPPhyPort.parser(msg.buf,
-                                     ofproto_v1_0.OFP_PORT_STATUS_DESC_OFFSET)
-        return msg
+    def _parse_body(self):
+        self.reason = _codec.OFP_PORT_STATUS_PACK_STR.unpack_from(
+            self.buf, ofproto_v1_0.OFP_HEADER_SIZE)[0]
+        self.desc = OFPPhyPort.parser(self.buf,
+                                      ofproto_v1_0.OFP_PORT_STATUS_DESC_OFFSET)
 
 
 @_register_parser
@@ -364,18 +580,13 @@ class OFPPacketIn(MsgBase):
         return _str_attr(self, buf,
                          ('buffer_id', 'total_len', 'in_port', 'reason'))
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPPacketIn, cls).parser(datapath, version, msg_type,
-                                             msg_len, xid, buf)
-        (msg.buffer_id,
-         msg.total_len,
-         msg.in_port,
-         msg.reason) = struct.unpack_from(
-            ofproto_v1_0.OFP_PACKET_IN_PACK_STR,
-            msg.buf, ofproto_v1_0.OFP_HEADER_SIZE)
-        msg.data = msg.buf[ofproto_v1_0.OFP_PACKET_IN_DATA_OFFSET:]
-        return msg
+    def _parse_body(self):
+        (self.buffer_id,
+         self.total_len,
+         self.in_port,
+         self.reason) = _codec.OFP_PACKET_IN_PACK_STR.unpack_from(
+            self.buf, ofproto_v1_0.OFP_HEADER_SIZE)
+        self.data = self.buf[ofproto_v1_0.OFP_PACKET_IN_DATA_OFFSET:]
 
 
 @_register_parser
@@ -384,14 +595,10 @@ class OFPSwitchConfig(MsgBase):
     def __init__(self, datapath):
         super(OFPSwitchConfig, self).__init__(datapath)
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPSwitchConfig, cls).parser(datapath, version, msg_type,
-                                                 msg_len, xid, buf)
-        (msg.flags, msg.miss_send_len) = struct.unpack_from(
-            ofproto_v1_0.OFP_SWITCH_CONFIG_PACK_STR,
-            msg.buf, ofproto_v1_0.OFP_HEADER_SIZE)
-        return msg
+    def _parse_body(self):
+        (self.flags,
+         self.miss_send_len) = _codec.OFP_SWITCH_CONFIG_PACK_STR.unpack_from(
+            self.buf, ofproto_v1_0.OFP_HEADER_SIZE)
 
 
 @_register_parser
@@ -414,26 +621,20 @@ class OFPFlowRemoved(MsgBase):
                           'duration_sec', 'duration_nsec',
                           'idle_timeout', 'packet_count', 'idle_count'))
 
-    @classmethod
-    def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
-        msg = super(OFPFlowRemoved, cls).parser(datapath, version, msg_type,
-                                                msg_len, xid, buf)
-
-        msg.match = OFPMatch.parse(msg.buf, ofproto_v1_0.OFP_HEADER_SIZE)
-
-        (msg.cookie,
-         msg.priority,
-         msg.reason,
-         msg.duration_sec,
-         msg.duration_nsec,
-         msg.idle_timeout,
-         msg.packet_count,
-         msg.byte_count) = struct.unpack_from(
-            ofproto_v1_0.OFP_FLOW_REMOVED_PACK_STR0, msg.buf,
+    def _parse_body(self):
+        self.match = OFPMatch.parse(self.buf, ofproto_v1_0.OFP_HEADER_SIZE)
+
+        (self.cookie,
+         self.priority,
+         self.reason,
+         self.duration_sec,
+         self.duration_nsec,
+         self.idle_timeout,
+         self.packet_count,
+         self.byte_count) = _codec.OFP_FLOW_REMOVED_PACK_STR0.unpack_from(
+            self.buf,
             ofproto_v1_0.OFP_HEADER_SIZE + ofproto_v1_0.OFP_MATCH_SIZE)
 
-        return msg
-
 #
 # controller-to-switch message
 # serializer only
@@ -459,12 +660,15 @@ class OFPSetConfig(MsgBase):
         self.flags = flags
         self.miss_send_len = miss_send_len
 
-    def _serialize_body(self):
+    def serialized_len(self):
+        return ofproto_v1_0.OFP_SWITCH_CONFIG_SIZE
+
+    def _serialize_body(self, buf, offset):
         assert self.flags is not None
         assert self.miss_send_len is not None
-        _pack_into(ofproto_v1_0.OFP_SWITCH_CONFIG_PACK_STR,
-                   self.buf, ofproto_v1_0.OFP_HEADER_SIZE,
-                   self.flags, self.miss_send_len)
+        _codec.OFP_SWITCH_CONFIG_PACK_STR.pack_into(
+            buf, offset + ofproto_v1_0.OFP_HEADER_SIZE,
+            self.flags, self.miss_send_len)
 
 
 @_set_msg_type(ofproto_v1_0.OFPT_PACKET_OUT)
@@ -478,26 +682,47 @@ class OFPPacketOut(MsgBase):
         self.actions = actions
         self.data = data
 
-    def _serialize_body(self):
+    def serialized_len(self):
+        assert self.actions is not None
+        msg_len = ofproto_v1_0.OFP_PACKET_OUT_SIZE + _actions_len(self.actions)
+        if self.data is not None:
+            msg_len += len(self.data)
+        return msg_len
+
+    def _serialize_body(self, buf, offset):
         assert self.buffer_id is not None
         assert self.in_port is not None
         assert self.actions_len is None
-        assert self.actions is not None
 
         self.actions_len = 0
-        offset = ofproto_v1_0.OFP_PACKET_OUT_SIZE
+        a_offset = offset + ofproto_v1_0.OFP_PACKET_OUT_SIZE
         for a in self.actions:
-            a.serialize(self.buf, offset)
-            offset += a.len
+            a.serialize(buf, a_offset)
+            a_offset += a.len
             self.actions_len += a.len
 
         if self.data is not None:
-            assert self.buffer_id == -1
-            self.buf += self.data
+            assert self.buffer_id == 0xffffffff
+            _set_data(buf, a_offset, self.data)
 
-        _pack_into(ofproto_v1_0.OFP_PACKET_OUT_PACK_STR,
-                   self.buf, ofproto_v1_0.OFP_HEADER_SIZE,
-                   self.buffer_id, self.in_port, self.actions_len)
+        _codec.OFP_PACKET_OUT_PACK_STR.pack_into(
+            buf, offset + ofproto_v1_0.OFP_HEADER_SIZE,
+            self.buffer_id, self.in_port, self.actions_len)
+
+    @classmethod
+    def template(cls, *args, **kwargs):
+        """ofproto_parser.MsgTemplate of the packet_out built from args
+
+        Patchable fields are xid, buffer_id, in_port and output_port,
+        the port of the first action when it is OFPActionOutput.
+        """
+        msg = cls(*args, **kwargs)
+        fields = _template_fields(
+            ({'buffer_id': ('!I', 0), 'in_port': ('!H', 4)},
+             ofproto_v1_0.OFP_HEADER_SIZE))
+        _template_output_port(fields, msg.actions,
+                           ofproto_v1_0.OFP_PACKET_OUT_SIZE)
+        return ofproto_parser.MsgTemplate(msg, fields)
 
 
 @_set_msg_type(ofproto_v1_0.OFPT_FLOW_MOD)
@@ -518,23 +743,44 @@ class OFPFlowMod(MsgBase):
         self.flags = flags
         self.actions = actions
 
-    def _serialize_body(self):
-        offset = ofproto_v1_0.OFP_HEADER_SIZE
-        self.match.serialize(self.buf, offset)
+    def serialized_len(self):
+        return ofproto_v1_0.OFP_FLOW_MOD_SIZE + _actions_len(self.actions)
+
+    def _serialize_body(self, buf, offset):
+        match_offset = offset + ofproto_v1_0.OFP_HEADER_SIZE
+        self.match.serialize(buf, match_offset)
 
-        offset += ofproto_v1_0.OFP_MATCH_SIZE
-        _pack_into(ofproto_v1_0.OFP_FLOW_MOD_PACK_STR0, self.buf, offset,
-                   self.cookie, self.command,
-                   self.idle_timeout, self.hard_timeout,
-                   self.priority, self.buffer_id, self.out_port,
-                   self.flags)
+        _codec.OFP_FLOW_MOD_PACK_STR0.pack_into(
+            buf, match_offset + ofproto_v1_0.OFP_MATCH_SIZE,
+            self.cookie, self.command,
+            self.idle_timeout, self.hard_timeout,
+            self.priority, self.buffer_id, self.out_port,
+            self.flags)
 
-        offset = ofproto_v1_0.OFP_FLOW_MOD_SIZE
+        offset += ofproto_v1_0.OFP_FLOW_MOD_SIZE
         if self.actions is not None:
             for a in self.actions:
-                a.serialize(self.buf, offset)
+                a.serialize(buf, offset)
                 offset += a.len
 
+    @classmethod
+    def template(cls, *args, **kwargs):
+        """ofproto_parser.MsgTemplate of the flow_mod built from args
+
+        Patchable fields are xid, in_port, dl_src, dl_dst, buffer_id and
+        output_port, the port of the first action when it is
+        OFPActionOutput. Patching a match field doesn't touch wildcards.
+        """
+        msg = cls(*args, **kwargs)
+        match_offset = ofproto_v1_0.OFP_HEADER_SIZE
+        fields = _template_fields(
+            (_TEMPLATE_MATCH_FIELDS, match_offset),
+            ({'buffer_id': ('!I', 16)},
+             match_offset + ofproto_v1_0.OFP_MATCH_SIZE))
+        _template_output_port(fields, msg.actions,
+                           ofproto_v1_0.OFP_FLOW_MOD_SIZE)
+        return ofproto_parser.MsgTemplate(msg, fields)
+
 
 @_set_msg_type(ofproto_v1_0.OFPT_BARRIER_REQUEST)
 class OFPBarrierRequest(MsgBase):
@@ -0,0 +1,40 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Unit tests. Run them from the top directory with
+#   python -m unittest discover -s ryu/tests -t .
+
+import gflags
+import unittest
+
+FLAGS = gflags.FLAGS
+
+# the code under test reads its flags, so parse the defaults
+FLAGS(['ryu-tests'])
+
+
+class FlagsTestCase(unittest.TestCase):
+    """restores the flags set by set_flags() on tearDown"""
+
+    def setUp(self):
+        self.saved_flags = {}
+
+    def tearDown(self):
+        for (name, value) in self.saved_flags.items():
+            setattr(FLAGS, name, value)
+
+    def set_flags(self, **kwargs):
+        for (name, value) in kwargs.items():
+            self.saved_flags.setdefault(name, getattr(FLAGS, name))
+            setattr(FLAGS, name, value)
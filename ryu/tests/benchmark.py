@@ -0,0 +1,334 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Micro-benchmarks. Run them from the top directory with
+#   python -m ryu.tests.benchmark [name ...]
+# Without a name, every benchmark runs.
+
+import copy
+import gevent
+import gevent.socket
+import resource
+import struct
+import sys
+import time
+
+from ryu.controller import controller
+from ryu.controller import dispatcher
+from ryu.controller import event
+from ryu.ofproto import ofproto_parser
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+from ryu.tests import fake_switch
+
+_BENCHMARKS = []
+
+
+def benchmark(func):
+    _BENCHMARKS.append((func.__name__, func))
+    return func
+
+
+def _report(columns, rows):
+    print ('  ' + ''.join('%-14s' % column for column in columns)).rstrip()
+    for row in rows:
+        print ('  ' + ''.join('%-14s' % value for value in row)).rstrip()
+
+
+def _best(func, repeat=5):
+    """shortest of repeat runs of func() in seconds"""
+    best = None
+    for _i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _maxrss():
+    """peak resident set size of the process in KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _StreamSocket(object):
+    """socket receiving n_msgs copies of msg in segments of segment_len"""
+
+    def __init__(self, msg, n_msgs, segment_len):
+        # whole messages so that the stream wraps on a message boundary
+        self.block = msg * max(1, 65536 // len(msg))
+        self.offset = 0
+        self.left = len(msg) * n_msgs
+        self.segment_len = segment_len
+
+    def recv_into(self, view):
+        length = min(self.segment_len, len(view), self.left,
+                     len(self.block) - self.offset)
+        view[:length] = self.block[self.offset:self.offset + length]
+        self.offset = (self.offset + length) % len(self.block)
+        self.left -= length
+        return length
+
+
+def _recv_msgs(sock):
+    recv_buf = controller._RecvBuffer()
+    while recv_buf.recv(sock):
+        for (version, msg_type, msg_len, xid, buf) in recv_buf.frames():
+            msg = ofproto_parser.msg(None, version, msg_type, msg_len, xid,
+                                     buf)
+            # as the handler of the packet-in would
+            msg.in_port
+
+
+@benchmark
+def recv():
+    """frame and parse packet-ins as the receive loop does
+
+    The cost per message stays flat as the number of messages grows and
+    the peak memory doesn't grow with it.
+    """
+    rows = []
+    for data_len in (100, 1400):
+        msg = fake_switch.packet_in(
+            1, fake_switch.ethernet('\x00' * 5 + '\x02', '\x00' * 5 + '\x01',
+                                    payload='x' * (data_len - 14)))
+        for n_msgs in (10000, 100000, 1000000):
+            rss = _maxrss()
+            elapsed = _best(lambda: _recv_msgs(
+                    _StreamSocket(msg, n_msgs, 1500)),
+                            max(2, min(10, 1000000 // n_msgs)))
+            rows.append((len(msg), n_msgs,
+                         '%.2f' % (elapsed / n_msgs * 1e6),
+                         '%d' % (n_msgs / elapsed),
+                         _maxrss() - rss))
+    _report(('msg_len', 'msgs', 'us/msg', 'msgs/s', 'maxrss+KB'), rows)
+
+
+class _CountingSocket(object):
+    """socket counting its sendall() calls"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sendalls = 0
+
+    def sendall(self, data):
+        self.sendalls += 1
+        self.sock.sendall(data)
+
+
+def _send_per_msg(datapath):
+    # the send loop before write coalescing
+    while datapath.is_active:
+        datapath.socket.sendall(datapath.send_q.get())
+
+
+def _coalesce(datapath):
+    datapath._send_loop()
+
+
+def _drain(sock, length):
+    while length > 0:
+        length -= len(sock.recv(65536))
+
+
+def _learning_switch_msgs():
+    """a flow_mod and a packet_out as SimpleSwitch sends per packet-in"""
+    actions = [ofproto_v1_0_parser.OFPActionOutput(2)]
+    match = ofproto_v1_0_parser.OFPMatch.from_fields(('in_port', 'dl_dst'),
+                                                     in_port=1)
+    flow_mod = ofproto_v1_0_parser.OFPFlowMod(
+        None, match=match, cookie=0, command=ofproto_v1_0.OFPFC_ADD,
+        idle_timeout=0, hard_timeout=0, priority=32768, buffer_id=0xffffffff,
+        out_port=ofproto_v1_0.OFPP_NONE, flags=0, actions=actions)
+    packet_out = ofproto_v1_0_parser.OFPPacketOut(
+        None, buffer_id=1, in_port=1, actions=actions)
+    flow_mod.serialize()
+    packet_out.serialize()
+    return (str(flow_mod.buf), str(packet_out.buf))
+
+
+def _send_msgs(send_loop, flush_delay, n_packet_ins, batch):
+    """(seconds, sendall calls) to send the replies to n_packet_ins
+
+    The replies to batch packet-ins are queued before the sender yields,
+    as the event loop does for a batch of received packet-ins.
+    """
+    (sock, peer) = gevent.socket.socketpair()
+    datapath = controller.Datapath(_CountingSocket(sock), ('bench', 0))
+    datapath.send_flush_delay = flush_delay
+    msgs = _learning_switch_msgs()
+    sender = gevent.spawn(send_loop, datapath)
+    reader = gevent.spawn(_drain, peer,
+                          sum(len(msg) for msg in msgs) * n_packet_ins)
+
+    start = time.time()
+    for _i in range(n_packet_ins // batch):
+        for _j in range(batch):
+            for msg in msgs:
+                datapath.send(msg)
+        gevent.sleep(0)
+    reader.join()
+    elapsed = time.time() - start
+
+    sender.kill()
+    sock.close()
+    peer.close()
+    return (elapsed, datapath.socket.sendalls)
+
+
+@benchmark
+def send():
+    """send the flow_mod and packet_out replies of packet-ins
+
+    A sendall() per message against write coalescing, with packet-ins
+    handled one at a time or in batches, and with a flush delay.
+    """
+    n_packet_ins = 20000
+    n_msgs = n_packet_ins * 2
+    rows = []
+    for (name, send_loop, flush_delay) in (
+        ('per_msg', _send_per_msg, 0),
+        ('coalesce', _coalesce, 0),
+        ('delay_1ms', _coalesce, 0.001)):
+        for batch in (1, 10, 100):
+            (elapsed, sendalls) = min(
+                _send_msgs(send_loop, flush_delay, n_packet_ins, batch)
+                for _i in range(3))
+            rows.append((name, batch, '%.2f' % (elapsed / n_msgs * 1e6),
+                         '%d' % (n_msgs / elapsed),
+                         '%.4f' % (float(sendalls) / n_msgs)))
+    _report(('loop', 'batch', 'us/msg', 'msgs/s', 'sendall/msg'), rows)
+
+
+def _phy_ports(n_ports):
+    return ''.join(fake_switch.phy_port(port)
+                   for port in range(1, n_ports + 1))
+
+
+def _parse_msgs():
+    """(name, encoded message, a body attribute) of each message type"""
+    match = struct.pack(ofproto_v1_0.OFP_MATCH_PACK_STR,
+                        0, 1, '\x00' * 5 + '\x01', '\x00' * 5 + '\x02',
+                        0xffff, 0, 0x0800, 0, 6, 0x0a000001, 0x0a000002,
+                        80, 8080)
+    features = struct.pack(ofproto_v1_0.OFP_SWITCH_FEATURES_PACK_STR,
+                           0x1234, 256, 1, 0xff, 0xfff)
+    data = fake_switch.ethernet('\x00' * 5 + '\x02', '\x00' * 5 + '\x01')
+    return [
+        ('features_48', fake_switch.msg(ofproto_v1_0.OFPT_FEATURES_REPLY, 1,
+                                        features + _phy_ports(48)),
+         'ports'),
+        ('packet_in', fake_switch.packet_in(3, data), 'in_port'),
+        ('port_status', fake_switch.port_status(ofproto_v1_0.OFPPR_MODIFY,
+                                                5),
+         'desc'),
+        ('flow_removed', fake_switch.msg(
+                ofproto_v1_0.OFPT_FLOW_REMOVED, 4, match + struct.pack(
+                    ofproto_v1_0.OFP_FLOW_REMOVED_PACK_STR0,
+                    1, 2, ofproto_v1_0.OFPRR_DELETE, 3, 4, 5, 6, 7)),
+         'match'),
+        ('error', fake_switch.error(5), 'data'),
+        ('echo', fake_switch.msg(ofproto_v1_0.OFPT_ECHO_REQUEST, 6, 'ping'),
+         'data'),
+        ]
+
+
+def _parse_time(buf, attr, n):
+    (version, msg_type, msg_len, xid) = ofproto_parser.header(buf)
+    msg = ofproto_parser.msg
+
+    def parse():
+        for _i in xrange(n):
+            msg(None, version, msg_type, msg_len, xid, buf)
+
+    def parse_read():
+        for _i in xrange(n):
+            getattr(msg(None, version, msg_type, msg_len, xid, buf), attr)
+
+    return (_best(parse) / n, _best(parse_read) / n)
+
+
+@benchmark
+def parse():
+    """parse messages eagerly and lazily
+
+    parse only decodes, parse+read then reads one body attribute.
+    """
+    n = 20000
+    rows = []
+    try:
+        for (name, buf, attr) in _parse_msgs():
+            ofproto_v1_0_parser.set_lazy_decode(False)
+            (eager, eager_read) = _parse_time(buf, attr, n)
+            ofproto_v1_0_parser.set_lazy_decode(True)
+            (lazy, lazy_read) = _parse_time(buf, attr, n)
+            rows.append((name, len(buf)) +
+                        tuple('%.2f' % (t * 1e6) for t in
+                              (eager, lazy, eager_read, lazy_read)))
+    finally:
+        ofproto_v1_0_parser.set_lazy_decode(False)
+    _report(('msg', 'len', 'eager', 'lazy', 'eager+read', 'lazy+read'),
+            rows)
+    print '  (us per message)'
+
+
+def _copy_dispatch(events, ev):
+    # the dispatch before handler tuples: a copy of the list per event
+    # and the exact class only
+    if ev.__class__ not in events:
+        return
+    for h in copy.copy(events[ev.__class__]):
+        if h(ev) is False:
+            break
+
+
+@benchmark
+def dispatch():
+    """dispatch a packet-in event to n handlers
+
+    copy_list is the old per-event list copy. exact_class and base_class
+    register the handlers on EventOFPPacketIn and on its base
+    EventOFPMsgBase, which the MRO cache resolves.
+    """
+    n = 100000
+    ev = event.EventOFPPacketIn(None)
+    rows = []
+    for n_handlers in (1, 10, 100):
+        handlers = [lambda ev: None for _i in range(n_handlers)]
+        events = {event.EventOFPPacketIn: list(handlers)}
+        times = [_best(lambda: [_copy_dispatch(events, ev)
+                                for _i in xrange(n)])]
+        for ev_cls in (event.EventOFPPacketIn, event.EventOFPMsgBase):
+            ev_dispatcher = dispatcher.EventDispatcher('bench')
+            for h in handlers:
+                ev_dispatcher.register_handler(ev_cls, h)
+            times.append(_best(lambda: [ev_dispatcher.dispatch(ev)
+                                        for _i in xrange(n)]))
+        rows.append((n_handlers, ) +
+                    tuple('%.2f' % (t / n * 1e6) for t in times))
+    _report(('handlers', 'copy_list', 'exact_class', 'base_class'), rows)
+    print '  (us per event)'
+
+
+def main(names):
+    for (name, func) in _BENCHMARKS:
+        if names and name not in names:
+            continue
+        print '%s: %s' % (name, func.__doc__.splitlines()[0])
+        func()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,128 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import struct
+import time
+from gevent import socket
+
+from ryu.controller import controller
+from ryu.ofproto import ofproto_v1_0 as ofproto
+
+
+def header(msg_type, msg_len, xid=0):
+    return struct.pack(ofproto.OFP_HEADER_PACK_STR, ofproto.OFP_VERSION,
+                       msg_type, msg_len, xid)
+
+
+def msg(msg_type, xid=0, body=''):
+    return header(msg_type, ofproto.OFP_HEADER_SIZE + len(body), xid) + body
+
+
+def packet_in(in_port, data, xid=0, buffer_id=0xffffffff):
+    body = struct.pack('!IHHBx', buffer_id, len(data), in_port,
+                       ofproto.OFPR_NO_MATCH) + data
+    return msg(ofproto.OFPT_PACKET_IN, xid, body)
+
+
+def ethernet(dst, src, ethertype=0x0800, payload='\x45' + '\x00' * 39):
+    return dst + src + struct.pack('!H', ethertype) + payload
+
+
+def phy_port(port_no):
+    return struct.pack(ofproto.OFP_PHY_PORT_PACK_STR, port_no,
+                       '\x00' * 5 + chr(port_no), 'eth%d' % port_no,
+                       0, 0, 0, 0, 0, 0)
+
+
+def port_status(reason, port_no, xid=0):
+    return msg(ofproto.OFPT_PORT_STATUS, xid,
+               struct.pack('!B7x', reason) + phy_port(port_no))
+
+
+def error(xid, type_=ofproto.OFPET_BAD_REQUEST,
+          code=ofproto.OFPBRC_BAD_TYPE):
+    return msg(ofproto.OFPT_ERROR, xid,
+               struct.pack(ofproto.OFP_ERROR_MSG_PACK_STR, type_, code))
+
+
+class FakeSwitch(object):
+    """OpenFlow 1.0 switch at one end of a socketpair
+
+    The other end is served by a controller.Datapath in a greenlet.
+    """
+
+    def __init__(self, dpid=1, ports=(1, 2)):
+        (self.sock, dp_sock) = socket.socketpair()
+        self.dpid = dpid
+        self.ports = ports
+        self.datapath = controller.Datapath(dp_sock, ('fake', dpid))
+        self.thread = gevent.spawn(self.datapath.serve)
+        self.buf = ''
+
+    def close(self):
+        self.sock.close()
+        # serve() would wait for its event and send loops, which notice
+        # the disconnection only on their next message
+        self.thread.kill()
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def recv(self, timeout=0.2, until=None):
+        """(msg_type, xid, data) received within timeout seconds
+
+        When until is given, returns as soon as a message of that type is
+        received.
+        """
+        msgs = []
+        deadline = time.time() + timeout
+        while True:
+            while len(self.buf) >= ofproto.OFP_HEADER_SIZE:
+                (_version, msg_type, msg_len, xid) = struct.unpack_from(
+                    ofproto.OFP_HEADER_PACK_STR, self.buf)
+                if len(self.buf) < msg_len:
+                    break
+                msgs.append((msg_type, xid, self.buf[:msg_len]))
+                self.buf = self.buf[msg_len:]
+                if msg_type == until:
+                    return msgs
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return msgs
+            self.sock.settimeout(remaining)
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                return msgs
+            if not data:
+                return msgs
+            self.buf += data
+
+    def handshake(self):
+        """answer hello, features request and barrier up to main mode"""
+        self.send(msg(ofproto.OFPT_HELLO))
+        msgs = self.recv(1, until=ofproto.OFPT_FEATURES_REQUEST)
+        xid = msgs[-1][1]
+
+        ports = ''.join(phy_port(port) for port in self.ports)
+        body = struct.pack(ofproto.OFP_SWITCH_FEATURES_PACK_STR,
+                           self.dpid, 256, 1, 0, 0) + ports
+        self.send(msg(ofproto.OFPT_FEATURES_REPLY, xid, body))
+
+        msgs = self.recv(1, until=ofproto.OFPT_BARRIER_REQUEST)
+        self.send(msg(ofproto.OFPT_BARRIER_REPLY, msgs[-1][1]))
+        # let the event loop of the datapath move onto main mode
+        gevent.sleep(0.05)
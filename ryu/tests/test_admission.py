@@ -0,0 +1,138 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import time
+import unittest
+
+from ryu import tests
+from ryu.controller import admission
+
+_PACKET_IN = 10
+_OTHER = 12
+
+
+class _Msg(object):
+    def __init__(self, in_port, seq=0, msg_type=_PACKET_IN):
+        self.msg_type = msg_type
+        self.in_port = in_port
+        self.seq = seq
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refill(self):
+        bucket = admission.TokenBucket(10.0, 2, now=100.0)
+        for _i in range(2):
+            self.assertTrue(bucket.ready())
+            bucket.take()
+        self.assertFalse(bucket.ready())
+        self.assertAlmostEqual(bucket.wait_time(), 0.1)
+
+        bucket.refill(100.05)
+        self.assertFalse(bucket.ready())
+        bucket.refill(100.15)
+        self.assertTrue(bucket.ready())
+        # never above burst
+        bucket.refill(200.0)
+        self.assertEqual(bucket.tokens, 2)
+
+    def test_unlimited(self):
+        bucket = admission.TokenBucket(0, 1)
+        for _i in range(10):
+            bucket.take()
+        self.assertTrue(bucket.ready())
+        self.assertEqual(bucket.wait_time(), 0)
+
+
+class TestPacketInAdmission(tests.FlagsTestCase):
+    def setUp(self):
+        super(TestPacketInAdmission, self).setUp()
+        self.delivered = []
+        self.admission = None
+
+    def tearDown(self):
+        if self.admission is not None:
+            self.admission.close()
+        super(TestPacketInAdmission, self).tearDown()
+
+    def _admission(self, defer_max=100, **kwargs):
+        self.set_flags(**kwargs)
+        self.admission = admission.PacketInAdmission(self.delivered.extend,
+                                                     defer_max)
+        return self.admission
+
+    def test_port_limit(self):
+        adm = self._admission(ofp_packet_in_port_rate=1,
+                              ofp_packet_in_port_burst=2, defer_max=3)
+        msgs = [_Msg(1, seq) for seq in range(10)] + [_Msg(2), _Msg(3)]
+        admitted = adm.admit(msgs + [_Msg(1, msg_type=_OTHER)], _PACKET_IN)
+
+        self.assertEqual([(msg.in_port, msg.seq) for msg in admitted],
+                         [(1, 0), (1, 1), (2, 0), (3, 0), (1, 0)])
+        self.assertEqual(admitted[-1].msg_type, _OTHER)
+        stats = adm.stats()
+        self.assertEqual((stats['admitted'], stats['deferred'],
+                          stats['dropped'], stats['backlog']),
+                         (4, 3, 5, 3))
+        self.assertEqual(stats['ports'][1],
+                         {'admitted': 2, 'deferred': 3, 'dropped': 5,
+                          'backlog': 3})
+
+    def test_datapath_limit(self):
+        adm = self._admission(ofp_packet_in_dp_rate=1,
+                              ofp_packet_in_dp_burst=3)
+        admitted = adm.admit([_Msg(port) for port in range(1, 6)],
+                             _PACKET_IN)
+        self.assertEqual([msg.in_port for msg in admitted], [1, 2, 3])
+        self.assertEqual(adm.stats()['deferred'], 2)
+
+    def test_fair_release(self):
+        # a noisy port doesn't starve a quiet one
+        adm = self._admission(ofp_packet_in_dp_rate=1,
+                              ofp_packet_in_dp_burst=1)
+        adm.admit([_Msg(1, seq) for seq in range(1, 50)] + [_Msg(2, 0)],
+                  _PACKET_IN)
+        adm.release_thr.kill()
+
+        now = time.time()
+        released = []
+        for i in range(1, 5):
+            released.extend(adm._release(now + i))
+        self.assertEqual([(msg.in_port, msg.seq) for msg in released],
+                         [(1, 2), (2, 0), (1, 3), (1, 4)])
+
+    def test_port_delete(self):
+        adm = self._admission(ofp_packet_in_port_rate=1,
+                              ofp_packet_in_port_burst=1)
+        adm.admit([_Msg(1, seq) for seq in range(3)] + [_Msg(2)],
+                  _PACKET_IN)
+        adm.port_delete(1)
+        adm.port_delete(3)
+        self.assertEqual(adm.ports.keys(), [2])
+        self.assertEqual(list(adm.backlog), [])
+        self.assertEqual(adm.stats()['dropped'], 2)
+
+        adm.admit([_Msg(2, seq) for seq in range(1, 3)], _PACKET_IN)
+        adm.close()
+        self.assertEqual((adm.ports, list(adm.backlog)), ({}, []))
+
+    def test_release_thread(self):
+        adm = self._admission(ofp_packet_in_port_rate=100,
+                              ofp_packet_in_port_burst=1)
+        adm.admit([_Msg(1, seq) for seq in range(5)], _PACKET_IN)
+        self.assertEqual(self.delivered, [])
+        gevent.sleep(0.2)
+        self.assertEqual([msg.seq for msg in self.delivered], range(1, 5))
+        self.assertEqual(adm.stats()['released'], 4)
+        self.assertEqual(adm.release_thr, None)
@@ -0,0 +1,141 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import unittest
+
+from ryu.base import app_worker
+from ryu.controller import dpset
+from ryu.controller import mac_to_port
+from ryu.controller import network
+
+
+class _Msg(object):
+    def __init__(self, datapath):
+        self.datapath = datapath
+
+
+class _Event(object):
+    def __init__(self, datapath, seq):
+        self.msg = _Msg(datapath)
+        self.seq = seq
+
+
+class _Datapath(object):
+    def __init__(self, dpid):
+        self.id = dpid
+
+
+class TestAppWorker(unittest.TestCase):
+    def setUp(self):
+        self.worker = None
+
+    def tearDown(self):
+        if self.worker is not None:
+            gevent.killall(self.worker.threads)
+
+    def test_order_per_datapath(self):
+        self.worker = app_worker.AppWorker('test', 4, 8, 4)
+        handled = []
+
+        def handler(ev):
+            gevent.sleep(0)
+            handled.append((ev.msg.datapath, ev.seq))
+        queue_handler = self.worker.wrap(handler)
+        for seq in range(100):
+            for datapath in range(3):
+                queue_handler(_Event(datapath, seq))
+        gevent.sleep(0.1)
+
+        self.assertEqual(len(handled), 300)
+        for datapath in range(3):
+            self.assertEqual([seq for (dp, seq) in handled
+                              if dp == datapath], range(100))
+        stats = self.worker.stats()
+        self.assertEqual(stats['handled'], 300)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['q_msgs'], 0)
+        self.assertTrue(stats['q_full_count'] > 0)
+
+    def test_queue_from_lane(self):
+        # a lane queueing more events than its inbox holds must not wait
+        # for itself
+        self.worker = app_worker.AppWorker('test', 1, 2, 1)
+        handled = []
+
+        def handler(ev):
+            handled.append(ev.seq)
+            if ev.seq == 0:
+                for seq in range(1, 10):
+                    queue_handler(_Event(None, seq))
+        queue_handler = self.worker.wrap(handler)
+        queue_handler(_Event(None, 0))
+        gevent.sleep(0.1)
+        self.assertEqual(handled, range(10))
+
+    def test_error(self):
+        self.worker = app_worker.AppWorker('test', 1)
+
+        def handler(ev):
+            raise ValueError(ev.seq)
+        queue_handler = self.worker.wrap(handler)
+        queue_handler(_Event(None, 0))
+        queue_handler(_Event(None, 1))
+        gevent.sleep(0.1)
+        stats = self.worker.stats()
+        self.assertEqual((stats['handled'], stats['errors']), (2, 2))
+
+    def test_order_across_event_types(self):
+        # the events carrying a dp or dpid go to the lane of the
+        # packet-ins of the datapath
+        self.worker = app_worker.AppWorker('test', 4, 8, 4)
+        datapaths = [_Datapath(dpid) for dpid in range(1, 4)]
+        handled = []
+
+        def handler(ev):
+            gevent.sleep(0)
+            handled.append(ev)
+        queue_handler = self.worker.wrap(handler)
+
+        queued = []
+        for dp in datapaths:
+            dpset.dpset.dps[dp.id] = dp
+        try:
+            for dp in datapaths:
+                queued.append(dpset.EventDP(dp, True))
+            for seq in range(20):
+                for dp in datapaths:
+                    queued.append(_Event(dp, seq))
+                    if seq % 5 == 0:
+                        queued.append(network.EventPortAdded(dp.id, seq,
+                                                             'a', seq))
+                        queued.append(mac_to_port.EventHostMoved(
+                            None, dp.id, seq, {}))
+            for dp in datapaths:
+                queued.append(dpset.EventDP(dp, False))
+            for ev in queued:
+                queue_handler(ev)
+            gevent.sleep(0.1)
+
+            self.assertEqual(len(handled), len(queued))
+            for dp in datapaths:
+                expected = [ev for ev in queued
+                            if app_worker._datapath(ev) is dp]
+                self.assertEqual(len(expected), 30)
+                self.assertEqual([ev for ev in handled
+                                  if app_worker._datapath(ev) is dp],
+                                 expected)
+        finally:
+            for dp in datapaths:
+                del dpset.dpset.dps[dp.id]
@@ -0,0 +1,78 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import unittest
+
+from ryu.lib import bounded_queue
+
+
+class TestBoundedQueue(unittest.TestCase):
+    def test_msgs_water_marks(self):
+        q = bounded_queue.BoundedQueue(high_msgs=4, low_msgs=2)
+        for i in range(3):
+            q.put(i)
+        self.assertFalse(q.full())
+        q.put(3)
+        self.assertTrue(q.full())
+
+        # stays full until the low water mark
+        q.get()
+        self.assertTrue(q.full())
+        q.get()
+        self.assertFalse(q.full())
+        self.assertEqual(q.stats()['full_count'], 1)
+        self.assertEqual(q.stats()['max_msgs'], 4)
+
+    def test_bytes_water_marks(self):
+        q = bounded_queue.BoundedQueue(high_bytes=100, low_bytes=50)
+        q.put('a', 1, 30)
+        self.assertFalse(q.full())
+        q.put('b', 1, 80)
+        self.assertTrue(q.full())
+        q.get()
+        self.assertTrue(q.full())
+        self.assertEqual(q.stats()['bytes'], 80)
+        q.get()
+        self.assertFalse(q.full())
+
+    def test_put_blocks_while_full(self):
+        q = bounded_queue.BoundedQueue(high_msgs=2, low_msgs=1)
+        q.put(0)
+        q.put(1)
+        putter = gevent.spawn(q.put, 2)
+        gevent.sleep(0.01)
+        self.assertFalse(putter.ready())
+
+        q.get()
+        gevent.sleep(0.01)
+        self.assertTrue(putter.ready())
+        self.assertEqual([q.get(), q.get()], [1, 2])
+
+    def test_wait_not_full_timeout(self):
+        q = bounded_queue.BoundedQueue(high_msgs=1, low_msgs=0)
+        self.assertTrue(q.wait_not_full(0.01))
+        q.put(0)
+        self.assertFalse(q.wait_not_full(0.01))
+        q.put(1, block=False)
+        self.assertEqual(q.stats()['msgs'], 2)
+
+    def test_urgent(self):
+        q = bounded_queue.BoundedQueue(high_msgs=2, low_msgs=1)
+        q.put(0)
+        q.put(1)
+        # never blocks, even when full
+        q.put_urgent('u')
+        self.assertEqual(len(q), 3)
+        self.assertEqual([q.get(), q.get(), q.get()], ['u', 0, 1])
@@ -0,0 +1,442 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import struct
+import time
+import unittest
+from gevent import event as gevent_event
+
+from ryu import exception
+from ryu import tests
+from ryu.controller import controller
+from ryu.controller import dpset
+from ryu.controller import event
+from ryu.controller import handler
+from ryu.ofproto import ofproto_parser
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+from ryu.tests import fake_switch
+
+
+def _msg(msg_type, xid, body=''):
+    return struct.pack(ofproto_v1_0.OFP_HEADER_PACK_STR,
+                       ofproto_v1_0.OFP_VERSION, msg_type,
+                       ofproto_v1_0.OFP_HEADER_SIZE + len(body), xid) + body
+
+
+class _ChunkSocket(object):
+    """socket whose recv_into() returns data in chunks of chunk_len"""
+
+    def __init__(self, data, chunk_len):
+        self.data = data
+        self.chunk_len = chunk_len
+        self.offset = 0
+
+    def recv_into(self, view):
+        chunk = self.data[self.offset:
+                          self.offset + min(self.chunk_len, len(view))]
+        view[:len(chunk)] = chunk
+        self.offset += len(chunk)
+        return len(chunk)
+
+
+class TestRecvBuffer(unittest.TestCase):
+    def _frames(self, data, chunk_len, size=None):
+        if size is None:
+            recv_buf = controller._RecvBuffer()
+        else:
+            recv_buf = controller._RecvBuffer(size)
+        sock = _ChunkSocket(data, chunk_len)
+        frames = []
+        while recv_buf.recv(sock):
+            self.assertTrue(recv_buf.end <= len(recv_buf.buf))
+            # a frame is a view which the next recv() may overwrite
+            frames.extend(frame[:4] + (str(frame[4]), )
+                          for frame in recv_buf.frames())
+        self.assertEqual(recv_buf.start, recv_buf.end)
+        return frames
+
+    def test_frames(self):
+        msgs = [_msg(ofproto_v1_0.OFPT_ECHO_REQUEST, xid, 'x' * (xid % 50))
+                for xid in range(1, 200)]
+        for chunk_len in (1, 7, 64, 4096):
+            frames = self._frames(''.join(msgs), chunk_len)
+            self.assertEqual(len(frames), len(msgs))
+            for (msg, (version, msg_type, msg_len, xid, buf)) in zip(msgs,
+                                                                     frames):
+                # each message gets exactly its own bytes
+                self.assertEqual(buf, msg)
+                self.assertEqual(msg_len, len(msg))
+                self.assertEqual(msg_type, ofproto_v1_0.OFPT_ECHO_REQUEST)
+
+    def test_buffer_is_reused(self):
+        # far more data than the buffer holds, in odd sized chunks
+        body = 'y' * 1000
+        msgs = [_msg(ofproto_v1_0.OFPT_ECHO_REQUEST, xid, body)
+                for xid in range(1, 1001)]
+        frames = self._frames(''.join(msgs), 3000,
+                              ofproto_v1_0.OFP_MSG_SIZE_MAX * 2)
+        self.assertEqual([frame[3] for frame in frames], range(1, 1001))
+
+    def test_max_size_message(self):
+        body = 'z' * (ofproto_v1_0.OFP_MSG_SIZE_MAX -
+                      ofproto_v1_0.OFP_HEADER_SIZE)
+        msgs = [_msg(ofproto_v1_0.OFPT_ECHO_REQUEST, xid, body)
+                for xid in (1, 2, 3)]
+        frames = self._frames(_msg(ofproto_v1_0.OFPT_HELLO, 9) +
+                              ''.join(msgs), 10000)
+        self.assertEqual([len(frame[4]) for frame in frames],
+                         [8] + [ofproto_v1_0.OFP_MSG_SIZE_MAX] * 3)
+
+    def test_parsed_msgs_outlive_buffer(self):
+        # the parser copies what it keeps out of the reused buffer
+        data = fake_switch.ethernet('\x00' * 5 + '\x02', '\x00' * 5 + '\x01')
+        packet_ins = [fake_switch.packet_in(port, data + chr(port) * 900)
+                      for port in range(1, 201)]
+        for lazy in (False, True):
+            ofproto_v1_0_parser.set_lazy_decode(lazy)
+            try:
+                recv_buf = controller._RecvBuffer()
+                sock = _ChunkSocket(''.join(packet_ins), 1500)
+                msgs = []
+                while recv_buf.recv(sock):
+                    msgs.extend(
+                        ofproto_parser.msg(None, version, msg_type, msg_len,
+                                           xid, buf)
+                        for (version, msg_type, msg_len, xid,
+                             buf) in recv_buf.frames())
+            finally:
+                ofproto_v1_0_parser.set_lazy_decode(False)
+            self.assertEqual([(msg.in_port, msg.data) for msg in msgs],
+                             [(port, data + chr(port) * 900)
+                              for port in range(1, 201)])
+            if lazy:
+                self.assertEqual(str(msgs[0].buf), packet_ins[0])
+            else:
+                self.assertEqual(msgs[0].buf, None)
+
+    def test_malformed(self):
+        data = struct.pack(ofproto_v1_0.OFP_HEADER_PACK_STR,
+                           ofproto_v1_0.OFP_VERSION,
+                           ofproto_v1_0.OFPT_HELLO, 4, 1)
+        recv_buf = controller._RecvBuffer()
+        recv_buf.recv(_ChunkSocket(data, 100))
+        self.assertRaises(exception.OFPMalformedMessage, list,
+                          recv_buf.frames())
+
+
+def _wait(cond, timeout=10):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        gevent.sleep(0.01)
+    return cond()
+
+
+class TestBackpressure(tests.FlagsTestCase):
+    def setUp(self):
+        super(TestBackpressure, self).setUp()
+        self.set_flags(ofp_recv_q_high_msgs=64, ofp_recv_q_low_msgs=32,
+                       ofp_recv_throttle_max=0)
+        self.release = gevent_event.Event()
+        self.handled = 0
+        handler.main_dispatcher.register_handler(event.EventOFPPacketIn,
+                                                 self._packet_in_handler)
+        self.switch = fake_switch.FakeSwitch()
+        self.switch.handshake()
+
+    def tearDown(self):
+        self.release.set()
+        handler.main_dispatcher.unregister_handler(event.EventOFPPacketIn,
+                                                   self._packet_in_handler)
+        self.switch.close()
+        super(TestBackpressure, self).tearDown()
+
+    def _packet_in_handler(self, ev):
+        self.release.wait()
+        self.handled += 1
+
+    def test_flood(self):
+        data = fake_switch.ethernet('\x00' * 5 + '\x02', '\x00' * 5 + '\x01')
+        msg = fake_switch.packet_in(1, data)
+        n = 20000
+        sender = gevent.spawn(self.switch.send, msg * n)
+
+        # the application is stuck: the recv loop stops reading and the
+        # switch can't send any more
+        gevent.sleep(0.5)
+        self.assertFalse(sender.ready())
+        recv_q = self.switch.datapath.recv_q.stats()
+        # the queue may exceed its high water mark by one recv() only
+        max_batch = controller._RECV_BUF_SIZE // len(msg)
+        self.assertTrue(recv_q['max_msgs'] <= 64 + max_batch, recv_q)
+        self.assertTrue(self.handled < n)
+
+        self.release.set()
+        self.assertTrue(_wait(lambda: self.handled == n), self.handled)
+        self.assertTrue(sender.ready())
+
+    def test_echo(self):
+        # an echo request behind a backlog is answered while the
+        # application is stuck
+        self.set_flags(ofp_recv_throttle_max=0.05)
+        data = fake_switch.ethernet('\x00' * 5 + '\x02', '\x00' * 5 + '\x01')
+        msg = fake_switch.packet_in(1, data)
+        n = 5000
+        echo = fake_switch.msg(ofproto_v1_0.OFPT_ECHO_REQUEST, 7, 'ping')
+        sent = time.time()
+        gevent.spawn(self.switch.send, msg * n + echo)
+        msgs = self.switch.recv(5, until=ofproto_v1_0.OFPT_ECHO_REPLY)
+        latency = time.time() - sent
+
+        self.assertEqual(msgs[-1][:2], (ofproto_v1_0.OFPT_ECHO_REPLY, 7))
+        self.assertEqual(msgs[-1][2][ofproto_v1_0.OFP_HEADER_SIZE:], 'ping')
+        self.assertEqual(self.handled, 0)
+        self.assertTrue(latency < 2, latency)
+
+        self.release.set()
+        self.assertTrue(_wait(lambda: self.handled == n), self.handled)
+
+
+class _RecordingSocket(object):
+    def __init__(self):
+        self.writes = []
+
+    def sendall(self, buf):
+        self.writes.append(str(buf))
+
+
+class TestSendCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.sock = _RecordingSocket()
+        self.datapath = controller.Datapath(self.sock, ('fake', 0))
+        self.thread = None
+
+    def tearDown(self):
+        if self.thread is not None:
+            self.thread.kill()
+
+    def _start(self):
+        self.thread = gevent.spawn(self.datapath._send_loop)
+
+    def test_single_write(self):
+        bufs = ['%04d' % i for i in range(100)]
+        for buf in bufs:
+            self.datapath.send(buf)
+        self._start()
+        gevent.sleep(0.01)
+        self.assertEqual(self.sock.writes, [''.join(bufs)])
+
+    def test_write_size_limit(self):
+        buf = 'x' * (controller._SEND_COALESCE_MAX // 2 + 1)
+        for _i in range(3):
+            self.datapath.send(buf)
+        self._start()
+        gevent.sleep(0.01)
+        self.assertEqual(len(self.sock.writes), 2)
+        self.assertEqual(''.join(self.sock.writes), buf * 3)
+
+    def test_flush_delay(self):
+        self.datapath.send_flush_delay = 0.05
+        self._start()
+        self.datapath.send('a')
+        gevent.sleep(0.01)
+        self.datapath.send('b')
+        gevent.sleep(0.01)
+        self.assertEqual(self.sock.writes, [])
+        gevent.sleep(0.05)
+        self.assertEqual(self.sock.writes, ['ab'])
+
+    def test_flush(self):
+        self.datapath.send_flush_delay = 10
+        self._start()
+        self.datapath.send('a')
+        self.datapath.send('b', flush=True)
+        gevent.sleep(0.01)
+        self.assertEqual(self.sock.writes, ['ab'])
+
+    def test_barrier_flushes(self):
+        self.datapath.send_flush_delay = 10
+        self._start()
+        self.datapath.send_barrier()
+        gevent.sleep(0.01)
+        self.assertEqual(len(self.sock.writes), 1)
+        (_version, msg_type, _len, _xid) = struct.unpack_from(
+            ofproto_v1_0.OFP_HEADER_PACK_STR, self.sock.writes[0])
+        self.assertEqual(msg_type, ofproto_v1_0.OFPT_BARRIER_REQUEST)
+
+
+class TestPendingReply(tests.FlagsTestCase):
+    def setUp(self):
+        super(TestPendingReply, self).setUp()
+        self.switch = fake_switch.FakeSwitch()
+        self.switch.handshake()
+        self.datapath = self.switch.datapath
+
+    def tearDown(self):
+        self.switch.close()
+        super(TestPendingReply, self).tearDown()
+
+    def _recv_barrier(self):
+        msgs = self.switch.recv(1, until=ofproto_v1_0.OFPT_BARRIER_REQUEST)
+        self.assertEqual(msgs[-1][0], ofproto_v1_0.OFPT_BARRIER_REQUEST)
+        return msgs[-1][1]
+
+    def test_reply(self):
+        result = self.datapath.send_barrier(want_reply=True)
+        xid = self._recv_barrier()
+        self.assertEqual(xid, result.xid)
+        self.switch.send(fake_switch.msg(ofproto_v1_0.OFPT_BARRIER_REPLY,
+                                         xid))
+        reply = result.get(timeout=1)
+        self.assertEqual(reply.msg_type, ofproto_v1_0.OFPT_BARRIER_REPLY)
+        self.assertEqual(reply.xid, xid)
+        self.assertTrue(result.latency >= 0)
+        self.assertEqual(self.datapath.pending, {})
+
+    def test_error(self):
+        result = self.datapath.send_barrier(want_reply=True)
+        xid = self._recv_barrier()
+        self.switch.send(fake_switch.error(xid))
+        self.assertEqual(result.get(timeout=1).msg_type,
+                         ofproto_v1_0.OFPT_ERROR)
+
+    def _send_batch(self):
+        batch = self.datapath.batch()
+        for port in self.switch.ports:
+            batch.packet_out(in_port=port, actions=[], data='x' * 60)
+        result = batch.send(timeout=1)
+        msgs = self.switch.recv(1, until=ofproto_v1_0.OFPT_BARRIER_REQUEST)
+        self.assertEqual([msg[0] for msg in msgs],
+                         [ofproto_v1_0.OFPT_PACKET_OUT] * 2 +
+                         [ofproto_v1_0.OFPT_BARRIER_REQUEST])
+        return (result, [msg[1] for msg in msgs])
+
+    def test_batch(self):
+        (result, xids) = self._send_batch()
+        self.switch.send(fake_switch.error(xids[1]) +
+                         fake_switch.msg(ofproto_v1_0.OFPT_BARRIER_REPLY,
+                                         xids[2]))
+        errors = result.get()
+        self.assertEqual([error.xid for error in errors], [xids[1]])
+        self.assertEqual(self.datapath.pending_entries, {})
+
+    def test_batch_barrier_error(self):
+        (result, xids) = self._send_batch()
+        self.switch.send(fake_switch.error(xids[2]))
+        errors = result.get()
+        self.assertEqual([error.xid for error in errors], [result.xid])
+        self.assertEqual(errors[0].msg_type, ofproto_v1_0.OFPT_ERROR)
+
+    def test_default_timeout(self):
+        self.set_flags(ofp_reply_timeout=0.1)
+        result = self.datapath.send_barrier(want_reply=True)
+        self.assertRaises(exception.OFPReplyTimeout, result.get)
+        self.assertEqual(self.datapath.pending, {})
+
+    def test_disconnect(self):
+        result = self.datapath.send_barrier(want_reply=True)
+        self._recv_barrier()
+        self.switch.sock.close()
+        self.assertRaises(exception.OFPDatapathDisconnected, result.get,
+                          timeout=1)
+
+    def test_wait_in_handler(self):
+        # A handler waits for a reply queued behind packet-ins which
+        # can't be read while the event loop is stuck in the handler.
+        self.set_flags(ofp_reply_timeout=0.2)
+        self.datapath.recv_q.high_msgs = 4
+        self.datapath.recv_q.low_msgs = 2
+        results = []
+
+        def packet_in_handler(ev):
+            if not results:
+                try:
+                    results.append(ev.msg.datapath.send_barrier(
+                            want_reply=True).get())
+                except exception.OFPReplyTimeout, e:
+                    results.append(e)
+            else:
+                results.append(ev.msg)
+        handler.main_dispatcher.register_handler(event.EventOFPPacketIn,
+                                                 packet_in_handler)
+        try:
+            data = fake_switch.ethernet('\x00' * 5 + '\x02',
+                                        '\x00' * 5 + '\x01')
+            msg = fake_switch.packet_in(1, data)
+            n = 5000
+            sender = gevent.spawn(self.switch.send, msg * n)
+            xid = self._recv_barrier()
+            # the reply can only follow the flood on the wire
+            sender.join(10)
+            self.assertTrue(sender.ready())
+            self.switch.send(fake_switch.msg(
+                    ofproto_v1_0.OFPT_BARRIER_REPLY, xid))
+            self.assertTrue(_wait(lambda: len(results) == n), len(results))
+            self.assertTrue(isinstance(results[0],
+                                       exception.OFPReplyTimeout))
+        finally:
+            handler.main_dispatcher.unregister_handler(
+                event.EventOFPPacketIn, packet_in_handler)
+
+
+class TestAdmission(tests.FlagsTestCase):
+    def setUp(self):
+        super(TestAdmission, self).setUp()
+        self.set_flags(ofp_packet_in_port_rate=1,
+                       ofp_packet_in_port_burst=1)
+        self.switch = fake_switch.FakeSwitch(ports=(1, 2, 3))
+        self.switch.handshake()
+
+    def tearDown(self):
+        self.switch.close()
+        super(TestAdmission, self).tearDown()
+
+    def test_port_state_pruned(self):
+        admission = self.switch.datapath.admission
+        data = fake_switch.ethernet('\x00' * 5 + '\x02', '\x00' * 5 + '\x01')
+        self.switch.send(fake_switch.packet_in(3, data) * 3 +
+                         fake_switch.packet_in(2, data) +
+                         fake_switch.port_status(ofproto_v1_0.OFPPR_DELETE,
+                                                 3))
+        self.assertTrue(_wait(lambda: 2 in admission.ports))
+        self.assertTrue(_wait(lambda: 3 not in admission.ports))
+        self.assertEqual(list(admission.backlog), [])
+        self.assertEqual(admission.stats()['dropped'], 2)
+
+        self.switch.close()
+        self.assertTrue(_wait(lambda: not admission.ports))
+
+
+class TestDPSet(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        dpset.dpset_dispatcher.register_handler(dpset.EventDP,
+                                                self._dp_handler)
+
+    def tearDown(self):
+        dpset.dpset_dispatcher.unregister_handler(dpset.EventDP,
+                                                  self._dp_handler)
+
+    def _dp_handler(self, ev):
+        self.events.append((ev.dp.id, ev.enter))
+
+    def test_enter_leave(self):
+        switch = fake_switch.FakeSwitch(dpid=7)
+        switch.handshake()
+        self.assertEqual(dpset.dpset.get(7), switch.datapath)
+        switch.close()
+        self.assertTrue(_wait(lambda: len(self.events) == 2))
+        self.assertEqual(self.events, [(7, True), (7, False)])
+        self.assertEqual(dpset.dpset.get(7), None)
@@ -0,0 +1,124 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from ryu.controller import dispatcher
+
+
+class _Base(object):
+    pass
+
+
+class _Event(_Base):
+    pass
+
+
+class TestEventDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = dispatcher.EventDispatcher('test')
+        self.calls = []
+
+    def _handler(self, name, ret=None):
+        def handler(ev):
+            self.calls.append(name)
+            return ret
+        return handler
+
+    def test_handler_tuples(self):
+        h1 = self._handler(1)
+        h2 = self._handler(2)
+        self.dispatcher.register_handler(_Event, h1)
+        self.dispatcher.register_handler(_Event, h2)
+        self.assertEqual(self.dispatcher.events[_Event], (h1, h2))
+        self.dispatcher.unregister_handler(_Event, h1)
+        self.assertEqual(self.dispatcher.events[_Event], (h2, ))
+        self.dispatcher.unregister_handler(_Event, h2)
+        self.assertFalse(_Event in self.dispatcher.events)
+
+    def test_mro(self):
+        self.dispatcher.register_handler(_Base, self._handler('base'))
+        self.dispatcher.register_handler(_Event, self._handler('event'))
+        self.dispatcher(_Event())
+        self.dispatcher(_Base())
+        self.assertEqual(self.calls, ['event', 'base', 'base'])
+
+    def test_stop(self):
+        self.dispatcher.register_handler(_Event, self._handler(1, False))
+        self.dispatcher.register_handler(_Base, self._handler(2))
+        self.dispatcher(_Event())
+        self.assertEqual(self.calls, [1])
+
+    def test_cache_invalidation(self):
+        h1 = self._handler(1)
+        self.dispatcher(_Event())
+        self.assertFalse(self.dispatcher.has_handlers(_Event))
+        self.dispatcher.register_handler(_Base, h1)
+        self.assertTrue(self.dispatcher.has_handlers(_Event))
+        self.dispatcher(_Event())
+        self.dispatcher.unregister_handler(_Base, h1)
+        self.assertFalse(self.dispatcher.has_handlers(_Event))
+        self.dispatcher(_Event())
+        self.assertEqual(self.calls, [1])
+
+    def test_unregister_while_dispatching(self):
+        h2 = self._handler(2)
+
+        def h1(ev):
+            if not self.calls:
+                self.dispatcher.unregister_handler(_Event, h2)
+            self.calls.append(1)
+        self.dispatcher.register_handler(_Event, h1)
+        self.dispatcher.register_handler(_Event, h2)
+        self.dispatcher(_Event())
+        self.dispatcher(_Event())
+        # the running dispatch keeps the handlers it started with
+        self.assertEqual(self.calls, [1, 2, 1])
+
+    def test_batch(self):
+        def batch_handler(evs):
+            self.calls.append(len(evs))
+        batch_handler.ev_batch = True
+        self.dispatcher.register_handler(_Base, batch_handler)
+        self.assertEqual(self.dispatcher.batch_events[_Base],
+                         (batch_handler, ))
+        self.dispatcher.dispatch_batch([_Event(), _Event()])
+        self.assertEqual(self.calls, [2])
+
+        self.dispatcher.register_handler(_Event, self._handler('event'))
+        self.dispatcher.dispatch_batch([_Event(), _Event()])
+        self.assertEqual(self.calls, [2, 'event', 'event', 2])
+
+        self.dispatcher.unregister_handler(_Base, batch_handler)
+        self.assertEqual(self.dispatcher.batch_events, {})
+
+    def test_batch_single_events(self):
+        # a batch handler gets the events dispatched one by one too
+        ev_q = dispatcher.EventQueue(self.dispatcher)
+        queued = [_Event() for _i in range(4)]
+
+        def batch_handler(evs):
+            self.calls.append(evs)
+            if evs[0] is queued[1]:
+                # queued while dispatching
+                ev_q.queue(queued[2])
+        batch_handler.ev_batch = True
+        self.dispatcher.register_handler(_Event, batch_handler)
+        self.assertTrue(self.dispatcher.has_handlers(_Event))
+
+        self.dispatcher(queued[0])
+        ev_q.queue(queued[1])
+        ev_q.queue_batch(queued[2:])
+        self.assertEqual(self.calls, [[queued[0]], [queued[1]], [queued[2]],
+                                      queued[2:]])
@@ -0,0 +1,76 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import unittest
+
+from ryu.lib import mac
+
+_ADDR = '\x00\x11\x22\x33\x44\x55'
+_STR = '00:11:22:33:44:55'
+
+
+class TestMac(unittest.TestCase):
+    def test_conversions(self):
+        m = mac.Mac.from_bin(_ADDR)
+        self.assertEqual(m, 0x001122334455)
+        self.assertEqual(m.bin, _ADDR)
+        self.assertEqual(m.to_str(), _STR)
+        self.assertEqual(str(m), _STR)
+        self.assertEqual('%s' % m, _STR)
+        self.assertEqual(mac.Mac.from_str(_STR), m)
+        self.assertEqual(repr(m), "Mac('%s')" % _STR)
+        # a Mac is a dict key equal to its integer value
+        self.assertEqual({m: 1}[0x001122334455], 1)
+
+    def test_json(self):
+        m = mac.Mac.from_bin(_ADDR)
+        self.assertEqual(json.loads(json.dumps({'mac': int(m)})),
+                         {'mac': 0x001122334455})
+        self.assertEqual(json.loads(json.dumps([m.to_str()])), [_STR])
+
+    def test_lazy_log_argument(self):
+        # a Mac log argument is formatted only if the record is emitted
+        m = mac.Mac(0x0a0b0c0d0e0f)
+        logger = logging.getLogger('ryu.tests.test_mac')
+        logger.setLevel(logging.INFO)
+        logger.debug('mac %s', m)
+        self.assertFalse(m in mac.Mac._strs)
+
+        records = []
+        handler = logging.Handler()
+        handler.emit = lambda record: records.append(record.getMessage())
+        logger.addHandler(handler)
+        try:
+            logger.info('mac %s', m)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(records, ['mac 0a:0b:0c:0d:0e:0f'])
+
+    def test_multicast(self):
+        self.assertFalse(mac.Mac.from_bin(_ADDR).is_multicast())
+        self.assertTrue(mac.Mac.from_str('01:00:5e:00:00:01').is_multicast())
+        self.assertFalse(mac.Mac.from_str('01:00:5e:00:00:01').is_broadcast())
+        self.assertTrue(mac.BROADCAST.is_multicast())
+        self.assertTrue(mac.BROADCAST.is_broadcast())
+
+    def test_batch(self):
+        addrs = [_ADDR, '\xff' * 6]
+        macs = mac.bins_to_macs(addrs)
+        self.assertEqual(macs, [mac.Mac.from_bin(_ADDR), mac.BROADCAST])
+        self.assertEqual(mac.macs_to_strs(macs),
+                         [_STR, 'ff:ff:ff:ff:ff:ff'])
+        self.assertEqual(mac.haddr_to_str(_ADDR), _STR)
+        self.assertEqual(mac.haddr_to_bin(_STR), _ADDR)
@@ -0,0 +1,193 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from ryu.controller import mac_to_port
+from ryu.lib.mac import Mac
+
+_DPID = 1
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class _MacToPortTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.saved_time = mac_to_port.time
+        mac_to_port.time = self.clock
+
+    def tearDown(self):
+        mac_to_port.time = self.saved_time
+
+    def _table(self, aging_time=0, max_entries=0):
+        return mac_to_port.MacToPortTable(aging_time, max_entries)
+
+
+class TestMacToPortTable(_MacToPortTestCase):
+    def test_learn(self):
+        table = self._table()
+        self.assertEqual(table.port_add(_DPID, 1, Mac(1)), None)
+        self.assertEqual(table.port_add(_DPID, 1, Mac(1)), 1)
+        self.assertEqual(table.port_get(_DPID, Mac(1)), 1)
+        self.assertEqual(table.port_get(_DPID, Mac(2)), None)
+        self.assertEqual(table.index.get(Mac(1)), {_DPID: 1})
+
+    def test_aging(self):
+        table = self._table(aging_time=10)
+        table.port_add(_DPID, 1, Mac(1))
+        self.clock.now += 5
+        table.port_add(_DPID, 2, Mac(2))
+
+        self.clock.now += 5
+        # expired, though not aged out until the next port_add
+        self.assertEqual(table.port_get(_DPID, Mac(1)), None)
+        self.assertEqual(table.port_get(_DPID, Mac(2)), 2)
+        self.assertEqual(table.stats()['entries'], 2)
+
+        table.port_add(_DPID, 3, Mac(3))
+        self.assertEqual(list(table.mac_to_port[_DPID]), [Mac(2), Mac(3)])
+        self.assertEqual(table.index.get(Mac(1)), {})
+        self.assertEqual(table.stats()['aged'], 1)
+
+        # Mac(3) is aged out too, then learned again
+        self.clock.now += 20
+        table.port_add(_DPID, 3, Mac(3))
+        self.assertEqual(list(table.mac_to_port[_DPID]), [Mac(3)])
+        stats = table.stats()
+        self.assertEqual((stats['aged'], stats['learned']), (3, 4))
+
+    def test_refresh(self):
+        # an address seen again isn't aged out
+        table = self._table(aging_time=10)
+        table.port_add(_DPID, 1, Mac(1))
+        table.port_add(_DPID, 2, Mac(2))
+        self.clock.now += 8
+        table.port_add(_DPID, 1, Mac(1))
+        self.clock.now += 4
+        table.port_add(_DPID, 3, Mac(3))
+        self.assertEqual(list(table.mac_to_port[_DPID]), [Mac(1), Mac(3)])
+        self.assertEqual(table.port_get(_DPID, Mac(1)), 1)
+
+    def test_lru_eviction(self):
+        table = self._table(max_entries=3)
+        for i in range(1, 4):
+            table.port_add(_DPID, i, Mac(i))
+            self.clock.now += 2
+        # Mac(1) becomes the most recently seen
+        table.port_add(_DPID, 1, Mac(1))
+        table.port_add(_DPID, 4, Mac(4))
+
+        self.assertEqual(list(table.mac_to_port[_DPID]),
+                         [Mac(3), Mac(1), Mac(4)])
+        self.assertEqual(table.port_get(_DPID, Mac(2)), None)
+        self.assertEqual(table.index.get(Mac(2)), {})
+        stats = table.stats()
+        self.assertEqual((stats['entries'], stats['learned'],
+                          stats['evicted']), (3, 4, 1))
+
+    def test_limit_per_datapath(self):
+        table = self._table(max_entries=1)
+        table.port_add(1, 1, Mac(1))
+        table.port_add(2, 1, Mac(2))
+        self.assertEqual(table.stats()['entries'], 2)
+        self.assertEqual(table.stats()['evicted'], 0)
+
+    def test_index_per_table(self):
+        table = self._table()
+        other = self._table()
+        table.port_add(_DPID, 1, Mac(1))
+        self.assertEqual(other.index.get(Mac(1)), {})
+
+    def test_dpid_del(self):
+        table = self._table()
+        table.port_add(1, 1, Mac(1))
+        table.port_add(2, 1, Mac(1))
+        table.dpid_del(1)
+        self.assertEqual(table.index.get(Mac(1)), {2: 1})
+        self.assertEqual(table.stats()['datapaths'], 1)
+
+
+class TestHostMoved(_MacToPortTestCase):
+    def setUp(self):
+        super(TestHostMoved, self).setUp()
+        self.moves = []
+
+    def _moved_handler(self, ev):
+        self.moves.append((ev.mac, ev.dpid, ev.port, ev.stale))
+
+    def test_moved(self):
+        mac_to_port.mac_dispatcher.register_handler(
+            mac_to_port.EventHostMoved, self._moved_handler)
+        try:
+            table = self._table()
+            table.port_add(1, 1, Mac(1))
+            table.port_add(2, 3, Mac(1))
+            table.port_add(1, 2, Mac(1))
+        finally:
+            mac_to_port.mac_dispatcher.unregister_handler(
+                mac_to_port.EventHostMoved, self._moved_handler)
+
+        self.assertEqual(self.moves, [(Mac(1), 1, 2, {1: 1, 2: 3})])
+        # forgotten by the other datapath
+        self.assertEqual(table.port_get(2, Mac(1)), None)
+        self.assertEqual(table.index.get(Mac(1)), {1: 2})
+
+    def test_moved_across_datapaths(self):
+        # port 9 of each datapath links it to the other one
+        def is_edge_port(dpid, port):
+            return port != 9
+
+        mac_to_port.mac_dispatcher.register_handler(
+            mac_to_port.EventHostMoved, self._moved_handler)
+        try:
+            table = mac_to_port.MacToPortTable(0, 0,
+                                               is_edge_port=is_edge_port)
+            table.port_add(1, 1, Mac(1))
+            # seen over the link: not a move
+            table.port_add(2, 9, Mac(1))
+            self.assertEqual(table.index.get(Mac(1)), {1: 1, 2: 9})
+            # the host migrated to port 3 of datapath 3
+            self.assertEqual(table.port_add(3, 3, Mac(1)), None)
+        finally:
+            mac_to_port.mac_dispatcher.unregister_handler(
+                mac_to_port.EventHostMoved, self._moved_handler)
+
+        self.assertEqual(self.moves, [(Mac(1), 3, 3, {1: 1, 2: 9})])
+        self.assertEqual(table.port_get(1, Mac(1)), None)
+        self.assertEqual(table.port_get(2, Mac(1)), None)
+        self.assertEqual(table.port_get(3, Mac(1)), 3)
+        self.assertEqual(table.index.get(Mac(1)), {3: 3})
+        self.assertEqual(table.stats()['moved'], 1)
+
+    def test_unhandled(self):
+        # without a handler, a move isn't dispatched at all
+        self.assertFalse(mac_to_port.mac_dispatcher.has_handlers(
+            mac_to_port.EventHostMoved))
+        saved_dispatch = mac_to_port.mac_dispatcher.dispatch
+        mac_to_port.mac_dispatcher.dispatch = self._moved_handler
+        try:
+            table = self._table()
+            table.port_add(1, 1, Mac(1))
+            table.port_add(1, 2, Mac(1))
+        finally:
+            mac_to_port.mac_dispatcher.dispatch = saved_dispatch
+        self.assertEqual(self.moves, [])
+        self.assertEqual(table.stats()['moved'], 1)
@@ -0,0 +1,173 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+from ryu.app.rest_nw_id import NW_ID_EXTERNAL, NW_ID_UNKNOWN
+from ryu.controller import network
+from ryu.ofproto import ofproto_v1_0
+
+_DPID = 1
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_0
+
+
+class _SwitchFeatures(object):
+    def __init__(self, dpid, ports):
+        self.datapath = _Datapath()
+        self.datapath_id = dpid
+        self.ports = ports
+
+
+def _scan(nw, dpid, in_port, nw_id, allow_nw_id_external=None):
+    """filter_ports() by walking every port of the datapath"""
+    return sorted(port for (port, port_nw_id)
+                  in nw.dpids.get(dpid, {}).items()
+                  if port != in_port and
+                  (port_nw_id == nw_id or
+                   (allow_nw_id_external is not None and
+                    port_nw_id == allow_nw_id_external)))
+
+
+class TestNetwork(unittest.TestCase):
+    def setUp(self):
+        self.nw = network.network()
+        for nw_id in ('a', 'b', NW_ID_EXTERNAL):
+            self.nw.create_network(nw_id)
+
+    def _filter(self, in_port, nw_id, allow_nw_id_external=None):
+        return sorted(self.nw.filter_ports(_DPID, in_port, nw_id,
+                                           allow_nw_id_external))
+
+    def test_filter_ports(self):
+        self.nw.create_port('a', _DPID, 1)
+        self.nw.create_port('a', _DPID, 2)
+        self.nw.create_port('b', _DPID, 3)
+        self.nw.create_port(NW_ID_EXTERNAL, _DPID, 4)
+        self.assertEqual(self._filter(1, 'a'), [2])
+        self.assertEqual(self._filter(1, 'a', NW_ID_EXTERNAL), [2, 4])
+        self.assertEqual(self._filter(4, NW_ID_EXTERNAL, NW_ID_EXTERNAL),
+                         [])
+        self.assertEqual(self._filter(3, 'b'), [])
+        self.assertEqual(self.nw.filter_ports(2, 1, 'a'), [])
+
+    def test_update_remove(self):
+        self.nw.create_port('a', _DPID, 1)
+        self.nw.create_port('a', _DPID, 2)
+        self.nw.update_port('b', _DPID, 2)
+        self.assertEqual(self._filter(0, 'a'), [1])
+        self.assertEqual(self._filter(0, 'b'), [2])
+
+        self.nw.remove_port('b', _DPID, 2)
+        self.assertEqual(self._filter(0, 'b'), [])
+        self.assertFalse((_DPID, 'b') in self.nw.dp_nw_ports)
+
+    def test_add_datapath(self):
+        self.nw.create_port('a', _DPID, 1)
+        self.nw.add_datapath(_SwitchFeatures(
+            _DPID, [0, 1, 2, 3, ofproto_v1_0.OFPP_LOCAL]))
+        # the port already in a network keeps it
+        self.assertEqual(self.nw.get_network(_DPID, 1), 'a')
+        self.assertEqual(sorted(self.nw.dp_nw_ports[(_DPID, NW_ID_UNKNOWN)]),
+                         [2, 3])
+
+        self.nw.create_port('b', _DPID, 2)
+        self.assertEqual(sorted(self.nw.dp_nw_ports[(_DPID, NW_ID_UNKNOWN)]),
+                         [3])
+        self.assertEqual(self._filter(0, 'b'), [2])
+
+    def test_same_as_scan(self):
+        rand = random.Random(0)
+        nw_ids = ('a', 'b', NW_ID_EXTERNAL)
+        self.nw.add_datapath(_SwitchFeatures(_DPID, range(1, 65)))
+        for _i in range(500):
+            port = rand.randint(1, 64)
+            nw_id = rand.choice(nw_ids)
+            if rand.random() < 0.2:
+                # a removed port is forgotten until it's added again
+                old_nw_id = self.nw.dpids[_DPID].get(port)
+                if old_nw_id not in (None, NW_ID_UNKNOWN):
+                    self.nw.remove_port(old_nw_id, _DPID, port)
+            else:
+                self.nw.update_port(nw_id, _DPID, port)
+
+            in_port = rand.randint(1, 64)
+            for allow in (None, NW_ID_EXTERNAL):
+                self.assertEqual(self._filter(in_port, nw_id, allow),
+                                 _scan(self.nw, _DPID, in_port, nw_id,
+                                       allow))
+
+
+class TestNetworkEvents(unittest.TestCase):
+    def setUp(self):
+        self.nw = network.network()
+        self.events = []
+
+    def _handler(self, ev):
+        self.events.append(ev)
+
+    def test_events(self):
+        for ev_cls in (network.EventPortBase, network.EventNetworkRemoved):
+            network.network_dispatcher.register_handler(ev_cls,
+                                                        self._handler)
+            self.addCleanup(network.network_dispatcher.unregister_handler,
+                            ev_cls, self._handler)
+
+        self.nw.create_network('a')
+        self.nw.create_network('b')
+        self.nw.create_port('a', _DPID, 1)
+        self.nw.update_port('b', _DPID, 1)
+        # no change
+        self.nw.update_port('b', _DPID, 1)
+        self.nw.remove_port('b', _DPID, 1)
+        self.nw.remove_network('a')
+
+        self.assertEqual([ev.__class__ for ev in self.events],
+                         [network.EventPortAdded, network.EventPortMoved,
+                          network.EventPortRemoved,
+                          network.EventNetworkRemoved])
+        (added, moved, removed, nw_removed) = self.events
+        self.assertEqual((added.dpid, added.port, added.network_id),
+                         (_DPID, 1, 'a'))
+        self.assertEqual((moved.network_id, moved.old_network_id),
+                         ('b', 'a'))
+        self.assertEqual(removed.network_id, 'b')
+        self.assertEqual(nw_removed.network_id, 'a')
+
+        # the generations increase and are those of the events
+        generations = [ev.generation for ev in self.events]
+        self.assertEqual(generations, sorted(set(generations)))
+        self.assertEqual(self.nw.datapath_generation(_DPID),
+                         removed.generation)
+        self.assertEqual(self.nw.network_generation('b'),
+                         removed.generation)
+        self.assertEqual(self.nw.network_generation('a'),
+                         nw_removed.generation)
+        self.assertEqual(self.nw.datapath_generation(2), 0)
+
+    def test_unhandled(self):
+        # nothing is dispatched without a handler
+        saved_dispatch = network.network_dispatcher.dispatch
+        network.network_dispatcher.dispatch = self._handler
+        try:
+            self.nw.create_network('a')
+            self.nw.create_port('a', _DPID, 1)
+            self.nw.remove_network('a')
+        finally:
+            network.network_dispatcher.dispatch = saved_dispatch
+        self.assertEqual(self.events, [])
+        self.assertTrue(self.nw.datapath_generation(_DPID) > 0)
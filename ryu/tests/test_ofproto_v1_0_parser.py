@@ -0,0 +1,168 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+import unittest
+
+from ryu.ofproto import ofproto_parser
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+from ryu.tests import fake_switch
+
+
+def _phy_port(port_no):
+    return struct.pack(ofproto_v1_0.OFP_PHY_PORT_PACK_STR, port_no,
+                       '\x00' * 5 + chr(port_no), 'eth%d' % port_no,
+                       1, 2, 3, 4, 5, 6)
+
+
+def _match():
+    return struct.pack(ofproto_v1_0.OFP_MATCH_PACK_STR,
+                       0, 1, '\x00' * 5 + '\x01', '\x00' * 5 + '\x02',
+                       0xffff, 0, 0x0800, 0, 6, 0x0a000001, 0x0a000002,
+                       80, 8080)
+
+
+# (encoded message, attributes decoded from its body)
+_MSGS = [
+    (fake_switch.msg(ofproto_v1_0.OFPT_FEATURES_REPLY, 1,
+                     struct.pack(ofproto_v1_0.OFP_SWITCH_FEATURES_PACK_STR,
+                                 0x1234, 256, 1, 0xff, 0xfff) +
+                     _phy_port(1) + _phy_port(2)),
+     ('datapath_id', 'n_buffers', 'n_tables', 'capabilities', 'actions',
+      'ports')),
+    (fake_switch.packet_in(3, fake_switch.ethernet('\xff' * 6,
+                                                   '\x00' * 5 + '\x01'),
+                           xid=2, buffer_id=7),
+     ('buffer_id', 'total_len', 'in_port', 'reason', 'data')),
+    (fake_switch.msg(ofproto_v1_0.OFPT_PORT_STATUS, 3,
+                     struct.pack('!B7x', ofproto_v1_0.OFPPR_ADD) +
+                     _phy_port(5)),
+     ('reason', 'desc')),
+    (fake_switch.msg(ofproto_v1_0.OFPT_FLOW_REMOVED, 4,
+                     _match() + struct.pack(
+                ofproto_v1_0.OFP_FLOW_REMOVED_PACK_STR0,
+                1, 2, ofproto_v1_0.OFPRR_DELETE, 3, 4, 5, 6, 7)),
+     ('match', 'cookie', 'priority', 'reason', 'duration_sec',
+      'duration_nsec', 'idle_timeout', 'packet_count', 'byte_count')),
+    (fake_switch.error(5), ('type', 'code', 'data')),
+    (fake_switch.msg(ofproto_v1_0.OFPT_ECHO_REQUEST, 6, 'ping'), ('data', )),
+    ]
+
+
+def _parse(buf):
+    (version, msg_type, msg_len, xid) = ofproto_parser.header(buf)
+    return ofproto_parser.msg(None, version, msg_type, msg_len, xid, buf)
+
+
+def _value(value):
+    if isinstance(value, buffer):
+        return str(value)
+    if isinstance(value, dict):
+        return dict((k, _value(v)) for (k, v) in value.items())
+    if hasattr(value, '__dict__'):
+        return (value.__class__, _value(value.__dict__))
+    return value
+
+
+class TestLazyDecode(unittest.TestCase):
+    def tearDown(self):
+        ofproto_v1_0_parser.set_lazy_decode(False)
+
+    def test_lazy_equals_eager(self):
+        for (buf, attrs) in _MSGS:
+            ofproto_v1_0_parser.set_lazy_decode(False)
+            eager = _parse(buf)
+            ofproto_v1_0_parser.set_lazy_decode(True)
+            lazy = _parse(buf)
+
+            self.assertEqual((lazy.msg_type, lazy.msg_len, lazy.xid),
+                             (eager.msg_type, eager.msg_len, eager.xid))
+            for attr in attrs:
+                # only the header is decoded until a body attribute is read
+                self.assertFalse(attr in lazy.__dict__, (buf, attr))
+            for attr in attrs:
+                self.assertEqual(_value(getattr(lazy, attr)),
+                                 _value(getattr(eager, attr)),
+                                 (lazy.__class__, attr))
+
+    def test_unknown_attribute(self):
+        ofproto_v1_0_parser.set_lazy_decode(True)
+        msg = _parse(_MSGS[1][0])
+        self.assertRaises(AttributeError, getattr, msg, 'no_such_attr')
+        # decoded anyway, and only once
+        self.assertEqual(msg.in_port, 3)
+        self.assertRaises(AttributeError, getattr, msg, 'no_such_attr')
+
+    def test_eager(self):
+        msg = _parse(_MSGS[1][0])
+        self.assertEqual(msg.__dict__['in_port'], 3)
+        self.assertEqual(msg.buffer_id, 7)
+
+
+def _output(*ports):
+    return [ofproto_v1_0_parser.OFPActionOutput(port) for port in ports]
+
+
+def _serialize(msg, xid):
+    msg.xid = xid
+    msg.serialize()
+    return str(msg.buf)
+
+
+class TestMsgTemplate(unittest.TestCase):
+    _MAC1 = '\x00' * 5 + '\x01'
+    _MAC2 = '\x00' * 5 + '\x02'
+
+    def _flow_mod(self, cls_method, match, buffer_id, actions):
+        return cls_method(None, match=match, cookie=0,
+                          command=ofproto_v1_0.OFPFC_ADD, idle_timeout=0,
+                          hard_timeout=0, priority=32768,
+                          buffer_id=buffer_id,
+                          out_port=ofproto_v1_0.OFPP_NONE, flags=0,
+                          actions=actions)
+
+    def test_flow_mod(self):
+        cls = ofproto_v1_0_parser.OFPFlowMod
+        match = ofproto_v1_0_parser.OFPMatch.from_fields(
+            ('in_port', 'dl_src', 'dl_dst'))
+        template = self._flow_mod(cls.template, match, 0xffffffff,
+                                  _output(ofproto_v1_0.OFPP_NONE, 4))
+        patched = template.patch(xid=9, in_port=1, dl_src=self._MAC1,
+                                 dl_dst=self._MAC2, buffer_id=7,
+                                 output_port=3)
+
+        match = match._replace(in_port=1, dl_src=self._MAC1,
+                               dl_dst=self._MAC2)
+        msg = self._flow_mod(cls, match, 7, _output(3, 4))
+        self.assertEqual(str(patched), _serialize(msg, 9))
+        # ofp_flow_mod.out_port isn't patchable
+        self.assertRaises(KeyError, template.patch, out_port=3)
+
+    def test_packet_out(self):
+        cls = ofproto_v1_0_parser.OFPPacketOut
+        template = cls.template(None, buffer_id=0xffffffff,
+                                in_port=ofproto_v1_0.OFPP_NONE,
+                                actions=_output(ofproto_v1_0.OFPP_NONE))
+        patched = template.patch(xid=9, buffer_id=7, in_port=1,
+                                 output_port=3)
+
+        msg = cls(None, buffer_id=7, in_port=1, actions=_output(3))
+        self.assertEqual(str(patched), _serialize(msg, 9))
+
+    def test_no_output_action(self):
+        template = ofproto_v1_0_parser.OFPPacketOut.template(
+            None, buffer_id=0xffffffff, in_port=ofproto_v1_0.OFPP_NONE,
+            actions=[])
+        self.assertFalse('output_port' in template.fields)
@@ -0,0 +1,169 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+import unittest
+
+from ryu.lib.packet import arp
+from ryu.lib.packet import ether
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import icmp
+from ryu.lib.packet import inet
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import ipv6
+from ryu.lib.packet import packet
+from ryu.lib.packet import tcp
+from ryu.lib.packet import udp
+from ryu.lib.packet import vlan
+
+_DST = '\x00\x00\x00\x00\x00\x02'
+_SRC = '\x00\x00\x00\x00\x00\x01'
+
+
+def _ethernet(ethertype, payload):
+    return _DST + _SRC + struct.pack('!H', ethertype) + payload
+
+
+def _ipv4(proto, payload, frag_offset=0, options=''):
+    ihl = 5 + len(options) // 4
+    return struct.pack('!BBHHHBBHII', 0x40 | ihl, 0x10,
+                       ihl * 4 + len(payload), 7, 0x4000 | frag_offset,
+                       64, proto, 0, 0x0a000001, 0x0a000002) + \
+        options + payload
+
+
+def _tcp(payload='', options=''):
+    data_offset = 5 + len(options) // 4
+    return struct.pack('!HHIIBBHHH', 1234, 80, 1, 2, data_offset << 4,
+                       tcp.TCP_SYN | tcp.TCP_ACK, 8192, 0, 0) + \
+        options + payload
+
+
+def _udp(payload):
+    return struct.pack('!HHHH', 53, 5353, 8 + len(payload), 0) + payload
+
+
+def _protocols(data):
+    return [hdr.__class__ for hdr in packet.Packet(data)]
+
+
+class TestPacket(unittest.TestCase):
+    def test_ethernet(self):
+        eth = ethernet.ethernet(_ethernet(ether.ETH_TYPE_IP, ''))
+        self.assertEqual((eth.dst, eth.src, eth.ethertype),
+                         (_DST, _SRC, ether.ETH_TYPE_IP))
+        self.assertEqual(eth.header_length, 14)
+        self.assertEqual(ethernet.ethernet.parser(_DST + _SRC), None)
+
+    def test_tcp(self):
+        data = _ethernet(ether.ETH_TYPE_IP,
+                         _ipv4(inet.IPPROTO_TCP,
+                               _tcp('hello', options='\x01' * 4),
+                               options='\x01' * 4))
+        pkt = packet.Packet(data)
+        self.assertEqual([hdr.__class__ for hdr in pkt],
+                         [ethernet.ethernet, ipv4.ipv4, tcp.tcp])
+
+        ip = pkt.get_protocol(ipv4.ipv4)
+        self.assertEqual((ip.version, ip.header_length, ip.tos, ip.flags,
+                          ip.frag_offset, ip.ttl, ip.proto),
+                         (4, 24, 0x10, 2, 0, 64, inet.IPPROTO_TCP))
+        self.assertEqual((ip.src, ip.dst), (0x0a000001, 0x0a000002))
+
+        hdr = pkt.get_protocol(tcp.tcp)
+        self.assertEqual((hdr.src_port, hdr.dst_port, hdr.seq, hdr.ack),
+                         (1234, 80, 1, 2))
+        self.assertEqual(hdr.bits, tcp.TCP_SYN | tcp.TCP_ACK)
+        self.assertEqual(hdr.header_length, 24)
+        self.assertEqual(hdr.payload.tobytes(), 'hello')
+
+    def test_vlan(self):
+        tag = struct.pack('!HH', (5 << 13) | 100, ether.ETH_TYPE_ARP)
+        body = struct.pack('!HHBBH6sI6sI', 1, ether.ETH_TYPE_IP, 6, 4,
+                           arp.ARP_REQUEST, _SRC, 0x0a000001,
+                           '\x00' * 6, 0x0a000002)
+        pkt = packet.Packet(_ethernet(ether.ETH_TYPE_8021Q, tag + body))
+        self.assertEqual([hdr.__class__ for hdr in pkt],
+                         [ethernet.ethernet, vlan.vlan, arp.arp])
+
+        tag = pkt.get_protocol(vlan.vlan)
+        self.assertEqual((tag.pcp, tag.cfi, tag.vid), (5, 0, 100))
+        hdr = pkt.get_protocol(arp.arp)
+        self.assertEqual((hdr.opcode, hdr.src_mac, hdr.src_ip, hdr.dst_ip),
+                         (arp.ARP_REQUEST, _SRC, 0x0a000001, 0x0a000002))
+
+    def test_padding(self):
+        # the Ethernet padding isn't part of the UDP payload
+        data = _ethernet(ether.ETH_TYPE_IP,
+                         _ipv4(inet.IPPROTO_UDP, _udp('ab'))) + '\x00' * 16
+        hdr = packet.Packet(data).get_protocol(udp.udp)
+        self.assertEqual((hdr.src_port, hdr.dst_port, hdr.total_length),
+                         (53, 5353, 10))
+        self.assertEqual(hdr.payload.tobytes(), 'ab')
+
+    def test_ipv6(self):
+        payload = _udp('xyz')
+        header = struct.pack('!IHBB16s16s', (6 << 28) | (3 << 20) | 5,
+                             len(payload), inet.IPPROTO_UDP, 255,
+                             '\x01' * 16, '\x02' * 16)
+        pkt = packet.Packet(_ethernet(ether.ETH_TYPE_IPV6, header + payload))
+        ip = pkt.get_protocol(ipv6.ipv6)
+        self.assertEqual((ip.version, ip.traffic_class, ip.flow_label,
+                          ip.hop_limit, ip.src),
+                         (6, 3, 5, 255, '\x01' * 16))
+        self.assertEqual(pkt.get_protocol(udp.udp).payload.tobytes(), 'xyz')
+
+    def test_icmp(self):
+        data = _ethernet(ether.ETH_TYPE_IP,
+                         _ipv4(inet.IPPROTO_ICMP,
+                               struct.pack('!BBH', icmp.ICMP_ECHO_REQUEST,
+                                           0, 0) + 'ping'))
+        hdr = packet.Packet(data).get_protocol(icmp.icmp)
+        self.assertEqual((hdr.type, hdr.code), (icmp.ICMP_ECHO_REQUEST, 0))
+        self.assertEqual(hdr.payload.tobytes(), 'ping')
+
+    def test_stop(self):
+        # unknown ethertype
+        self.assertEqual(_protocols(_ethernet(0x88cc, 'lldp')),
+                         [ethernet.ethernet])
+        # truncated TCP header
+        data = _ethernet(ether.ETH_TYPE_IP,
+                         _ipv4(inet.IPPROTO_TCP, _tcp()[:10]))
+        self.assertEqual(_protocols(data), [ethernet.ethernet, ipv4.ipv4])
+        # a fragment other than the first
+        data = _ethernet(ether.ETH_TYPE_IP,
+                         _ipv4(inet.IPPROTO_TCP, _tcp(), frag_offset=10))
+        self.assertEqual(_protocols(data), [ethernet.ethernet, ipv4.ipv4])
+
+    def test_ipv4_ihl(self):
+        ip = _ipv4(inet.IPPROTO_UDP, _udp(''))
+        self.assertEqual(ipv4.ipv4.parser(ip).header_length, 20)
+        # ihl below the minimum header length
+        self.assertEqual(ipv4.ipv4.parser(chr(0x44) + ip[1:]), None)
+        # ihl beyond the end of the buffer
+        self.assertEqual(ipv4.ipv4.parser(chr(0x4f) + ip[1:]), None)
+        self.assertEqual(_protocols(_ethernet(ether.ETH_TYPE_IP,
+                                              chr(0x44) + ip[1:])),
+                         [ethernet.ethernet])
+
+    def test_lazy(self):
+        data = _ethernet(ether.ETH_TYPE_IP, _ipv4(inet.IPPROTO_UDP, _udp('')))
+        pkt = packet.Packet(data)
+        self.assertEqual(pkt.protocols, [])
+        pkt.get_protocol(ipv4.ipv4)
+        self.assertEqual(len(pkt.protocols), 2)
+        self.assertEqual(pkt.get_protocol(tcp.tcp), None)
+        self.assertEqual(len(pkt.protocols), 3)
+        # the payload is a view of the data
+        self.assertTrue(isinstance(pkt.protocols[0].payload, memoryview))
@@ -0,0 +1,168 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import struct
+import unittest
+
+from ryu import tests
+from ryu.controller import event
+from ryu.controller import handler
+from ryu.controller import pending_flow
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+from ryu.tests import fake_switch
+
+_FIELDS = ('in_port', 'dl_src', 'dl_dst')
+_MAC1 = '\x00' * 5 + '\x01'
+_MAC2 = '\x00' * 5 + '\x02'
+_MAC3 = '\x00' * 5 + '\x03'
+
+
+class _PacketIn(object):
+    def __init__(self, in_port, dst, src):
+        self.in_port = in_port
+        self.data = fake_switch.ethernet(dst, src)
+
+
+class TestPendingFlowTable(unittest.TestCase):
+    def setUp(self):
+        self.table = pending_flow.PendingFlowTable(ofproto_v1_0, ttl=10)
+        self.actions = [ofproto_v1_0_parser.OFPActionOutput(2)]
+
+    def _add(self, data, in_port, fields=_FIELDS):
+        match = ofproto_v1_0_parser.OFPMatch.from_packet(data, in_port,
+                                                        fields)
+        self.table.flow_mod(match, ofproto_v1_0.OFPFC_ADD, self.actions)
+
+    def test_hit(self):
+        msg = _PacketIn(1, _MAC2, _MAC1)
+        self.assertEqual(self.table.packet_in(msg), None)
+        self._add(msg.data, 1)
+        self.assertEqual(self.table.packet_in(msg), self.actions)
+        self.assertEqual(self.table.packet_in(_PacketIn(1, _MAC3, _MAC1)),
+                         None)
+        self.assertEqual(self.table.packet_in(_PacketIn(2, _MAC2, _MAC1)),
+                         None)
+        self.assertEqual(self.table.stats(),
+                         {'flows': 1, 'added': 1, 'hits': 1, 'flushes': 0,
+                          'duplicates': 0})
+
+    def test_untracked(self):
+        msg = _PacketIn(1, _MAC2, _MAC1)
+        self._add(msg.data, 1, _FIELDS + ('tp_dst', ))
+        self.assertEqual(len(self.table), 0)
+
+    def test_flush(self):
+        msg = _PacketIn(1, _MAC2, _MAC1)
+        self._add(msg.data, 1)
+        match = ofproto_v1_0_parser.OFPMatch.from_fields(())
+        self.table.flow_mod(match, ofproto_v1_0.OFPFC_DELETE, None)
+        self.assertEqual(self.table.packet_in(msg), None)
+        self.assertEqual(self.table.stats()['flushes'], 1)
+
+    def test_expire(self):
+        self.table.ttl = 0
+        msg = _PacketIn(1, _MAC2, _MAC1)
+        self._add(msg.data, 1)
+        self.assertEqual(self.table.packet_in(msg), None)
+        self.assertEqual(len(self.table), 0)
+
+    def test_flow_mod_template(self):
+        match = ofproto_v1_0_parser.OFPMatch.from_fields(_FIELDS)
+        template = ofproto_v1_0_parser.OFPFlowMod.template(
+            None, match=match, cookie=0, command=ofproto_v1_0.OFPFC_ADD,
+            idle_timeout=0, hard_timeout=0, priority=0,
+            buffer_id=0xffffffff, out_port=ofproto_v1_0.OFPP_NONE,
+            flags=0, actions=[ofproto_v1_0_parser.OFPActionOutput(
+                    ofproto_v1_0.OFPP_NONE)])
+        msg = _PacketIn(1, _MAC2, _MAC1)
+        self.table.flow_mod_template(template,
+                                     {'in_port': 1, 'dl_src': _MAC1,
+                                      'dl_dst': _MAC2, 'output_port': 3})
+        self.assertEqual([a.port for a in self.table.packet_in(msg)], [3])
+        # the template itself is left alone
+        self.assertEqual(template.msg.actions[0].port,
+                         ofproto_v1_0.OFPP_NONE)
+
+    def test_duplicate(self):
+        flows = set()
+        self.assertFalse(self.table.duplicate(_PacketIn(1, _MAC2, _MAC1),
+                                              flows))
+        self.assertFalse(self.table.duplicate(_PacketIn(1, _MAC3, _MAC1),
+                                              flows))
+        self.assertTrue(self.table.duplicate(_PacketIn(1, _MAC2, _MAC1),
+                                             flows))
+        self.assertEqual(self.table.stats()['duplicates'], 1)
+
+
+class TestPendingFlowDatapath(tests.FlagsTestCase):
+    def setUp(self):
+        super(TestPendingFlowDatapath, self).setUp()
+        self.set_flags(ofp_pending_flow_ttl=10)
+        self.handled = []
+        handler.main_dispatcher.register_handler(event.EventOFPPacketIn,
+                                                 self._packet_in_handler)
+        self.switch = fake_switch.FakeSwitch()
+        self.switch.handshake()
+
+    def tearDown(self):
+        handler.main_dispatcher.unregister_handler(event.EventOFPPacketIn,
+                                                   self._packet_in_handler)
+        self.switch.close()
+        super(TestPendingFlowDatapath, self).tearDown()
+
+    def _packet_in_handler(self, ev):
+        msg = ev.msg
+        self.handled.append(msg.data)
+        datapath = msg.datapath
+        match = ofproto_v1_0_parser.OFPMatch.from_packet(msg.data,
+                                                        msg.in_port, _FIELDS)
+        datapath.send_flow_mod(
+            match=match, cookie=0, command=ofproto_v1_0.OFPFC_ADD,
+            idle_timeout=0, hard_timeout=0, priority=0,
+            actions=[ofproto_v1_0_parser.OFPActionOutput(2)])
+
+    def test_duplicates_in_batch(self):
+        flow1 = fake_switch.packet_in(1, fake_switch.ethernet(_MAC2, _MAC1))
+        flow2 = fake_switch.packet_in(1, fake_switch.ethernet(_MAC3, _MAC1))
+        # a single recv holds every packet-in
+        self.switch.send(flow1 * 3 + flow2 + flow1)
+        msgs = self.switch.recv(0.5)
+
+        self.assertEqual(len(self.handled), 2)
+        msg_types = [msg[0] for msg in msgs]
+        self.assertEqual(msg_types.count(ofproto_v1_0.OFPT_FLOW_MOD), 2)
+        self.assertEqual(msg_types.count(ofproto_v1_0.OFPT_PACKET_OUT), 3)
+        stats = self.switch.datapath.pending_flow_stats()
+        self.assertEqual((stats['hits'], stats['duplicates']), (3, 3))
+
+    def test_send_q_full(self):
+        data = fake_switch.packet_in(1, fake_switch.ethernet(_MAC2, _MAC1))
+        self.switch.send(data)
+        self.switch.recv(0.2, until=ofproto_v1_0.OFPT_PACKET_OUT)
+        datapath = self.switch.datapath
+        (_version, msg_type, msg_len, xid) = struct.unpack_from(
+            ofproto_v1_0.OFP_HEADER_PACK_STR, data)
+        msg = ofproto_v1_0_parser.msg_parser(
+            datapath, ofproto_v1_0.OFP_VERSION, msg_type, msg_len, xid, data)
+
+        # the switch stopped reading. The receive loop mustn't block
+        send_q = datapath.send_q
+        send_q.put('', send_q.high_msgs, 0, block=False)
+        self.assertTrue(send_q.full())
+        self.assertEqual(datapath._classify([msg]), ([], [], []))
+        self.assertEqual(len(send_q), 1)
+        stats = datapath.pending_flow_stats()
+        self.assertEqual((stats['hits'], stats['dropped']), (1, 1))
@@ -0,0 +1,90 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from ryu.app import simple_isolation
+from ryu.controller import dpset
+from ryu.controller import network
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+
+_DPID = 1
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_0
+    ofproto_parser = ofproto_v1_0_parser
+
+    def __init__(self, dpid):
+        self.id = dpid
+        self.sent = []
+
+    def send_flow_mod(self, **kwargs):
+        self.sent.append(('flow_mod', kwargs['match'].wildcards,
+                          kwargs['match'].in_port, kwargs['command'],
+                          kwargs['out_port']))
+
+    def send_barrier(self):
+        self.sent.append(('barrier', ))
+
+
+class TestSimpleIsolation(unittest.TestCase):
+    def setUp(self):
+        self.nw = network.network()
+        self.app = simple_isolation.SimpleIsolation(network=self.nw)
+        self.datapath = _Datapath(_DPID)
+        dpset.dpset.dps[_DPID] = self.datapath
+        network.network_dispatcher.register_handler(
+            network.EventPortBase, self.app.port_network_handler)
+        for nw_id in ('a', 'b'):
+            self.nw.create_network(nw_id)
+
+    def tearDown(self):
+        network.network_dispatcher.unregister_handler(
+            network.EventPortBase, self.app.port_network_handler)
+        del dpset.dpset.dps[_DPID]
+
+    def _purged(self, port):
+        # the flows from and to port, then a barrier
+        ofproto = ofproto_v1_0
+        return [('flow_mod', ofproto.OFPFW_ALL & ~ofproto.OFPFW_IN_PORT,
+                 port, ofproto.OFPFC_DELETE, ofproto.OFPP_NONE),
+                ('flow_mod', ofproto.OFPFW_ALL, 0, ofproto.OFPFC_DELETE,
+                 port),
+                ('barrier', )]
+
+    def test_port_left_network(self):
+        self.nw.create_port('a', _DPID, 1)
+        self.assertEqual(self.datapath.sent, [])
+
+        self.nw.update_port('b', _DPID, 1)
+        self.assertEqual(self.datapath.sent, self._purged(1))
+
+        del self.datapath.sent[:]
+        self.nw.remove_port('b', _DPID, 1)
+        self.assertEqual(self.datapath.sent, self._purged(1))
+
+    def test_flood_actions(self):
+        self.nw.create_port('a', _DPID, 1)
+        self.nw.create_port('a', _DPID, 2)
+        actions = self.app._flood_actions(self.datapath, 1, 'a')
+        self.assertEqual([action.port for action in actions], [2])
+        self.assertTrue(self.app._flood_actions(self.datapath, 1, 'a')
+                        is actions)
+
+        # a change of the datapath rebuilds them
+        self.nw.create_port('a', _DPID, 3)
+        actions = self.app._flood_actions(self.datapath, 1, 'a')
+        self.assertEqual(sorted(action.port for action in actions), [2, 3])
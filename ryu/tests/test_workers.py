@@ -0,0 +1,109 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gevent
+import os
+import unittest
+
+from ryu.base import workers
+from ryu.controller import network
+from ryu.exception import NetworkAlreadyExist
+
+
+class _Channel(object):
+    def __init__(self):
+        self.ops = []
+
+    def publish(self, op):
+        self.ops.append(op)
+
+
+class TestMergeStats(unittest.TestCase):
+    def test_merge(self):
+        stats = workers.merge_stats([
+            {'datapaths': 2, 'recv_q_max_msgs': 10, 'app_handled': 1,
+             'app_latency_avg': 4.0, 'app_latency_max': 4.0},
+            {'datapaths': 3, 'recv_q_max_msgs': 7, 'app_handled': 3,
+             'app_latency_avg': 2.0, 'app_latency_max': 3.0},
+            {'datapaths': 0, 'app_handled': 0, 'app_latency_avg': 0}])
+        self.assertEqual(stats, {'datapaths': 5, 'recv_q_max_msgs': 10,
+                                 'app_handled': 4, 'app_latency_avg': 2.5,
+                                 'app_latency_max': 4.0})
+
+    def test_nothing_handled(self):
+        stats = workers.merge_stats([{'handled': 0, 'latency_avg': 0}])
+        self.assertEqual(stats, {'handled': 0, 'latency_avg': 0})
+
+
+class TestReplicator(unittest.TestCase):
+    def test_replicate(self):
+        channel = _Channel()
+        nw = network.network()
+        workers.Replicator(nw, ('create_network', 'create_port'), channel)
+        nw.create_network('a')
+        self.assertRaises(NetworkAlreadyExist, nw.create_network, 'a')
+        nw.create_port('a', 1, 2)
+        # only the successful calls are published
+        self.assertEqual(channel.ops, [['create_network', ('a', )],
+                                       ['create_port', ('a', 1, 2)]])
+
+        other = network.network()
+        replicator = workers.Replicator(other, ('create_network',
+                                                'create_port'), _Channel())
+        for op in channel.ops:
+            replicator.apply(op)
+        # a failing op is logged and skipped
+        replicator.apply(['create_network', ['a']])
+        self.assertEqual(other.list_ports('a'), [(1, 2)])
+        self.assertEqual(replicator.channel.ops, [])
+
+
+class TestSupervisorOps(unittest.TestCase):
+    def setUp(self):
+        self.fds = []
+        self.supervisor = workers.WorkerSupervisor(2, None, 10, 1)
+        self.channels = []
+        for index in range(2):
+            (read_fd, write_fd) = os.pipe()
+            (ctl_read_fd, ctl_write_fd) = os.pipe()
+            self.fds.extend((write_fd, ctl_read_fd))
+            self.supervisor.workers[index] = workers._Worker(
+                index, index, read_fd, ctl_write_fd)
+            self.channels.append(workers._Channel(write_fd, ctl_read_fd))
+
+    def tearDown(self):
+        for worker in self.supervisor.workers.values():
+            self.fds.extend((worker.stats_fd, worker.ctl_fd))
+        for fd in self.fds:
+            os.close(fd)
+
+    def test_publish(self):
+        (worker0, worker1) = (self.supervisor.workers[0],
+                              self.supervisor.workers[1])
+        self.channels[0]({'handled': 1})
+        self.channels[0].publish(['create_network', ['a']])
+        self.supervisor._read_stats(worker0)
+        self.assertEqual(worker0.stats, {'handled': 1})
+        self.assertEqual(worker0.ctl_buf, '')
+
+        self.supervisor._write_ops(worker1)
+        self.assertEqual(worker1.ctl_buf, '')
+        received = []
+        thr = gevent.spawn(self.channels[1].recv_loop, received.append)
+        gevent.sleep(0.01)
+        thr.kill()
+        self.assertEqual(received, [['create_network', ['a']]])
+        # replayed to a restarted worker
+        self.assertEqual(self.supervisor.ops,
+                         ['["op", ["create_network", ["a"]]]\n'])
@@ -0,0 +1,260 @@
+# Copyright (C) 2011 Nippon Telegraph and Telephone Corporation.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import sys
+import unittest
+
+from ryu.app import rest
+from ryu.app import rest_mac
+from ryu.app import rest_stats
+from ryu.app import wsapi
+from ryu.controller import mac_to_port
+from ryu.controller import network
+from ryu.lib.mac import Mac
+
+
+class _WSTestCase(unittest.TestCase):
+    """runs requests against a fresh /v1.0 tree"""
+
+    def setUp(self):
+        self.saved_versions = wsapi.wsapi._versions
+        wsapi.wsapi._versions = {'1.0': wsapi.WSRes('1.0')}
+        self.api = wsapi.wsapi.get_version('1.0')
+
+    def tearDown(self):
+        wsapi.wsapi._versions = self.saved_versions
+
+    def request(self, method, path):
+        """(status code, body) of the response"""
+        status = []
+
+        def start_response(status_line, headers):
+            status.append(int(status_line.split()[0]))
+            self.headers = dict(headers)
+        env = {'REQUEST_METHOD': method, 'PATH_INFO': path}
+        body = ''.join(wsapi.wsapi().application(env, start_response))
+        return (status[0], body)
+
+
+class _Year(wsapi.WSPathRegex):
+    def __init__(self):
+        wsapi.WSPathRegex.__init__(self, r'^(?P<year>\d{4})$')
+
+    def __str__(self):
+        return '{year}'
+
+
+class TestRouter(_WSTestCase):
+    def setUp(self):
+        super(TestRouter, self).setUp()
+        self.calls = []
+
+    def _handler(self, name):
+        def handler(request, data):
+            self.calls.append((name, data))
+            return name
+        return handler
+
+    def _register(self, name, method, path):
+        self.api.register_request(self._handler(name), method, path, name)
+
+    def test_static(self):
+        self._register('a', 'GET', [wsapi.WSPathStaticString('a')])
+        self._register('b', 'GET', [wsapi.WSPathStaticString('B', True)])
+        self.assertEqual(self.request('GET', '/v1.0/a'), (200, 'a'))
+        self.assertEqual(self.request('GET', '/v1.0/b'), (200, 'b'))
+        self.assertEqual(self.headers['Content-Length'], '1')
+        self.assertEqual(self.request('GET', '/v1.0/A')[0], 404)
+        self.assertEqual(self.calls, [('a', {'a': 'a'}), ('b', {'b': 'b'})])
+
+    def test_dynamic_order(self):
+        # a static string is tried first, then the other components in
+        # registration order
+        self._register('year', 'GET', [_Year()])
+        self._register('any', 'GET',
+                       [wsapi.WSPathArbitraryString('{any}')])
+        self._register('static', 'GET', [wsapi.WSPathStaticString('2012')])
+        self.assertEqual(self.request('GET', '/v1.0/2012')[1], 'static')
+        self.assertEqual(self.request('GET', '/v1.0/2013')[1], 'year')
+        self.assertEqual(self.request('GET', '/v1.0/x')[1], 'any')
+        # the regex match object is extracted
+        self.assertEqual(self.calls[1][1]['{year}'].group('year'), '2013')
+        self.assertEqual(self.calls[2][1], {'{any}': u'x'})
+
+    def test_fallback(self):
+        # a subtree without the handler falls back to the next child
+        self._register('static', 'GET', [wsapi.WSPathStaticString('x'),
+                                         wsapi.WSPathStaticString('y')])
+        self._register('any', 'GET',
+                       [wsapi.WSPathArbitraryString('{any}'),
+                        wsapi.WSPathStaticString('z')])
+        self._register('post', 'POST', [wsapi.WSPathStaticString('x'),
+                                        wsapi.WSPathStaticString('z')])
+        self.assertEqual(self.request('GET', '/v1.0/x/y')[1], 'static')
+        self.assertEqual(self.request('GET', '/v1.0/x/z')[1], 'any')
+        self.assertEqual(self.request('POST', '/v1.0/x/z')[1], 'post')
+        self.assertEqual(self.calls[1][1], {'{any}': u'x', 'z': 'z'})
+
+    def test_deep_path(self):
+        # the search doesn't recurse, whatever the depth of the path
+        depth = sys.getrecursionlimit() + 100
+        self._register('deep', 'GET',
+                       [wsapi.WSPathArbitraryString('{any}')] * depth +
+                       [wsapi.WSPathStaticString('z')])
+        path = '/v1.0' + '/x' * depth
+        self.assertEqual(self.request('GET', path + '/z'), (200, 'deep'))
+        self.assertEqual(self.request('GET', path + '/y')[0], 404)
+
+    def test_register_after_request(self):
+        self._register('a', 'GET', [wsapi.WSPathStaticString('a')])
+        self.assertEqual(self.request('GET', '/v1.0/b')[0], 404)
+        self._register('b', 'GET', [wsapi.WSPathStaticString('b')])
+        self.assertEqual(self.request('GET', '/v1.0/b'), (200, 'b'))
+        self.assertRaises(KeyError, self._register, 'b', 'GET',
+                          [wsapi.WSPathStaticString('b')])
+
+    def test_errors(self):
+        self._register('a', 'GET', [wsapi.WSPathStaticString('a')])
+        self._register('year', 'PUT', [_Year()])
+
+        (code, body) = self.request('GET', '/v1.0/c')
+        self.assertEqual(code, 404)
+        error = json.loads(body)['error']
+        self.assertTrue("'c' != 'a'" in error)
+        self.assertTrue('Regexp did not match' in error)
+
+        self.assertEqual(self.request('GET', '/v1.0/a/b')[0], 404)
+        self.assertTrue('beyond all available URIs' in
+                        json.loads(self.request('GET', '/v1.0/a/b')[1])
+                        ['error'])
+
+        self.assertEqual(self.request('POST', '/v1.0/2012')[0], 405)
+        self.assertEqual(self.headers['Allow'], 'PUT')
+        self.assertEqual(self.request('GET', '/v2.0/a')[0], 404)
+        self.assertEqual(self.request('GET', '/')[0], 404)
+
+    def test_handler_error(self):
+        def handler(request, data):
+            raise ValueError('broken')
+        self.api.register_request(handler, 'GET',
+                                  [wsapi.WSPathStaticString('a')], 'a')
+        (code, body) = self.request('GET', '/v1.0/a')
+        self.assertEqual(code, 500)
+        self.assertEqual(json.loads(body)['error'], 'Unhandled server error')
+
+    def test_head_and_doc(self):
+        self._register('a', 'HEAD', [wsapi.WSPathStaticString('a')])
+        self.assertEqual(self.request('HEAD', '/v1.0/a'), (200, ''))
+        self.assertEqual(self.headers['Content-Length'], '1')
+
+        (code, body) = self.request('GET', '/v1.0/doc')
+        self.assertEqual(code, 200)
+        self.assertTrue('HEAD /v1.0/a' in body)
+        self.assertEqual(self.headers['Content-Type'], 'text/plain')
+
+    def test_quoted_path(self):
+        self._register('any', 'GET',
+                       [wsapi.WSPathArbitraryString('{any}')])
+        self.assertEqual(self.request('GET', '/v1.0/a b:c')[1], 'any')
+        self.assertEqual(self.calls[0][1], {'{any}': u'a%20b:c'})
+
+
+class TestRestStats(_WSTestCase):
+    def setUp(self):
+        super(TestRestStats, self).setUp()
+        self.nw = network.network()
+        rest.restapi(network=self.nw)
+        rest_stats.restapi()
+
+    def test_network_named_stats(self):
+        # the static 'stats' path doesn't hide the network id 'stats'
+        self.assertEqual(self.request('POST', '/v1.0/stats')[0], 200)
+        self.assertEqual(self.request('POST', '/v1.0/stats')[0], 409)
+        self.assertEqual(
+            self.request('POST', '/v1.0/stats/0000000000000001_1'),
+            (200, ''))
+        self.assertEqual(self.request('GET', '/v1.0/stats'),
+                         (200, json.dumps([[1, 1]])))
+        self.assertEqual(self.request('DELETE', '/v1.0/stats')[0], 200)
+        self.assertEqual(self.request('GET', '/v1.0/')[1], '[]')
+
+    def test_stats(self):
+        self.assertEqual(self.request('GET', '/v1.0/stats/admission'),
+                         (200, '{}'))
+        self.assertEqual(self.request('GET', '/v1.0/stats/pending_flow'),
+                         (200, '{}'))
+        self.assertEqual(self.request('GET', '/v1.0/stats/apps'),
+                         (200, '{}'))
+        self.assertEqual(self.request('GET', '/v1.0/stats/admission/1')[0],
+                         404)
+
+    def test_errors(self):
+        self.assertEqual(self.request('POST', '/v1.0/stats/admission')[0],
+                         405)
+        self.assertEqual(self.request('GET', '/v1.0/stats/admission/xyz')[0],
+                         404)
+        self.assertEqual(
+            self.request('GET', '/v1.0/a/0000000000000001_1/x')[0], 404)
+
+
+class _App(object):
+    def __init__(self):
+        self.mac2port = mac_to_port.MacToPortTable(0, 0)
+
+
+class _AppManager(object):
+    def __init__(self, **applications):
+        self.applications = applications
+
+
+class TestRestMac(_WSTestCase):
+    def setUp(self):
+        super(TestRestMac, self).setUp()
+        self.nw = network.network()
+        rest.restapi(network=self.nw)
+        self.app = _App()
+        self.other = _App()
+        rest_mac.restapi(app_manager=_AppManager(app=self.app,
+                                                 other=self.other))
+
+    def test_table_stats(self):
+        self.app.mac2port.port_add(1, 2, Mac(3))
+        (code, body) = self.request('GET', '/v1.0/stats/mac')
+        self.assertEqual(code, 200)
+        stats = json.loads(body)
+        self.assertEqual((stats['app']['datapaths'], stats['app']['entries'],
+                          stats['app']['learned']), (1, 1, 1))
+        self.assertEqual(stats['app']['index'],
+                         {'macs': 1, 'locations': 1, 'moves': 0})
+        self.assertEqual(stats['other']['index']['macs'], 0)
+
+    def test_lookup(self):
+        self.app.mac2port.port_add(1, 2, Mac(3))
+        self.other.mac2port.port_add(4, 5, Mac(3))
+        (code, body) = self.request('GET', '/v1.0/mac/00:00:00:00:00:03')
+        self.assertEqual(code, 200)
+        self.assertEqual(json.loads(body),
+                         {'mac': '00:00:00:00:00:03',
+                          'locations': {'0000000000000001': 2,
+                                        '0000000000000004': 5}})
+        self.assertEqual(
+            self.request('GET', '/v1.0/mac/00:00:00:00:00:04')[0], 404)
+
+    def test_network_named_mac(self):
+        self.assertEqual(self.request('POST', '/v1.0/mac')[0], 200)
+        self.assertEqual(
+            self.request('POST', '/v1.0/mac/0000000000000001_1')[0], 200)
+        self.assertEqual(self.request('GET', '/v1.0/mac'),
+                         (200, json.dumps([[1, 1]])))